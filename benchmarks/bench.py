@@ -0,0 +1,147 @@
+"""
+Benchmarks the client against the local mock server (see mock_server.py): login cost, then submit/poll/fetch
+throughput and per-operation latency percentiles at several concurrency levels.
+
+    python benchmarks/bench.py --jobs 200 --concurrency 1,8,32 --latency 0.02 --job-duration 1
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_server import MockLeonardo
+
+from leonardoWrapper import Leonardo
+from leonardoWrapper.util.api import RequestsHandler
+from leonardoWrapper.util.metrics import RequestEvent
+from leonardoWrapper.util.polling import AdaptivePolling, FixedInterval
+from leonardoWrapper.util.resilience import CircuitBreakers, RetryPolicy
+from leonardoWrapper.util.session_cache import SessionCache
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class LatencyRecorder:
+    """
+    A request hook keeping the latency of every request by operation.
+    """
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = {}
+        self.retries = 0
+        self._lock = threading.Lock()
+
+
+    def __call__(self, event: RequestEvent) -> None:
+        with self._lock:
+            self.latencies.setdefault(event["operation"], []).append(event["latency"])
+            self.retries += event["retries"]
+
+
+def make_handler(server: MockLeonardo, recorder: LatencyRecorder = None, pool_size: int = 10) -> RequestsHandler:
+    handler = RequestsHandler(
+        app_url=server.url, api_url=server.url, pool_size=pool_size, trust_env=False,
+        retry_policy=RetryPolicy(backoff=0.05), circuit_breakers=CircuitBreakers(failure_threshold=10 ** 6)
+    )
+    if recorder is not None:
+        handler.request_hooks.append(recorder)
+    return handler
+
+
+def bench_login(server: MockLeonardo, rounds: int) -> None:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        Leonardo("bench", "bench", requests_handler=make_handler(server)).close()
+    cold = (time.perf_counter() - started) / rounds
+
+    cache = SessionCache(tempfile.mkdtemp())
+    Leonardo("bench", "bench", requests_handler=make_handler(server), session_cache=cache).close()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        Leonardo("bench", "bench", requests_handler=make_handler(server), session_cache=cache).close()
+    cached = (time.perf_counter() - started) / rounds
+
+    print(f"login: {cold * 1000:.1f} ms cold, {cached * 1000:.1f} ms from the session cache ({rounds} rounds)")
+
+
+def bench_jobs(server: MockLeonardo, jobs: int, concurrency: int, poll_interval: float, adaptive: bool, error_rate: float, rate_limit_rate: float, fused: bool = False) -> None:
+    recorder = LatencyRecorder()
+    polling = AdaptivePolling() if adaptive else FixedInterval(poll_interval)
+    leonardo = Leonardo("bench", "bench", requests_handler=make_handler(server, recorder, pool_size=concurrency), polling=polling)
+    leonardo.poller.min_tick_interval = min(0.5, poll_interval)
+    # faults are only injected once logged in, the credentials POST is not idempotent and thus never retried
+    server.error_rate, server.rate_limit_rate = error_rate, rate_limit_rate
+    requests_before = server.requests
+    job_latencies: List[float] = []
+    failures = 0
+    lock = threading.Lock()
+
+    def run(index: int) -> None:
+        nonlocal failures
+        started = time.perf_counter()
+        try:
+            if fused:
+                succeeded = leonardo.generate(prompt=f"benchmark {index}", model_id="bench", amount_of_images=1)["status"] == "COMPLETE"
+            else:
+                creation_id = leonardo.create_generate_image(prompt=f"benchmark {index}", model_id="bench", amount_of_images=1)
+                succeeded = leonardo.poller.track(creation_id).result() == "COMPLETE"
+                if succeeded:
+                    leonardo.get_image_generation(creation_id)
+        except Exception:
+            # a mutation answered with a 5xx is not retried, it may have been applied
+            succeeded = False
+        with lock:
+            if succeeded:
+                job_latencies.append(time.perf_counter() - started)
+            else:
+                failures += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(run, range(jobs)))
+    elapsed = time.perf_counter() - started
+    server.error_rate, server.rate_limit_rate = 0, 0
+    leonardo.close()
+
+    print(f"\nconcurrency {concurrency}: {jobs} jobs in {elapsed:.2f} s, {jobs / elapsed:.1f} jobs/s, "
+          f"{server.requests - requests_before} requests, {recorder.retries} retries, {failures} failed")
+    print(f"  {'job (submit to fetched)':<30} p50 {percentile(job_latencies, 0.5) * 1000:8.1f} ms   p99 {percentile(job_latencies, 0.99) * 1000:8.1f} ms")
+    for operation, latencies in sorted(recorder.latencies.items()):
+        print(f"  {operation:<30} p50 {percentile(latencies, 0.5) * 1000:8.1f} ms   p99 {percentile(latencies, 0.99) * 1000:8.1f} ms   n={len(latencies)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark leonardoWrapper against the local mock server.")
+    parser.add_argument("--jobs", type=int, default=100, help="generations per concurrency level")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma separated concurrency levels")
+    parser.add_argument("--login-rounds", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.02, help="mean server latency in seconds")
+    parser.add_argument("--job-duration", type=float, default=1, help="mean generation duration in seconds")
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0)
+    parser.add_argument("--poll-interval", type=float, default=0.25, help="seconds between two status polls")
+    parser.add_argument("--adaptive", action="store_true", help="poll with AdaptivePolling instead of a fixed interval")
+    parser.add_argument("--fused", action="store_true", help="run each job with Leonardo.generate, the last poll returning the images")
+    args = parser.parse_args()
+
+    with MockLeonardo(latency=args.latency, job_duration=args.job_duration) as server:
+        print(f"mock server {server.url}: latency {args.latency * 1000:g} ms, job duration {args.job_duration:g} s, "
+              f"error rate {args.error_rate:g}, 429 rate {args.rate_limit_rate:g}")
+        bench_login(server, args.login_rounds)
+        for concurrency in (int(level) for level in args.concurrency.split(",")):
+            bench_jobs(server, args.jobs, concurrency, args.poll_interval, args.adaptive, args.error_rate, args.rate_limit_rate, args.fused)
+
+
+if __name__ == "__main__":
+    main()
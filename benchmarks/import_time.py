@@ -0,0 +1,72 @@
+"""
+Measures the cold import time of the package in fresh interpreters, and fails when a statement exceeds its budget
+so that startup regressions show up in CI:
+
+    python benchmarks/import_time.py --runs 20 --budget "import leonardoWrapper=10"
+
+Bytecode is written on the first run (unless PYTHONDONTWRITEBYTECODE is set) and reused by the following ones,
+the median therefore reflects a cached start.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STATEMENTS = [
+    "import leonardoWrapper",
+    "from leonardoWrapper import Leonardo",
+    "from leonardoWrapper.async_leonardo import AsyncLeonardo",
+    "import requests",
+]
+
+# milliseconds, generous enough for slow CI machines while still catching an eager import of requests
+DEFAULT_BUDGETS = {
+    "import leonardoWrapper": 15,
+}
+
+
+def measure(statement: str) -> float:
+    """
+    Returns the number of milliseconds statement takes in a new interpreter, the interpreter startup excluded.
+    """
+    code = f"import time; started = time.perf_counter(); {statement}; print((time.perf_counter() - started) * 1000)"
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def parse_budgets(values: List[str]) -> Dict[str, float]:
+    budgets = dict(DEFAULT_BUDGETS)
+    for value in values:
+        statement, _, milliseconds = value.rpartition("=")
+        budgets[statement.strip()] = float(milliseconds)
+    return budgets
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure the cold import time of leonardoWrapper.")
+    parser.add_argument("--runs", type=int, default=10, help="interpreters started per statement")
+    parser.add_argument("--budget", action="append", default=[], metavar="STATEMENT=MS", help="fail when the median of STATEMENT exceeds MS milliseconds")
+    args = parser.parse_args()
+
+    budgets = parse_budgets(args.budget)
+    failed = False
+    for statement in list(dict.fromkeys(STATEMENTS + list(budgets))):
+        try:
+            timings = [measure(statement) for _ in range(args.runs)]
+        except subprocess.CalledProcessError:
+            print(f"{statement:<60} failed (missing optional dependency?)")
+            continue
+        median = statistics.median(timings)
+        budget = budgets.get(statement)
+        verdict = "" if budget is None else (f"ok (budget {budget:g} ms)" if median <= budget else f"OVER BUDGET ({budget:g} ms)")
+        failed = failed or (budget is not None and median > budget)
+        print(f"{statement:<60} median {median:7.1f} ms   min {min(timings):7.1f} ms   {verdict}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""
+A local stand-in for the Leonardo auth endpoints and GraphQL API, to exercise and benchmark the client without
+spending credits. Point a handler at it with RequestsHandler(app_url=server.url, api_url=server.url).
+It also answers the requests sent to it as an HTTP proxy, so it can stand in for the proxies of a ProxyPool.
+
+    python benchmarks/mock_server.py --port 8080 --latency 0.05 --job-duration 8 --error-rate 0.01
+"""
+import argparse
+import base64
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+def make_token(sub: str, lifetime: float) -> str:
+    def encode(part: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(part).encode()).decode().rstrip("=")
+
+    return f"{encode({'alg': 'none'})}.{encode({'sub': sub, 'email_verified': True, 'exp': int(time.time() + lifetime)})}.mock"
+
+
+def iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+class MockLeonardo:
+    """
+    Parameters:
+        - latency: The mean delay added to every response, in seconds (±50% jitter).
+        - job_duration: The mean time a generation takes to complete, in seconds (±25% jitter).
+        - error_rate: The fraction of requests answered with a 500.
+        - rate_limit_rate: The fraction of requests answered with a 429 and a Retry-After of retry_after seconds.
+        - failure_rate: The fraction of generations ending FAILED.
+        - token_lifetime: The lifetime of the access tokens handed out, in seconds.
+        - models: The number of official models served by GetFeedModels.
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0, job_duration: float = 1, error_rate: float = 0, rate_limit_rate: float = 0, retry_after: float = 0, failure_rate: float = 0, token_lifetime: float = 3600, models: int = 120) -> None:
+        self.latency = latency
+        self.job_duration = job_duration
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.failure_rate = failure_rate
+        self.token_lifetime = token_lifetime
+        self.user_id = str(uuid.uuid4())
+        self.generations = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+
+        now = time.time()
+        self.models = [
+            {
+                "id": str(uuid.UUID(int=index + 1)), "name": f"Model {index}", "description": f"Mock model {index}",
+                "instancePrompt": None, "modelHeight": 768, "modelWidth": 1024, "coreModel": "SD",
+                "createdAt": iso(now - 3600 * (models - index)), "sdVersion": random.choice(["v1_5", "v2", "SDXL_1_0"]),
+                "type": "GENERAL", "nsfw": False, "motion": False, "public": True, "trainingStrength": "MEDIUM",
+                "user": {"id": "leonardo", "username": "Leonardo", "__typename": "users"},
+                "generated_image": None, "imageCount": 0, "teamId": None, "generations": [],
+                "user_favourite_custom_models": [], "__typename": "custom_models"
+            } for index in range(models)
+        ][::-1]
+
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # the headers and the body are written separately, Nagle's algorithm would delay the body
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                mock.handle(self, "GET")
+
+            def do_POST(self) -> None:
+                mock.handle(self, "POST")
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+        self._thread: threading.Thread = None
+
+
+    def start(self) -> "MockLeonardo":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="mock-leonardo", daemon=True)
+        self._thread.start()
+        return self
+
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+    def __enter__(self) -> "MockLeonardo":
+        return self.start()
+
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+    def handle(self, request: BaseHTTPRequestHandler, method: str) -> None:
+        body = request.rfile.read(int(request.headers.get("Content-Length") or 0))
+        with self.lock:
+            self.requests += 1
+
+        if self.latency:
+            time.sleep(self.latency * random.uniform(0.5, 1.5))
+
+        if random.random() < self.error_rate:
+            return self.respond(request, 500, {"error": "mock error"})
+        if random.random() < self.rate_limit_rate:
+            return self.respond(request, 429, {"error": "rate limited"}, {"Retry-After": f"{self.retry_after:g}"})
+
+        # a request sent through a proxy carries the absolute URL
+        path = urlsplit(request.path).path
+        if path == "/api/auth/csrf" and method == "GET":
+            return self.respond(request, 200, {"csrfToken": uuid.uuid4().hex})
+        if path == "/api/auth/callback/credentials" and method == "POST":
+            form = parse_qs(body.decode())
+            if not form.get("csrfToken") or not form.get("username"):
+                return self.respond(request, 400, {"error": "bad form"})
+            return self.respond(request, 200, {"url": "/"}, {"Set-Cookie": f"session={uuid.uuid4().hex}; Path=/"})
+        if path == "/api/auth/session" and method == "GET":
+            if "session=" not in (request.headers.get("Cookie") or ""):
+                return self.respond(request, 200, {})
+            return self.respond(request, 200, {"accessToken": make_token(self.user_id, self.token_lifetime), "user": {"email": "mock@example.com"}})
+        if path == "/v1/graphql" and method == "POST":
+            if not (request.headers.get("Authorization") or "").startswith("Bearer ") or len(request.headers["Authorization"]) <= 7:
+                return self.respond(request, 200, {"errors": [{"message": "Missing Authorization header"}]})
+            return self.respond(request, 200, self.graphql(json.loads(body)))
+        if path.startswith("/images/"):
+            return self.respond_image(request, path.encode() * 64)
+        return self.respond(request, 404, {"error": "not found"})
+
+
+    def respond(self, request: BaseHTTPRequestHandler, status: int, payload: dict, headers: dict = None) -> None:
+        self.respond_bytes(request, json.dumps(payload).encode(), "application/json", status, headers)
+
+
+    def respond_bytes(self, request: BaseHTTPRequestHandler, body: bytes, content_type: str, status: int = 200, headers: dict = None) -> None:
+        request.send_response(status)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(body)
+
+
+    def respond_image(self, request: BaseHTTPRequestHandler, body: bytes) -> None:
+        # only the "bytes=<start>-" ranges the downloader sends to resume
+        range_header = request.headers.get("Range") or ""
+        if not range_header.startswith("bytes="):
+            return self.respond_bytes(request, body, "image/jpeg")
+        start = int(range_header[len("bytes="):].split("-")[0])
+        if start >= len(body):
+            return self.respond_bytes(request, b"", "image/jpeg", 416, {"Content-Range": f"bytes */{len(body)}"})
+        self.respond_bytes(request, body[start:], "image/jpeg", 206, {"Content-Range": f"bytes {start}-{len(body) - 1}/{len(body)}"})
+
+
+    def generation_status(self, generation: dict) -> str:
+        if time.time() < generation["finishes_at"]:
+            return "PENDING"
+        return "FAILED" if generation["fails"] else "COMPLETE"
+
+
+    def generation(self, generation: dict) -> dict:
+        status = self.generation_status(generation)
+        arguments = generation["input"]
+        return {
+            "id": generation["id"], "modelId": arguments.get("modelId"), "scheduler": arguments.get("scheduler"),
+            "coreModel": "SD", "sdVersion": arguments.get("sd_version"), "prompt": arguments.get("prompt"),
+            "negativePrompt": arguments.get("negative_prompt"), "status": status, "quantity": arguments.get("num_images"),
+            "createdAt": generation["createdAt"], "public": arguments.get("public"), "seed": arguments.get("seed") or 1,
+            "nsfw": False, "custom_model": None,
+            "generated_images": [
+                {"id": f"{generation['id']}-{index}", "url": f"{self.url}/images/{generation['id']}-{index}.jpg", "nsfw": False}
+                for index in range(arguments.get("num_images") or 1)
+            ] if status == "COMPLETE" else []
+        }
+
+
+    def select(self, items: list, variables: dict) -> list:
+        created_at = variables.get("where", {}).get("createdAt", {})
+        items = [
+            item for item in items
+            if ("_lt" not in created_at or item["createdAt"] < created_at["_lt"]) and ("_gt" not in created_at or item["createdAt"] > created_at["_gt"])
+            and ("_lte" not in created_at or item["createdAt"] <= created_at["_lte"]) and ("_gte" not in created_at or item["createdAt"] >= created_at["_gte"])
+        ]
+        offset = variables.get("offset") or 0
+        limit = variables.get("limit")
+        return items[offset:offset + limit if limit is not None else None]
+
+
+    def graphql(self, request: dict) -> dict:
+        operation = request.get("operationName")
+        variables = request.get("variables") or {}
+        where = variables.get("where") or {}
+        if operation == "GetUserDetails":
+            return {"data": {"users": [{"id": self.user_id, "username": "mock", "createdAt": iso(0), "user_details": [{"apiCredit": 0, "subscriptionTokens": 10 ** 6, "plan": "MOCK"}]}]}}
+        if operation == "CreateSDGenerationJob":
+            generation_id = str(uuid.uuid4())
+            now = time.time()
+            with self.lock:
+                self.generations[generation_id] = {
+                    "id": generation_id, "input": variables.get("arg1", {}), "createdAt": iso(now),
+                    "finishes_at": now + self.job_duration * random.uniform(0.75, 1.25), "fails": random.random() < self.failure_rate
+                }
+            return {"data": {"sdGenerationJob": {"generationId": generation_id, "__typename": "SDGenerationOutput"}}}
+        if operation in ("GetAIGenerationFeedStatuses", "GetAIGenerationFeedResults", "GetAIGenerationFeed"):
+            with self.lock:
+                if "id" in where:
+                    generations = [self.generations[generation_id] for generation_id in where["id"].get("_in", []) if generation_id in self.generations]
+                else:
+                    generations = list(self.generations.values())
+            generations.sort(key=lambda generation: generation["createdAt"], reverse=True)
+            if operation != "GetAIGenerationFeed":
+                wanted = set(where.get("status", {}).get("_in", ["PENDING", "COMPLETE", "FAILED"]))
+                generations = [generation for generation in generations if self.generation_status(generation) in wanted]
+                if operation == "GetAIGenerationFeedResults":
+                    return {"data": {"generations": [self.generation(generation) for generation in generations]}}
+                return {"data": {"generations": [
+                    {"id": generation["id"], "status": self.generation_status(generation), "__typename": "generations"}
+                    for generation in generations
+                ]}}
+            return {"data": {"generations": [self.generation(generation) for generation in self.select(generations, variables)]}}
+        if operation == "GetFeedModels":
+            return {"data": {"custom_models": self.select(self.models, variables)}}
+        if operation in ("UpdateUsername", "UpdateUserDetails"):
+            return {"data": {"updateUsername": {"id": self.user_id}, "update_user_details": {"affected_rows": 1}}}
+        if operation == "Coalesced":
+            return {"errors": [{"message": "The mock server does not merge documents."}]}
+        return {"errors": [{"message": f"Unknown operation {operation}"}]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a local mock of the Leonardo auth endpoints and GraphQL API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--job-duration", type=float, default=1)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0)
+    parser.add_argument("--failure-rate", type=float, default=0)
+    args = parser.parse_args()
+
+    server = MockLeonardo(args.host, args.port, latency=args.latency, job_duration=args.job_duration, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, failure_rate=args.failure_rate)
+    print(f"Mock Leonardo listening on {server.url}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,16 @@
-from leonardoWrapper import Leonardo
+import argparse
+import hashlib
+import json
+import os
+import sys
+from typing import Dict, Optional
 
-leonardo = Leonardo(username="", password="")
+from leonardoWrapper import Leonardo
+from leonardoWrapper.util.catalog import ModelCatalog
+from leonardoWrapper.util.session_cache import SessionCache
 
-keys_to_remove = ["instancePrompt", "modelHeight", "modelWidth", "createdAt"]
+# per-user or volatile parts of a model that do not show up in its section
+KEYS_TO_REMOVE = ["instancePrompt", "modelHeight", "modelWidth", "createdAt", "user_favourite_custom_models"]
 
 
 def remove_keys_from_dict(dict_obj, keys):
@@ -14,36 +22,130 @@ def remove_keys_from_dict(dict_obj, keys):
         return dict_obj
 
 
-cleaned_data = remove_keys_from_dict(leonardo.user.get_global_models(), keys_to_remove)
-
+def model_hash(model: dict) -> str:
+    cleaned_model = remove_keys_from_dict(model, KEYS_TO_REMOVE)
+    return hashlib.sha256(json.dumps(cleaned_model, sort_keys=True).encode()).hexdigest()
 
-markdown_output = "# Models\n\n"
-for model in cleaned_data['data']['custom_models']:
-    markdown_output += f"## {model['name']}\n"
-    markdown_output += f"**ID:** {model['id']}\n\n"
-    markdown_output += f"**Description:** {model['description']}\n\n"
-    markdown_output += f"**Core Model:** {model['coreModel']}\n\n"
-    markdown_output += f"**SD Version:** {model['sdVersion']}\n\n"
-    markdown_output += f"**Type:** {model['type']}\n\n"
-    markdown_output += f"**NSFW:** {model['nsfw']}\n\n"
-    markdown_output += f"**Public:** {model['public']}\n\n"
-    markdown_output += f"**Training Strength:** {model['trainingStrength']}\n\n"
-    markdown_output += f"**User:** {model['user']['username']}\n\n"
 
-    markdown_output += "<details>\n"
-    markdown_output += "   <summary>Click to view a example</summary>\n\n"
+def render_model(model: dict) -> str:
+    parts = [
+        f"## {model['name']}\n",
+        f"**ID:** {model['id']}\n\n",
+        f"**Description:** {model['description']}\n\n",
+        f"**Core Model:** {model['coreModel']}\n\n",
+        f"**SD Version:** {model['sdVersion']}\n\n",
+        f"**Type:** {model['type']}\n\n",
+        f"**NSFW:** {model['nsfw']}\n\n",
+        f"**Public:** {model['public']}\n\n",
+        f"**Training Strength:** {model['trainingStrength']}\n\n",
+        f"**User:** {model['user']['username']}\n\n",
+        "<details>\n",
+        "   <summary>Click to view a example</summary>\n\n"
+    ]
     if model.get('generated_image'):
-        markdown_output += f"![Generated Image]({model['generated_image']['url']})\n\n"
+        parts.append(f"![Generated Image]({model['generated_image']['url']})\n\n")
     if model.get('generations'):
-        markdown_output += "### Generations\n\n"
+        parts.append("### Generations\n\n")
         for generation in model['generations']:
-            markdown_output += f"**Prompt:** {generation['prompt']}\n\n"
+            parts.append(f"**Prompt:** {generation['prompt']}\n\n")
             for image in generation['generated_images']:
-                markdown_output += f"![Generated Image]({image['url']})\n\n"
-    markdown_output += "</details>\n\n"
-    markdown_output += "---\n\n"
+                parts.append(f"![Generated Image]({image['url']})\n\n")
+    parts.append("</details>\n\n")
+    parts.append("---\n\n")
+    return "".join(parts)
+
+
+def load_manifest(manifest_path: str, output_path: str) -> Dict[str, dict]:
+    """
+    Returns the sections of the previous output by model id ({"hash", "offset", "length"}),
+    empty when there is no manifest or the output was modified since it was written.
+    """
+    try:
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+        if os.path.getsize(output_path) != manifest["size"]:
+            return {}
+    except (OSError, ValueError, KeyError):
+        return {}
+    return manifest["models"]
+
+
+def write_atomically(path: str, content: str) -> None:
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "w") as temporary_file:
+        temporary_file.write(content)
+    os.replace(temporary_path, path)
+
+
+def generate(catalog: ModelCatalog, output_path: str, manifest_path: str) -> Dict[str, int]:
+    """
+    Write the section of every model of the catalog to output_path, newest first. The sections of the models
+    whose hash did not change since the previous run are copied from the previous output instead of rendered.
+    Returns the number of rendered and reused sections.
+    """
+    previous_sections = load_manifest(manifest_path, output_path)
+    previous_output: Optional[object] = open(output_path, "rb") if previous_sections else None
+    sections: Dict[str, dict] = {}
+    counts = {"rendered": 0, "reused": 0}
+
+    temporary_path = f"{output_path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary_path, "wb") as output_file:
+            output_file.write(b"# Models\n\n")
+            for model in catalog.models:
+                digest = model_hash(model)
+                previous_section = previous_sections.get(model["id"])
+                section = None
+                if previous_section is not None and previous_section["hash"] == digest:
+                    previous_output.seek(previous_section["offset"])
+                    section = previous_output.read(previous_section["length"])
+                    if not section.startswith(b"## "):
+                        section = None
+                if section is None:
+                    section = render_model(model).encode()
+                    counts["rendered"] += 1
+                else:
+                    counts["reused"] += 1
+
+                sections[model["id"]] = {"hash": digest, "offset": output_file.tell(), "length": len(section)}
+                output_file.write(section)
+            size = output_file.tell()
+            output_file.flush()
+            os.fsync(output_file.fileno())
+    except:
+        os.remove(temporary_path)
+        raise
+    finally:
+        if previous_output is not None:
+            previous_output.close()
+
+    os.replace(temporary_path, output_path)
+    write_atomically(manifest_path, json.dumps({"size": size, "models": sections}))
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate the markdown list of Leonardo's official models.")
+    parser.add_argument("--username", default=os.environ.get("LEONARDO_USERNAME"), help="defaults to $LEONARDO_USERNAME")
+    parser.add_argument("--password", default=os.environ.get("LEONARDO_PASSWORD"), help="defaults to $LEONARDO_PASSWORD")
+    parser.add_argument("--output", default="models.md")
+    parser.add_argument("--manifest", help="the model hashes and section offsets of the output, defaults to <output>.manifest.json")
+    parser.add_argument("--cache-dir", help="where the session and the model catalog are cached, defaults to ~/.cache/leonardoWrapper")
+    args = parser.parse_args()
+
+    if not args.username or not args.password:
+        parser.error("the credentials are required, pass --username/--password or set LEONARDO_USERNAME/LEONARDO_PASSWORD")
+
+    leonardo = Leonardo(username=args.username, password=args.password, session_cache=SessionCache(args.cache_dir))
+    catalog = ModelCatalog(leonardo.user, directory=args.cache_dir, fields=None)
+    # the whole catalog is fetched again, an incremental refresh would miss the edits of existing models;
+    # the manifest hashes then tell which sections actually need to be rendered again
+    catalog.refresh(full=True)
+    counts = generate(catalog, args.output, args.manifest or f"{args.output}.manifest.json")
+    leonardo.close()
+
+    print(f"{args.output}: {counts['rendered']} sections rendered, {counts['reused']} reused.", file=sys.stderr)
 
 
-with open("models.md", "w") as file:
-    file.write(markdown_output)
-file.close()
+if __name__ == "__main__":
+    main()
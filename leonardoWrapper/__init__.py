@@ -1,7 +1,33 @@
-from leonardoWrapper.leonardo import Leonardo
+from typing import TYPE_CHECKING
 
 __version__ = "1.0.0"
 __all__ = [
-    "Leonardo"
+    "Leonardo",
+    "LeonardoPool",
     "__version__"
-]
\ No newline at end of file
+]
+
+# the clients pull in requests and most of the package, they are only imported on first access (PEP 562)
+_lazy_attributes = {
+    "Leonardo": "leonardoWrapper.leonardo",
+    "LeonardoPool": "leonardoWrapper.pool",
+}
+
+if TYPE_CHECKING:
+    from leonardoWrapper.leonardo import Leonardo
+    from leonardoWrapper.pool import LeonardoPool
+
+
+def __getattr__(name: str):
+    module_name = _lazy_attributes.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    import importlib
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_attributes))
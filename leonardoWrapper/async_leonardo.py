@@ -0,0 +1,205 @@
+import asyncio
+import time
+from typing import Callable, Dict, Iterable, List, Literal
+
+from leonardoWrapper.types.GeneratedImage import GeneratedImage
+from leonardoWrapper.user.async_user import AsyncUser
+from leonardoWrapper.util import queries
+from leonardoWrapper.util.async_api import AsyncRequestsHandler
+from leonardoWrapper.util.parsing import parse_generated_image
+from leonardoWrapper.util.async_poller import AsyncGenerationPoller
+from leonardoWrapper.util.poller import STATUS_BATCH_SIZE, chunked, parse_finished_statuses
+from leonardoWrapper.util.polling import CompletionTracker, PollingStrategy
+from leonardoWrapper.util.projection import project
+
+class AsyncLeonardo:
+    """
+    asyncio counterpart of Leonardo, all the generations of one instance share a single pooled HTTP client.
+    Use it as an async context manager, or await login() before use and close() when done:
+
+        async with AsyncLeonardo(username="...", password="...") as leonardo:
+            creation_id = await leonardo.create_generate_image(prompt="...", model_id="...")
+    """
+    def __init__(self, username: str, password: str, proxy: str = None, pool_size: int = 100, polling: PollingStrategy = None) -> None:
+        self._requests_handler = AsyncRequestsHandler(proxy=proxy, pool_size=pool_size)
+        self.user = AsyncUser(username=username, password=password, requests_handler=self._requests_handler)
+        self.tracker = CompletionTracker(polling=polling)
+        self._poller: AsyncGenerationPoller = None
+
+
+    async def __aenter__(self) -> "AsyncLeonardo":
+        try:
+            await self.login()
+        except:
+            await self.close()
+            raise
+        return self
+
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+
+    async def login(self) -> None:
+        await self.user.login()
+        await self.user.get_user_informations()
+        self._requests_handler.start_token_refresher()
+
+
+    async def close(self) -> None:
+        if self._poller is not None:
+            await self._poller.stop()
+        await self._requests_handler.close()
+
+
+    async def create_generate_image(self, prompt: str, model_id: str, negative_prompt: str = "", nswf: bool = False, image_size: int = 7, sd_version: str = None, amount_of_images: int = 4, width: int = 1368, height: int = 768, num_inference_steps: int = 10, guidance_scale: int = 7, scheduler: str = None, tiling: bool = False, public: bool = False, leonardo_magic: bool = False, enhance_prompt: bool = True, contrast: float = 3.5, preset_style: str = None, pose_to_image: bool = False, pose_to_image_type: str = "POSE", weighting: float = 0.75, high_contrast: bool = False, transparency: Literal["enabled", "disabled"] = "disabled", photo_real: bool = False, seed: int = None) -> str:
+        """
+        Create a task to generate an image based on the provided prompt, see Leonardo.create_generate_image for the parameters.
+        """
+
+        generation_input = queries.generation_input(
+            prompt=prompt, model_id=model_id, negative_prompt=negative_prompt, nswf=nswf, image_size=image_size,
+            sd_version=sd_version, amount_of_images=amount_of_images, width=width, height=height,
+            num_inference_steps=num_inference_steps, guidance_scale=guidance_scale, scheduler=scheduler,
+            tiling=tiling, public=public, leonardo_magic=leonardo_magic, enhance_prompt=enhance_prompt,
+            contrast=contrast, preset_style=preset_style, pose_to_image=pose_to_image,
+            pose_to_image_type=pose_to_image_type, weighting=weighting, high_contrast=high_contrast,
+            transparency=transparency, photo_real=photo_real, seed=seed
+        )
+        make_request = await self._requests_handler.send_graphql_request(
+            json_data=queries.create_generation_job(generation_input)
+        )
+
+        if "errors" in make_request["json"]:
+            raise Exception(make_request["json"]["errors"][0]["message"])
+
+        try:
+            generation_id = make_request["json"]["data"]["sdGenerationJob"]["generationId"]
+        except:
+            raise Exception("Failed to create the image generation task.")
+
+        self.tracker.record_submission(generation_id, generation_input)
+        return generation_id
+
+
+    async def wait_for_image_generation(self, creation_id: str, check_interval: int = 5, polling: PollingStrategy = None, timeout: float = None) -> None:
+        await self.wait_for_generations([creation_id], check_interval=check_interval, polling=polling, timeout=timeout)
+
+
+    async def wait_for_generations(self, creation_ids: List[str], check_interval: int = 5, polling: PollingStrategy = None, timeout: float = None) -> Dict[str, str]:
+        """
+        Wait until every generation in creation_ids is finished, polling all of them with a single query per tick.
+        Returns a mapping of generation id to its final status ("COMPLETE" or "FAILED").
+        Parameters:
+            - check_interval: The number of seconds between two polls when no polling strategy is set.
+            - polling: The PollingStrategy to use instead of the client default, e.g. AdaptivePolling().
+            - timeout: The maximum number of seconds to wait, a TimeoutError is raised once it is exceeded.
+        """
+        finished = await self._poll_until_finished(creation_ids, check_interval, polling, timeout, queries.generation_statuses)
+        return {creation_id: generation["status"] for creation_id, generation in finished.items()}
+
+
+    async def wait_for_results(self, creation_ids: List[str], check_interval: int = 5, polling: PollingStrategy = None, timeout: float = None) -> Dict[str, GeneratedImage]:
+        """
+        Wait until every generation in creation_ids is finished, polling with a query that also selects the images.
+        Returns a mapping of generation id to GeneratedImage, failed generations included with their "FAILED" status.
+        """
+        finished = await self._poll_until_finished(creation_ids, check_interval, polling, timeout, queries.generation_results)
+        return {creation_id: parse_generated_image(generation) for creation_id, generation in finished.items()}
+
+
+    async def generate(self, prompt: str, model_id: str, check_interval: int = 5, polling: PollingStrategy = None, timeout: float = None, **generation_options) -> GeneratedImage:
+        """
+        Create a generation, wait for it and return it, the last status poll carrying the images.
+        Parameters:
+            - check_interval, polling, timeout: See wait_for_generations.
+            - generation_options: The other parameters of create_generate_image.
+        """
+        creation_id = await self.create_generate_image(prompt=prompt, model_id=model_id, **generation_options)
+        return (await self.wait_for_results([creation_id], check_interval=check_interval, polling=polling, timeout=timeout))[creation_id]
+
+
+    async def _poll_until_finished(self, creation_ids: List[str], check_interval: int, polling: PollingStrategy, timeout: float, query: Callable[[List[str]], dict]) -> Dict[str, dict]:
+        schedule = self.tracker.schedule_for(list(dict.fromkeys(creation_ids)), polling=polling, check_interval=check_interval)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        generations: Dict[str, dict] = {}
+        # the poller is not built for this, but a configured one sets the batch size
+        batch_size = self._poller.batch_size if self._poller is not None else STATUS_BATCH_SIZE
+        while True:
+            wait = schedule.time_until_next()
+            if deadline is not None:
+                wait = min(wait, max(0, deadline - time.monotonic()))
+            await asyncio.sleep(wait)
+
+            due = schedule.due()
+            polled = schedule.ids()
+            for batch in chunked(polled, batch_size):
+                get_status = await self._requests_handler.send_graphql_request(
+                    json_data=query(batch)
+                )
+                finished = parse_finished_statuses(get_status)
+                self.tracker.record_finished(finished, schedule)
+                for generation in get_status["json"]["data"]["generations"]:
+                    generations[generation["id"]] = generation
+                for creation_id in finished:
+                    schedule.remove(creation_id)
+
+            if not schedule:
+                return generations
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"{len(schedule)} image generations did not finish within {timeout} seconds.")
+            schedule.polled(polled, due)
+
+
+    @property
+    def poller(self) -> AsyncGenerationPoller:
+        """
+        A background AsyncGenerationPoller shared by every coroutine using this client, poller.track(creation_id) returns a future.
+        """
+        if self._poller is None:
+            self._poller = AsyncGenerationPoller(self._requests_handler, polling=self.tracker.polling, tracker=self.tracker)
+        return self._poller
+
+
+
+    async def get_image_generation(self, creation_id: str) -> GeneratedImage:
+        generated_images = await self.get_image_generations([creation_id])
+        if creation_id not in generated_images:
+            raise Exception("Failed to get the image generation.")
+
+        return generated_images[creation_id]
+
+
+    async def get_image_generations(self, creation_ids: List[str], batch_size: int = 100, page_size: int = 50, fields: Iterable[str] = None) -> Dict[str, GeneratedImage]:
+        """
+        Fetch many generations at once, the ids are sent in batches of batch_size and each batch is paginated by page_size.
+        Returns a mapping of generation id to GeneratedImage, ids that were not found are left out.
+        Parameters:
+            - fields: Only fetch these generation fields, dotted paths like ["status", "generated_images.url"], the others are set to None.
+        """
+        generated_images: Dict[str, GeneratedImage] = {}
+        for batch in chunked(list(dict.fromkeys(creation_ids)), batch_size):
+            offset = 0
+            while True:
+                json_data = queries.generation_feed(self.user.user_informations["user_id"], batch, offset=offset, limit=page_size)
+                if fields is not None:
+                    json_data = project(json_data, fields)
+
+                get_solution = await self._requests_handler.send_graphql_request(json_data=json_data)
+
+                if "errors" in get_solution["json"]:
+                    raise Exception(get_solution["json"]["errors"][0]["message"])
+
+                generations = get_solution["json"]["data"]["generations"]
+                for generation in generations:
+                    generated_images[generation["id"]] = parse_generated_image(generation)
+
+                offset += len(generations)
+                if len(generations) < page_size or offset >= len(batch):
+                    break
+
+        return generated_images
+
+
+    async def get_global_models(self, limit: int = 50, offset: int = 0, created_after: str = None, fields: Iterable[str] = None) -> dict:
+        return await self.user.get_global_models(limit=limit, offset=offset, created_after=created_after, fields=fields)
@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import sys
+import threading
+from concurrent.futures import Future
+from typing import Dict, Iterable, TextIO
+
+from leonardoWrapper.jobs import GenerationQueue
+from leonardoWrapper.leonardo import Leonardo
+from leonardoWrapper.util.journal import GenerationJournal
+from leonardoWrapper.util.session_cache import SessionCache
+from leonardoWrapper.util.validation import InvalidGenerationError
+
+
+def run(queue: GenerationQueue, journal: GenerationJournal, lines: Iterable[str], output: TextIO, retry_failed: bool = False) -> Dict[str, int]:
+    """
+    Run the generation specs of lines, one JSON object of create_generate_image arguments per line, and write one
+    JSON result per line to output as the generations finish.
+    A spec is identified by its optional "key" field, by its line number otherwise. Keys the journal knows as
+    finished are skipped and keys still pending are waited for instead of being created again.
+    The input is read as the queue frees up (see GenerationQueue max_pending), so memory does not grow with it.
+    Returns the number of jobs by outcome: "COMPLETE", "FAILED", "INVALID" and "skipped".
+    Specs rejected by the validator are "INVALID", nothing was created for them.
+    """
+    counts = {"COMPLETE": 0, "FAILED": 0, "INVALID": 0, "skipped": 0}
+    lock = threading.Lock()
+
+    def write(record: dict) -> None:
+        with lock:
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+            counts[record["status"] if record["status"] in counts else "FAILED"] += 1
+
+    def finish(key: str, future: Future) -> None:
+        try:
+            generated_image = future.result()
+            record = {"key": key, "generation_id": generated_image["id"], "status": generated_image["status"], "generated_image": generated_image.to_dict(), "error": None}
+        except InvalidGenerationError as error:
+            record = {"key": key, "generation_id": None, "status": "INVALID", "generated_image": None, "error": str(error)}
+        except Exception as error:
+            entry = journal.get(key)
+            record = {"key": key, "generation_id": entry[0] if entry is not None else None, "status": "FAILED", "generated_image": None, "error": str(error)}
+        # the result is written before the job is marked finished: a crash in between writes it again on resume, never loses it
+        write(record)
+        if record["generation_id"] is not None:
+            journal.finished(key, record["status"])
+
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            spec = json.loads(line)
+            if not isinstance(spec, dict):
+                raise ValueError("a spec must be a JSON object")
+        except ValueError as error:
+            write({"key": str(line_number), "generation_id": None, "status": "INVALID", "generated_image": None, "error": str(error)})
+            continue
+
+        key = str(spec.pop("key", line_number))
+        entry = journal.get(key)
+        if entry is not None and (entry[1] == "COMPLETE" or (entry[1] == "FAILED" and not retry_failed)):
+            with lock:
+                counts["skipped"] += 1
+            continue
+
+        if entry is not None and entry[1] == "PENDING":
+            future = queue.track(entry[0])
+        else:
+            future = queue.submit(spec, on_created=lambda creation_id, key=key: journal.created(key, creation_id))
+        future.add_done_callback(lambda future, key=key: finish(key, future))
+
+    queue.shutdown(wait=True)
+    return counts
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="leonardo-generate",
+        description="Run the generation specs of a JSONL file (one object of create_generate_image arguments per line) "
+                    "and write the results as JSONL. An interrupted run resumes from its journal when started again."
+    )
+    parser.add_argument("input", nargs="?", default="-", help="the JSONL specs, - for stdin (default)")
+    parser.add_argument("--output", default="-", help="where the JSONL results are appended, - for stdout (default)")
+    parser.add_argument("--journal", help="the checkpoint database, defaults to <input>.journal.sqlite3, or leonardo-generate.journal.sqlite3 when reading stdin")
+    parser.add_argument("--username", default=os.environ.get("LEONARDO_USERNAME"), help="defaults to $LEONARDO_USERNAME")
+    parser.add_argument("--password", default=os.environ.get("LEONARDO_PASSWORD"), help="defaults to $LEONARDO_PASSWORD")
+    parser.add_argument("--cache-dir", help="where the session is cached, defaults to ~/.cache/leonardoWrapper")
+    parser.add_argument("--concurrency", type=int, default=8, help="the maximum number of generations in flight")
+    parser.add_argument("--max-pending", type=int, help="the maximum number of specs read ahead, defaults to 4 times the concurrency")
+    parser.add_argument("--rate", type=float, default=1, help="the maximum average number of generations created per second")
+    parser.add_argument("--burst", type=float, default=5)
+    parser.add_argument("--timeout", type=float, default=3600, help="the number of seconds a generation may take before its job is recorded as failed (default 3600)")
+    parser.add_argument("--retry-failed", action="store_true", help="create the jobs that failed in a previous run again")
+    args = parser.parse_args(argv)
+
+    if not args.username or not args.password:
+        parser.error("the credentials are required, pass --username/--password or set LEONARDO_USERNAME/LEONARDO_PASSWORD")
+
+    journal_path = args.journal or ("leonardo-generate.journal.sqlite3" if args.input == "-" else f"{args.input}.journal.sqlite3")
+    journal = GenerationJournal(journal_path)
+    leonardo = Leonardo(username=args.username, password=args.password, session_cache=SessionCache(args.cache_dir), model_catalog=True, validator=True)
+    queue = GenerationQueue(leonardo, max_concurrency=args.concurrency, rate=args.rate, burst=args.burst, max_pending=args.max_pending or 4 * args.concurrency, close_client=True, timeout=args.timeout)
+
+    lines = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    output = sys.stdout if args.output == "-" else open(args.output, "a", encoding="utf-8")
+    # on an interruption the journal and the output stay open for the generations still in flight
+    counts = run(queue, journal, lines, output, retry_failed=args.retry_failed)
+    if lines is not sys.stdin:
+        lines.close()
+    if output is not sys.stdout:
+        output.close()
+    journal.close()
+
+    print(
+        f"{counts['COMPLETE']} complete, {counts['FAILED']} failed, {counts['INVALID']} invalid, "
+        f"{counts['skipped']} already done (journal {journal_path})", file=sys.stderr
+    )
+    return 1 if counts["FAILED"] or counts["INVALID"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
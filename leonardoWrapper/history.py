@@ -0,0 +1,184 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import List, Optional
+
+from leonardoWrapper.leonardo import Leonardo
+from leonardoWrapper.types.GeneratedImage import GeneratedImage
+from leonardoWrapper.util.poller import chunked
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    model_id TEXT,
+    status TEXT,
+    prompt TEXT,
+    created_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS generations_user_created_at ON generations (user_id, created_at);
+CREATE INDEX IF NOT EXISTS generations_model_id ON generations (model_id, created_at);
+CREATE INDEX IF NOT EXISTS generations_status ON generations (status, created_at);
+CREATE INDEX IF NOT EXISTS generations_prompt ON generations (prompt);
+CREATE TABLE IF NOT EXISTS images (
+    id TEXT PRIMARY KEY,
+    generation_id TEXT NOT NULL REFERENCES generations (id) ON DELETE CASCADE,
+    url TEXT,
+    nsfw INTEGER
+);
+CREATE INDEX IF NOT EXISTS images_generation_id ON images (generation_id);
+CREATE TABLE IF NOT EXISTS sync_state (
+    user_id TEXT PRIMARY KEY,
+    synced_until TEXT
+);
+"""
+
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS generations_fts USING fts5 (prompt, content='generations', content_rowid='rowid');
+CREATE TRIGGER IF NOT EXISTS generations_fts_insert AFTER INSERT ON generations BEGIN
+    INSERT INTO generations_fts (rowid, prompt) VALUES (new.rowid, new.prompt);
+END;
+CREATE TRIGGER IF NOT EXISTS generations_fts_delete AFTER DELETE ON generations BEGIN
+    INSERT INTO generations_fts (generations_fts, rowid, prompt) VALUES ('delete', old.rowid, old.prompt);
+END;
+CREATE TRIGGER IF NOT EXISTS generations_fts_update AFTER UPDATE OF prompt ON generations BEGIN
+    INSERT INTO generations_fts (generations_fts, rowid, prompt) VALUES ('delete', old.rowid, old.prompt);
+    INSERT INTO generations_fts (rowid, prompt) VALUES (new.rowid, new.prompt);
+END;
+"""
+
+
+class GenerationHistory:
+    """
+    Local SQLite copy of the generations of one or more accounts and of their images, to query past generations
+    without the API. sync() only fetches the generations created since the previous complete sync, plus the ones
+    that were still pending.
+    Prompts are searched with FTS5 when SQLite was built with it, with LIKE otherwise.
+    Parameters:
+        - path: The database file, defaults to ~/.cache/leonardoWrapper/history.sqlite3.
+    """
+    def __init__(self, path: str = None) -> None:
+        self.path = path if path is not None else os.path.join(os.path.expanduser("~"), ".cache", "leonardoWrapper", "history.sqlite3")
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA foreign_keys=ON")
+        self._connection.executescript(_SCHEMA)
+        try:
+            self._connection.executescript(_FTS_SCHEMA)
+            self.full_text_search = True
+        except sqlite3.OperationalError:
+            self.full_text_search = False
+        self._lock = threading.Lock()
+
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM generations").fetchone()[0]
+
+
+    def add(self, user_id: str, generated_images: List[GeneratedImage]) -> None:
+        with self._lock, self._connection:
+            for generated_image in generated_images:
+                # an upsert keeps the rowid the full text index refers to
+                self._connection.execute(
+                    "INSERT INTO generations (id, user_id, model_id, status, prompt, created_at, data) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (id) DO UPDATE SET model_id = excluded.model_id, status = excluded.status, prompt = excluded.prompt, "
+                    "created_at = excluded.created_at, data = excluded.data",
+                    (
+                        generated_image["id"], user_id, generated_image.get("model_id"), generated_image.get("status"),
+                        generated_image.get("prompt"), generated_image.get("createdAt"), json.dumps(generated_image.to_dict())
+                    )
+                )
+                self._connection.execute("DELETE FROM images WHERE generation_id = ?", (generated_image["id"],))
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO images (id, generation_id, url, nsfw) VALUES (?, ?, ?, ?)",
+                    [(image["id"], generated_image["id"], image["url"], image["nsfw"]) for image in generated_image.get("generated_images", [])]
+                )
+
+
+    def sync(self, leonardo: Leonardo, page_size: int = 50) -> int:
+        """
+        Fetch the generations of leonardo's account created since the previous sync and refresh the ones still pending.
+        The cursor only moves once the sync completes, an interrupted sync starts over from the same point. The
+        generations created at the cursor are fetched again, one created later with the same timestamp is not missed.
+        Returns the number of generations stored or updated.
+        """
+        user_id = leonardo.user.user_informations["user_id"]
+        with self._lock:
+            row = self._connection.execute("SELECT synced_until FROM sync_state WHERE user_id = ?", (user_id,)).fetchone()
+            pending = [row_id for row_id, in self._connection.execute("SELECT id FROM generations WHERE user_id = ? AND status = 'PENDING'", (user_id,))]
+        synced_until = row[0] if row is not None else None
+
+        count = 0
+        newest = synced_until
+        page: List[GeneratedImage] = []
+        for generated_image in leonardo.iter_image_generations(created_after=synced_until, page_size=page_size, after_inclusive=True):
+            if newest is None or generated_image["createdAt"] > newest:
+                newest = generated_image["createdAt"]
+            page.append(generated_image)
+            if len(page) == page_size:
+                self.add(user_id, page)
+                count += len(page)
+                page = []
+        self.add(user_id, page)
+        count += len(page)
+
+        for batch in chunked(pending, 100):
+            refreshed = list(leonardo.get_image_generations(batch).values())
+            self.add(user_id, refreshed)
+            count += len(refreshed)
+
+        with self._lock, self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO sync_state (user_id, synced_until) VALUES (?, ?)", (user_id, newest))
+        return count
+
+
+    def get(self, creation_id: str) -> Optional[GeneratedImage]:
+        with self._lock:
+            row = self._connection.execute("SELECT data FROM generations WHERE id = ?", (creation_id,)).fetchone()
+        return GeneratedImage.from_dict(json.loads(row[0])) if row is not None else None
+
+
+    def search(self, model_id: str = None, status: str = None, created_after: str = None, created_before: str = None, prompt: str = None, user_id: str = None, limit: int = 100, offset: int = 0) -> List[GeneratedImage]:
+        """
+        Returns the stored generations matching every given criterion, newest first.
+        Parameters:
+            - created_after, created_before: ISO timestamps bounding createdAt.
+            - prompt: A full text query (e.g. "castle AND night") when full_text_search is set, a substring otherwise.
+        """
+        conditions, parameters = [], []
+        for column, value in (("model_id", model_id), ("status", status), ("user_id", user_id)):
+            if value is not None:
+                conditions.append(f"generations.{column} = ?")
+                parameters.append(value)
+        if created_after is not None:
+            conditions.append("generations.created_at > ?")
+            parameters.append(created_after)
+        if created_before is not None:
+            conditions.append("generations.created_at < ?")
+            parameters.append(created_before)
+        if prompt is not None:
+            if self.full_text_search:
+                conditions.append("generations.rowid IN (SELECT rowid FROM generations_fts WHERE generations_fts MATCH ?)")
+                parameters.append(prompt)
+            else:
+                conditions.append("generations.prompt LIKE ?")
+                parameters.append(f"%{prompt}%")
+
+        query = "SELECT data FROM generations"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
+        with self._lock:
+            rows = self._connection.execute(query, parameters + [limit, offset]).fetchall()
+        return [GeneratedImage.from_dict(json.loads(data)) for data, in rows]
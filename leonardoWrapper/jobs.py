@@ -0,0 +1,157 @@
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Union
+
+from leonardoWrapper.leonardo import Leonardo
+from leonardoWrapper.pool import LeonardoPool
+from leonardoWrapper.types.GeneratedImage import GeneratedImage
+from leonardoWrapper.util.rate_limit import TokenBucket
+
+
+class GenerationQueue:
+    """
+    Runs generations end to end (create, wait, fetch) with at most max_concurrency of them in flight.
+    Generation creations are rate limited with a token bucket per account.
+    Parameters:
+        - client: A Leonardo client, or a LeonardoPool to spread the generations over several accounts.
+        - max_concurrency: The maximum number of generations in flight.
+        - rate: The maximum average number of generations created per second and per account.
+        - burst: The number of generations an account may create at once before the rate applies.
+        - max_pending: When set, submit() blocks while this many generations are queued or running.
+        - close_client: Close the client (see Leonardo.close) when the queue shuts down, for a queue owning it.
+        - timeout: The number of seconds a job waits for its generation to finish, after which it fails with a
+          TimeoutError telling the last status request error. None waits for as long as it takes, even when the API is unreachable.
+    A spec is a dict of Leonardo.create_generate_image keyword arguments, each submitted spec gets a future
+    resolving to its GeneratedImage.
+
+        with GenerationQueue(leonardo, max_concurrency=16) as queue:
+            for spec, generated_image in queue.map(specs):
+                print(generated_image["generated_images"][0]["url"])
+    """
+    def __init__(self, client: Union[Leonardo, LeonardoPool], max_concurrency: int = 8, rate: float = 1, burst: float = 5, max_pending: int = None, close_client: bool = False, timeout: float = None) -> None:
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.close_client = close_client
+        self.timeout = timeout
+        self.rate = rate
+        self.burst = burst
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="leonardo-job")
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._buckets_lock = threading.Lock()
+        self._pending = threading.BoundedSemaphore(max_pending) if max_pending is not None else None
+
+
+    def __enter__(self) -> "GenerationQueue":
+        return self
+
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
+
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+        if self.close_client and wait:
+            self.client.close()
+
+
+    def _bucket_for(self, account: Leonardo) -> TokenBucket:
+        with self._buckets_lock:
+            bucket = self._buckets.get(id(account))
+            if bucket is None:
+                bucket = self._buckets[id(account)] = TokenBucket(self.rate, self.burst)
+            return bucket
+
+
+    def _run(self, spec: dict, on_created: Callable[[str], None] = None, creation_id: str = None) -> GeneratedImage:
+        if creation_id is not None:
+            account = self.client
+        elif isinstance(self.client, LeonardoPool):
+            account = self.client.acquire_account(spec.get("amount_of_images", 4))
+            self._bucket_for(account).acquire()
+            creation_id = self.client.create_generate_image(account=account, **spec)
+        else:
+            account = self.client
+            self._bucket_for(account).acquire()
+            creation_id = account.create_generate_image(**spec)
+        # a job ending without a final status may still spend its tokens
+        spent = True
+        try:
+            if on_created is not None:
+                on_created(creation_id)
+
+            if account.submission_cache is not None:
+                # an identical request already finished, nothing to wait for
+                generated_image = account.submission_cache.generated_image(creation_id)
+                if generated_image is not None:
+                    spent = False
+                    return generated_image
+
+            status = account.poller.track(creation_id, timeout=self.timeout).result()
+            spent = status == "COMPLETE"
+        finally:
+            if isinstance(self.client, LeonardoPool):
+                self.client.release(creation_id, spent=spent)
+        if status != "COMPLETE":
+            if account.submission_cache is not None:
+                account.submission_cache.discard(creation_id)
+            raise Exception(f"The image generation {creation_id} failed.")
+
+        return account.get_image_generation(creation_id)
+
+
+    def submit(self, spec: dict, on_created: Callable[[str], None] = None) -> Future:
+        """
+        Parameters:
+            - on_created: Called with the generation id once the generation is created, before waiting for it.
+        """
+        return self._submit(spec, on_created, None)
+
+
+    def track(self, creation_id: str) -> Future:
+        """
+        Wait for and fetch a generation created earlier, e.g. by a previous process, like the generations of submit().
+        Only available for a single Leonardo client, a LeonardoPool cannot tell which account created it.
+        """
+        if isinstance(self.client, LeonardoPool):
+            raise Exception("GenerationQueue.track needs a Leonardo client, not a LeonardoPool.")
+        return self._submit({}, None, creation_id)
+
+
+    def _submit(self, spec: dict, on_created: Callable[[str], None], creation_id: str) -> Future:
+        if self._pending is not None:
+            self._pending.acquire()
+
+        future = self._executor.submit(self._run, spec, on_created, creation_id)
+        if self._pending is not None:
+            future.add_done_callback(lambda _: self._pending.release())
+        return future
+
+
+    def submit_many(self, specs: Iterable[dict]) -> List[Future]:
+        return [self.submit(spec) for spec in specs]
+
+
+    def map(self, specs: Iterable[dict], window: int = None) -> Iterator[Tuple[dict, GeneratedImage]]:
+        """
+        Submit the specs and yield (spec, GeneratedImage) pairs as the generations finish, failed generations raise.
+        specs is read lazily: at most window specs (twice max_concurrency by default) are submitted and not yet
+        yielded at any time, so results come out while the input is still being read.
+        """
+        window = window or 2 * self.max_concurrency
+        specs = iter(specs)
+        futures: Dict[Future, dict] = {}
+        exhausted = False
+        while True:
+            while not exhausted and len(futures) < window:
+                try:
+                    spec = next(specs)
+                except StopIteration:
+                    exhausted = True
+                else:
+                    futures[self.submit(spec)] = spec
+            if not futures:
+                return
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield futures.pop(future), future.result()
@@ -1,20 +1,83 @@
-import sys
 import time
-from typing import Literal
+from collections.abc import Mapping
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Literal, Union
 
 from leonardoWrapper.types.GeneratedImage import GeneratedImage
 from leonardoWrapper.user.user import User
+from leonardoWrapper.util import queries
 from leonardoWrapper.util.api import RequestsHandler
+from leonardoWrapper.util.parsing import parse_generated_image
+from leonardoWrapper.util.poller import STATUS_BATCH_SIZE, GenerationPoller, chunked, parse_finished_statuses
+from leonardoWrapper.util.polling import CompletionTracker, PollingStrategy
+from leonardoWrapper.util.projection import project
 
-sys.dont_write_bytecode = True
+# the optional subsystems are imported where they are used, most clients never touch them
+if TYPE_CHECKING:
+    from leonardoWrapper.util.catalog import ModelCatalog
+    from leonardoWrapper.util.idempotency import SubmissionCache
+    from leonardoWrapper.util.metrics import Metrics
+    from leonardoWrapper.util.proxy_pool import ProxyPool
+    from leonardoWrapper.util.session_cache import SessionCache
+    from leonardoWrapper.util.validation import GenerationValidator
 
 class Leonardo:
-    def __init__(self, username: str, password: str, proxy: str = None) -> None:
-        self._requests_handler = RequestsHandler(proxy=proxy)
-        self.user = User(username=username, password=password, requests_handler=self._requests_handler)
+    def __init__(self, username: str, password: str, proxy: str = None, polling: PollingStrategy = None, session_cache: "SessionCache" = None, requests_handler: RequestsHandler = None, model_catalog: Union["ModelCatalog", bool] = None, submission_cache: "SubmissionCache" = None, metrics: "Metrics" = None, proxy_pool: "ProxyPool" = None, validator: Union["GenerationValidator", bool] = None) -> None:
+        """
+        Log in to Leonardo.
+        Parameters:
+            - proxy: A "host:port" proxy used for every request, ignored when requests_handler is given.
+            - polling: The default PollingStrategy of the wait methods.
+            - session_cache: A SessionCache to reuse the session of a previous process instead of logging in.
+            - requests_handler: A RequestsHandler configured by the caller (pool size, timeouts, retries, HTTP/2...).
+            - model_catalog: A ModelCatalog, or True for the default one, used to fill in the sd_version and dimensions of new generations.
+            - submission_cache: A SubmissionCache, create_generate_image then returns the existing generation of an identical request instead of creating a new one.
+            - metrics: A Metrics recording the generation timings: submit to complete ("generation") and complete to fetched ("fetch").
+            - proxy_pool: A ProxyPool to spread the requests over, instead of proxy, ignored when requests_handler is given.
+            - validator: A GenerationValidator, or True for one built from the model catalog, checking new generations before they are sent.
+        """
+        self._requests_handler = requests_handler if requests_handler is not None else RequestsHandler(proxy=proxy, proxy_pool=proxy_pool)
+        self.user = User(username=username, password=password, requests_handler=self._requests_handler, session_cache=session_cache)
+        self._requests_handler.start_token_refresher()
+        self.tracker = CompletionTracker(polling=polling)
+        self._poller: GenerationPoller = None
+        self.submission_cache = submission_cache
+        self.metrics = metrics
+        # generation id -> time.monotonic() it was found complete, until it is fetched
+        self._completed_at: Dict[str, float] = {}
+        if metrics is not None:
+            self.tracker.finished_callbacks.append(self._on_generation_finished)
+        self._catalog: "ModelCatalog" = None
+        if model_catalog is True:
+            from leonardoWrapper.util.catalog import ModelCatalog
+            self._catalog = ModelCatalog(self.user)
+        elif model_catalog is not None and model_catalog is not False:
+            self._catalog = model_catalog
+        self.validator: "GenerationValidator" = None
+        if validator is True:
+            from leonardoWrapper.util.validation import GenerationValidator
+            self.validator = GenerationValidator(self.catalog)
+        elif validator is not None and validator is not False:
+            self.validator = validator
+
+
+    def __enter__(self) -> "Leonardo":
+        return self
+
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+    def close(self) -> None:
+        """
+        Stop the background poller and the token refresher, and close the RequestsHandler (also when given by the caller).
+        """
+        if self._poller is not None:
+            self._poller.stop()
+        self._requests_handler.close()
 
 
-    def create_generate_image(self, prompt: str, model_id: str, negative_prompt: str = "", nswf: bool = False, image_size: int = 7, sd_version: str = None, amount_of_images: int = 4, width: int = 1368, height: int = 768, num_inference_steps: int = 10, guidance_scale: int = 7, scheduler: str = None, tiling: bool = False, public: bool = False, leonardo_magic: bool = False, enhance_prompt: bool = True, contrast: float = 3.5, preset_style: str = None, pose_to_image: bool = False, pose_to_image_type: str = "POSE", weighting: float = 0.75, high_contrast: bool = False, transparency: Literal["enabled", "disabled"] = "disabled", photo_real: bool = False, seed: int = None) -> str:
+    def create_generate_image(self, prompt: str, model_id: str, negative_prompt: str = "", nswf: bool = False, image_size: int = 7, sd_version: str = None, amount_of_images: int = 4, width: int = None, height: int = None, num_inference_steps: int = 10, guidance_scale: int = 7, scheduler: str = None, tiling: bool = False, public: bool = False, leonardo_magic: bool = False, enhance_prompt: bool = True, contrast: float = 3.5, preset_style: str = None, pose_to_image: bool = False, pose_to_image_type: str = "POSE", weighting: float = 0.75, high_contrast: bool = False, transparency: Literal["enabled", "disabled"] = "disabled", photo_real: bool = False, seed: int = None) -> str:
         """
         Create a task to generate an image based on the provided prompt.
         Parameters:
@@ -23,10 +86,10 @@ class Leonardo:
             - model_id: The model to be used for generating the image.
             - nswf: Whether the generated image should be safe for work.
             - image_size: The size of the generated image.
-            - sd_version: The version of the model to be used for generating the image.
+            - sd_version: The version of the model to be used for generating the image, read from the model catalog when not given.
             - amount_of_images: The number of images to be generated.
-            - width: The width of the generated image.
-            - height: The height of the generated image.
+            - width: The width of the generated image, defaults to the model width from the catalog, or 1368.
+            - height: The height of the generated image, defaults to the model height from the catalog, or 768.
             - num_inference_steps: The number of inference steps to be taken.
             - guidance_scale: The stronger the guidance scale, the more the generated image will reflect the prompt, it must be between 1 and 20.
             - scheduler: The scheduler to be used for generating the image.
@@ -41,172 +104,288 @@ class Leonardo:
             - transparency: Whether to use transparency for generating the image.
             - photo_real: Whether to use photo real for generating the image.
             - seed: The seed to be used for generating the image.
+        A validator (see GenerationValidator) raises InvalidGenerationError before anything is sent.
         """
+        if self._catalog is not None and (sd_version is None or width is None or height is None):
+            model = self._catalog.get(model_id) or {}
+            if sd_version is None:
+                sd_version = model.get("sdVersion")
+            if width is None:
+                width = model.get("modelWidth")
+            if height is None:
+                height = model.get("modelHeight")
+        width = width or 1368
+        height = height or 768
 
-        if guidance_scale < 1 or guidance_scale > 20:
-            raise ValueError("guidance_scale must be between 1 and 20.")
-
+        generation_input = queries.generation_input(
+            prompt=prompt, model_id=model_id, negative_prompt=negative_prompt, nswf=nswf, image_size=image_size,
+            sd_version=sd_version, amount_of_images=amount_of_images, width=width, height=height,
+            num_inference_steps=num_inference_steps, guidance_scale=guidance_scale, scheduler=scheduler,
+            tiling=tiling, public=public, leonardo_magic=leonardo_magic, enhance_prompt=enhance_prompt,
+            contrast=contrast, preset_style=preset_style, pose_to_image=pose_to_image,
+            pose_to_image_type=pose_to_image_type, weighting=weighting, high_contrast=high_contrast,
+            transparency=transparency, photo_real=photo_real, seed=seed
+        )
+        if self.validator is not None:
+            generation_input = self.validator.validate(generation_input)
+        key = None
+        if self.submission_cache is not None:
+            from leonardoWrapper.util.idempotency import submission_key
+            key = submission_key(self.user.user_informations["user_id"], generation_input)
+            submission = self.submission_cache.lookup(key)
+            if submission is not None:
+                return submission[0]
 
         make_request = self._requests_handler.send_graphql_request(
-            json_data={
-                "operationName": "CreateSDGenerationJob",
-                "variables": {
-                    "arg1": {
-                        "prompt": prompt,
-                        "negative_prompt": negative_prompt,
-                        "nsfw": nswf,
-                        "num_images": amount_of_images,
-                        "width": width,
-                        "height": height,
-                        "image_size": image_size,
-                        "num_inference_steps": num_inference_steps,
-                        "contrast": contrast,
-                        "guidance_scale": guidance_scale,
-                        "sd_version": sd_version,
-                        "modelId": model_id,
-                        "presetStyle": preset_style,
-                        "scheduler": scheduler,
-                        "public": public,
-                        "tiling": tiling,
-                        "leonardoMagic": leonardo_magic,
-                        "poseToImage": pose_to_image,
-                        "poseToImageType": pose_to_image_type,
-                        "weighting": weighting,
-                        "highContrast": high_contrast,
-                        "elements": [],
-                        "userElements": [],
-                        "controlnets": [],
-                        "photoReal": photo_real,
-                        "transparency": transparency,
-                        "styleUUID": "111dc692-d470-4eec-b791-3475abac4c46",
-                        "enhancePrompt": enhance_prompt,
-                        "collectionIds": [],
-                        "seed": seed
-                    }
-                },
-                "query": "mutation CreateSDGenerationJob($arg1: SDGenerationInput!) { sdGenerationJob(arg1: $arg1) { generationId __typename } }"
-            }
+            json_data=queries.create_generation_job(generation_input)
         )
 
         if "errors" in make_request["json"]:
             raise Exception(make_request["json"]["errors"][0]["message"])
 
         try:
-            return make_request["json"]["data"]["sdGenerationJob"]["generationId"]
+            generation_id = make_request["json"]["data"]["sdGenerationJob"]["generationId"]
         except:
             raise Exception("Failed to create the image generation task.")
 
+        self.tracker.record_submission(generation_id, generation_input)
+        if key is not None:
+            self.submission_cache.store(key, generation_id)
+        return generation_id
+
+
+    def wait_for_image_generation(self, creation_id: str, check_interval: int = 5, polling: PollingStrategy = None, timeout: float = None) -> None:
+        self.wait_for_generations([creation_id], check_interval=check_interval, polling=polling, timeout=timeout)
+
+
+    def wait_for_generations(self, creation_ids: List[str], check_interval: int = 5, polling: PollingStrategy = None, timeout: float = None) -> Dict[str, str]:
+        """
+        Wait until every generation in creation_ids is finished, polling all of them with a single query per tick.
+        Returns a mapping of generation id to its final status ("COMPLETE" or "FAILED").
+        Parameters:
+            - check_interval: The number of seconds between two polls when no polling strategy is set.
+            - polling: The PollingStrategy to use instead of the client default, e.g. AdaptivePolling().
+            - timeout: The maximum number of seconds to wait, a TimeoutError is raised once it is exceeded.
+        """
+        finished = self._poll_until_finished(creation_ids, check_interval, polling, timeout, queries.generation_statuses)
+        return {creation_id: generation["status"] for creation_id, generation in finished.items()}
+
+
+    def wait_for_results(self, creation_ids: List[str], check_interval: int = 5, polling: PollingStrategy = None, timeout: float = None) -> Dict[str, GeneratedImage]:
+        """
+        Wait until every generation in creation_ids is finished like wait_for_generations, but poll with a query that
+        also selects the images, so the poll finding a generation finished returns it without a GetAIGenerationFeed round trip.
+        Returns a mapping of generation id to GeneratedImage, failed generations included with their "FAILED" status.
+        """
+        generated_images: Dict[str, GeneratedImage] = {}
+        creation_ids = list(dict.fromkeys(creation_ids))
+        if self.submission_cache is not None:
+            for creation_id in creation_ids:
+                generated_image = self.submission_cache.generated_image(creation_id)
+                if generated_image is not None:
+                    generated_images[creation_id] = generated_image
+            creation_ids = [creation_id for creation_id in creation_ids if creation_id not in generated_images]
+        if not creation_ids:
+            return generated_images
+
+        for creation_id, generation in self._poll_until_finished(creation_ids, check_interval, polling, timeout, queries.generation_results).items():
+            generated_images[creation_id] = parse_generated_image(generation)
+            completed_at = self._completed_at.pop(creation_id, None)
+            if completed_at is not None:
+                self.metrics.observe_job("fetch", time.monotonic() - completed_at)
+            if self.submission_cache is not None and generation["status"] == "COMPLETE":
+                self.submission_cache.store_generated_image(generated_images[creation_id])
+        return generated_images
+
+
+    def generate(self, prompt: str, model_id: str, check_interval: int = 5, polling: PollingStrategy = None, timeout: float = None, **generation_options) -> GeneratedImage:
+        """
+        Create a generation, wait for it and return it: one create request, then status polls of which the last one
+        carries the images.
+        A failed generation is returned with its "FAILED" status.
+        Parameters:
+            - check_interval, polling, timeout: See wait_for_generations.
+            - generation_options: The other parameters of create_generate_image.
+        """
+        creation_id = self.create_generate_image(prompt=prompt, model_id=model_id, **generation_options)
+        return self.wait_for_results([creation_id], check_interval=check_interval, polling=polling, timeout=timeout)[creation_id]
 
-    def wait_for_image_generation(self, creation_id: str, check_interval: int = 5) -> None:
+
+    def _poll_until_finished(self, creation_ids: List[str], check_interval: int, polling: PollingStrategy, timeout: float, query: Callable[[List[str]], dict]) -> Dict[str, dict]:
+        """
+        Poll creation_ids with query (generation_statuses or generation_results) until all of them are finished.
+        Returns a mapping of generation id to the generation returned by the poll that found it finished.
+        """
+        schedule = self.tracker.schedule_for(list(dict.fromkeys(creation_ids)), polling=polling, check_interval=check_interval)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        generations: Dict[str, dict] = {}
+        # the poller is not built for this, but a configured one sets the batch size
+        batch_size = self._poller.batch_size if self._poller is not None else STATUS_BATCH_SIZE
         while True:
-            try:
+            wait = schedule.time_until_next()
+            if deadline is not None:
+                wait = min(wait, max(0, deadline - time.monotonic()))
+            time.sleep(wait)
+
+            due = schedule.due()
+            polled = schedule.ids()
+            for batch in chunked(polled, batch_size):
                 get_status = self._requests_handler.send_graphql_request(
-                    json_data={
-                        "operationName": "GetAIGenerationFeedStatuses",
-                        "variables": {
-                            "where": {
-                                "status": {
-                                    "_in": [
-                                        "COMPLETE",
-                                        "FAILED"
-                                    ]
-                                },
-                                "id": {
-                                    "_in": [
-                                        creation_id
-                                    ]
-                                }
-                            }
-                        },
-                        "query": "query GetAIGenerationFeedStatuses($where: generations_bool_exp = {}) { generations(where: $where) { id status __typename } }"
-                    }
+                    json_data=query(batch)
                 )
+                finished = parse_finished_statuses(get_status)
+                self.tracker.record_finished(finished, schedule)
+                for generation in get_status["json"]["data"]["generations"]:
+                    generations[generation["id"]] = generation
+                for creation_id, status in finished.items():
+                    schedule.remove(creation_id)
+                    if status != "COMPLETE" and self.submission_cache is not None:
+                        self.submission_cache.discard(creation_id)
+
+            if not schedule:
+                return generations
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"{len(schedule)} image generations did not finish within {timeout} seconds.")
+            schedule.polled(polled, due)
+
 
-                if get_status["json"]["data"]["generations"] != []:
+    def _on_generation_finished(self, creation_id: str, status: str, seconds: float) -> None:
+        self.metrics.observe_finished(status)
+        if status == "COMPLETE":
+            self.metrics.observe_job("generation", seconds)
+            if len(self._completed_at) >= 10000:
+                # generations that are never fetched must not pile up
+                self._completed_at.pop(next(iter(self._completed_at)), None)
+            self._completed_at[creation_id] = time.monotonic()
+
+
+    @property
+    def catalog(self) -> "ModelCatalog":
+        """
+        The ModelCatalog of this client, created on first access when none was given.
+        """
+        if self._catalog is None:
+            from leonardoWrapper.util.catalog import ModelCatalog
+            self._catalog = ModelCatalog(self.user)
+        return self._catalog
+
+
+    @property
+    def poller(self) -> GenerationPoller:
+        """
+        A background GenerationPoller shared by everything using this client, poller.track(creation_id) returns a future.
+        """
+        if self._poller is None:
+            self._poller = GenerationPoller(self._requests_handler, polling=self.tracker.polling, tracker=self.tracker)
+        return self._poller
+
+
+
+    def get_image_generation(self, creation_id: str) -> GeneratedImage:
+        generated_images = self.get_image_generations([creation_id])
+        if creation_id not in generated_images:
+            raise Exception("Failed to get the image generation.")
+
+        return generated_images[creation_id]
+
+
+    def get_image_generations(self, creation_ids: List[str], batch_size: int = 100, page_size: int = 50, fields: Iterable[str] = None) -> Dict[str, GeneratedImage]:
+        """
+        Fetch many generations at once, the ids are sent in batches of batch_size and each batch is paginated by page_size.
+        Returns a mapping of generation id to GeneratedImage, ids that were not found are left out.
+        Parameters:
+            - fields: Only fetch these generation fields, dotted paths like ["status", "generated_images.url"], the others are set to None.
+        """
+        generated_images: Dict[str, GeneratedImage] = {}
+        creation_ids = list(dict.fromkeys(creation_ids))
+        if self.submission_cache is not None:
+            for creation_id in creation_ids:
+                generated_image = self.submission_cache.generated_image(creation_id)
+                if generated_image is not None:
+                    generated_images[creation_id] = generated_image
+            creation_ids = [creation_id for creation_id in creation_ids if creation_id not in generated_images]
+
+        for batch in chunked(creation_ids, batch_size):
+            offset = 0
+            while True:
+                json_data = queries.generation_feed(self.user.user_informations["user_id"], batch, offset=offset, limit=page_size)
+                if fields is not None:
+                    json_data = project(json_data, fields)
+
+                get_solution = self._requests_handler.send_graphql_request(json_data=json_data)
+
+                if "errors" in get_solution["json"]:
+                    raise Exception(get_solution["json"]["errors"][0]["message"])
+
+                generations = get_solution["json"]["data"]["generations"]
+                for generation in generations:
+                    generated_images[generation["id"]] = parse_generated_image(generation)
+                    completed_at = self._completed_at.pop(generation["id"], None)
+                    if completed_at is not None:
+                        self.metrics.observe_job("fetch", time.monotonic() - completed_at)
+                    if self.submission_cache is not None and fields is None and generation.get("status") == "COMPLETE":
+                        self.submission_cache.store_generated_image(generated_images[generation["id"]])
+
+                offset += len(generations)
+                if len(generations) < page_size or offset >= len(batch):
                     break
-                else:
-                    time.sleep(check_interval)
-
-            except:
-                raise Exception("Failed to get the status of the image generation.")
-
-
-
-    def get_image_generation(self, creation_id: str):
-        get_solution = self._requests_handler.send_graphql_request(
-            json_data={
-                "operationName": "GetAIGenerationFeed",
-                    "variables": {
-                        "where": {
-                            "userId": {
-                                "_eq": self.user.user_informations["user_id"]
-                            },
-                            "teamId": {
-                                "_is_null": True
-                            },
-                            "canvasRequest": {
-                                "_eq": False
-                            },
-                            "universalUpscaler": {
-                                "_is_null": True
-                            },
-                            "isStoryboard": {
-                                "_eq": False
-                            },
-                            "id": {
-                                "_in": [
-                                    creation_id
-                                ]
-                            }
-                        },
-                        "offset": 0,
-                        "limit": 10
-                    },
-                "query": "query GetAIGenerationFeed($where: generations_bool_exp = {}, $userId: uuid, $limit: Int, $offset: Int = 0) { generations( limit: $limit offset: $offset order_by: [{createdAt: desc}] where: $where) { modelId scheduler coreModel sdVersion prompt negativePrompt id status quantity createdAt public seed nsfw custom_model { id userId name modelHeight modelWidth } generated_images(order_by: [{url: desc}]) { id url nsfw } } }"
-            }
-        )
 
+        return generated_images
 
 
-        generated_image = GeneratedImage(
-            {
-                "nsfw": get_solution["json"]["data"]["generations"][0]["nsfw"],
-                "model_id": get_solution["json"]["data"]["generations"][0]["modelId"],
-                "scheduler": get_solution["json"]["data"]["generations"][0]["scheduler"],
-                "coreModel": get_solution["json"]["data"]["generations"][0]["coreModel"],
-                "sdVersion": get_solution["json"]["data"]["generations"][0]["sdVersion"],
-                "prompt": get_solution["json"]["data"]["generations"][0]["prompt"],
-                "negativePrompt": get_solution["json"]["data"]["generations"][0]["negativePrompt"],
-                "status": get_solution["json"]["data"]["generations"][0]["status"],
-                "quantity": get_solution["json"]["data"]["generations"][0]["quantity"],
-                "createdAt": get_solution["json"]["data"]["generations"][0]["createdAt"],
-                "public": get_solution["json"]["data"]["generations"][0]["public"],
-                "nsfw": get_solution["json"]["data"]["generations"][0]["nsfw"],
-                "seed": get_solution["json"]["data"]["generations"][0]["seed"],
-                "generated_images": [
-                    {
-                        "id": image["id"],
-                        "url": image["url"],
-                        "nsfw": image["nsfw"]
-                    } for image in get_solution["json"]["data"]["generations"][0]["generated_images"]
-                ]
-            }
-        )
+    def iter_image_generations(self, created_before: str = None, created_after: str = None, page_size: int = 50, fields: Iterable[str] = None, after_inclusive: bool = False) -> Iterator[GeneratedImage]:
+        """
+        Lazily iterate over the generations of the account, newest first, fetching a page whenever the previous one is consumed.
+        Pages are chained on the createdAt of their last generation, so generations created meanwhile do not shift them.
+        The next page starts at that createdAt included, the generations already yielded at it are skipped by id, so
+        generations sharing a timestamp across a page boundary are neither lost nor repeated.
+        Parameters:
+            - created_before: Start with the generations created before this ISO timestamp.
+            - created_after: Stop at the generations created before this ISO timestamp.
+            - fields: Only fetch these generation fields, see get_image_generations ("id" and "createdAt" are always fetched).
+            - after_inclusive: Also yield the generations created exactly at created_after.
+        """
+        if fields is not None:
+            fields = set(fields) | {"id", "createdAt"}
 
-        try:
-            generated_image.update(
-                {
-                    "custom_model": {
-                        "id": get_solution["json"]["data"]["generations"][0]["custom_model"]["id"],
-                        "userId": get_solution["json"]["data"]["generations"][0]["custom_model"]["userId"],
-                        "name": get_solution["json"]["data"]["generations"][0]["custom_model"]["name"],
-                        "modelHeight": get_solution["json"]["data"]["generations"][0]["custom_model"]["modelHeight"],
-                        "modelWidth": get_solution["json"]["data"]["generations"][0]["custom_model"]["modelWidth"]
-                    },
-                }
-            )
-        except:
-            pass
+        user_id = self.user.user_informations["user_id"]
+        # the ids already yielded at created_before, once it is the cursor of a previous page
+        cursor_ids = None
+        offset = 0
+        while True:
+            json_data = queries.generation_feed(user_id, offset=offset, limit=page_size, created_before=created_before, created_after=created_after, before_inclusive=cursor_ids is not None, after_inclusive=after_inclusive)
+            if fields is not None:
+                json_data = project(json_data, fields)
+
+            get_page = self._requests_handler.send_graphql_request(json_data=json_data)
+            if "errors" in get_page["json"]:
+                raise Exception(get_page["json"]["errors"][0]["message"])
+
+            generations = get_page["json"]["data"]["generations"]
+            for generation in generations:
+                if cursor_ids is None or generation["createdAt"] != created_before or generation["id"] not in cursor_ids:
+                    yield parse_generated_image(generation)
 
+            if len(generations) < page_size:
+                return
+            last_created_at = generations[-1]["createdAt"]
+            page_ids = {generation["id"] for generation in generations if generation["createdAt"] == last_created_at}
+            if cursor_ids is not None and last_created_at == created_before:
+                # a whole page shares the cursor timestamp, move through those by offset
+                cursor_ids |= page_ids
+                offset += page_size
+            else:
+                created_before, cursor_ids, offset = last_created_at, page_ids, 0
+
+
+    def download_images(self, generated_images: Union[GeneratedImage, List[GeneratedImage]], directory: str, max_workers: int = 8, naming: Literal["id", "sha256"] = "id") -> Dict[str, str]:
+        """
+        Download the images of one or more generations into directory, returns a mapping of image id to file path.
+        See ImageDownloader for the details.
+        """
+        if isinstance(generated_images, Mapping):
+            generated_images = [generated_images]
 
-        return generated_image
\ No newline at end of file
+        from leonardoWrapper.util.downloader import ImageDownloader
+        downloader = ImageDownloader(self._requests_handler, directory=directory, max_workers=max_workers, naming=naming)
+        return downloader.download(generated_images)
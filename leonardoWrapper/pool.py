@@ -0,0 +1,228 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Union
+
+from leonardoWrapper.leonardo import Leonardo
+from leonardoWrapper.types.GeneratedImage import GeneratedImage
+
+
+def _as_number(value) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+class LeonardoPool:
+    """
+    Spreads generations over several accounts, each with its own Leonardo client (and RequestsHandler/proxy).
+    A new generation goes to the account with the most headroom: its apiCredit plus subscriptionTokens, minus the
+    tokens reserved by its generations still in flight. Balances are refreshed one account at a time, the stalest
+    one being refreshed during a create_generate_image call once it is older than refresh_interval.
+    Parameters:
+        - accounts: Leonardo clients, or dicts of Leonardo keyword arguments (username, password, proxy...).
+        - refresh_interval: The number of seconds after which an account balance is considered stale.
+        - tokens_per_image: The estimated number of tokens one image costs, used to reserve headroom for in-flight generations.
+    """
+    def __init__(self, accounts: List[Union[Leonardo, dict]], refresh_interval: float = 60, tokens_per_image: float = 1) -> None:
+        if not accounts:
+            raise ValueError("accounts must not be empty.")
+
+        self.accounts: List[Leonardo] = [account if isinstance(account, Leonardo) else Leonardo(**account) for account in accounts]
+        self.refresh_interval = refresh_interval
+        self.tokens_per_image = tokens_per_image
+        self._balances: List[float] = [self._read_balance(account) for account in self.accounts]
+        self._refreshed_at: List[float] = [time.monotonic()] * len(self.accounts)
+        self._reserved: List[float] = [0] * len(self.accounts)
+        self._in_flight: List[int] = [0] * len(self.accounts)
+        # generation id -> account index, and generation id -> tokens reserved until it finishes
+        self._owners: Dict[str, int] = {}
+        self._reservations: Dict[str, float] = {}
+        # the owners of the latest released generations, so that they can still be fetched after a wait
+        self._released_owners: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def __enter__(self) -> "LeonardoPool":
+        return self
+
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+    def close(self) -> None:
+        """
+        Close the client of every account, see Leonardo.close.
+        """
+        for account in self.accounts:
+            account.close()
+
+
+    @staticmethod
+    def _read_balance(account: Leonardo) -> float:
+        user_informations = account.user.user_informations
+        return _as_number(user_informations.get("api_credit")) + _as_number(user_informations.get("subscriptions", {}).get("subscriptionTokens"))
+
+
+    def refresh_balance(self, index: int) -> None:
+        self.accounts[index].user.get_user_informations()
+        balance = self._read_balance(self.accounts[index])
+        with self._lock:
+            self._balances[index] = balance
+            self._refreshed_at[index] = time.monotonic()
+
+
+    def refresh_balances(self) -> None:
+        for index in range(len(self.accounts)):
+            self.refresh_balance(index)
+
+
+    def _refresh_stalest(self) -> None:
+        with self._lock:
+            index = min(range(len(self.accounts)), key=self._refreshed_at.__getitem__)
+            if time.monotonic() - self._refreshed_at[index] < self.refresh_interval:
+                return
+            # claim the refresh so that concurrent callers pick another account
+            self._refreshed_at[index] = time.monotonic()
+        try:
+            self.refresh_balance(index)
+        except Exception:
+            pass
+
+
+    def headroom(self, index: int) -> float:
+        return self._balances[index] - self._reserved[index]
+
+
+    def acquire_account(self, amount_of_images: int = 4) -> Leonardo:
+        """
+        Pick the account with the most headroom and reserve the tokens of a generation on it,
+        the reservation is released by release(), which the pool's wait and get methods call once a generation is finished.
+        """
+        self._refresh_stalest()
+
+        cost = amount_of_images * self.tokens_per_image
+        with self._lock:
+            index = max(range(len(self.accounts)), key=lambda index: (self.headroom(index), -self._in_flight[index]))
+            if self.headroom(index) < cost:
+                raise Exception("No account has enough tokens left for this generation.")
+            self._reserved[index] += cost
+            self._in_flight[index] += 1
+        return self.accounts[index]
+
+
+    def _unreserve(self, account: Leonardo, cost: float) -> None:
+        index = self.accounts.index(account)
+        with self._lock:
+            self._reserved[index] -= cost
+            self._in_flight[index] -= 1
+
+
+    def create_generate_image(self, account: Leonardo = None, **kwargs) -> str:
+        """
+        Create a generation on the account with the most headroom, or on the given account of the pool
+        (already reserved through acquire_account). Takes the keyword arguments of Leonardo.create_generate_image.
+        """
+        cost = kwargs.get("amount_of_images", 4) * self.tokens_per_image
+        if account is None:
+            account = self.acquire_account(kwargs.get("amount_of_images", 4))
+
+        try:
+            generation_id = account.create_generate_image(**kwargs)
+        except:
+            self._unreserve(account, cost)
+            raise
+
+        with self._lock:
+            if generation_id in self._reservations:
+                # a SubmissionCache returned a generation still in flight, it is already reserved
+                index = self.accounts.index(account)
+                self._reserved[index] -= cost
+                self._in_flight[index] -= 1
+            else:
+                self._owners[generation_id] = self.accounts.index(account)
+                self._reservations[generation_id] = cost
+        return generation_id
+
+
+    def _owner(self, creation_id: str) -> int:
+        with self._lock:
+            index = self._owners.get(creation_id, self._released_owners.get(creation_id))
+        if index is None:
+            raise KeyError(f"The image generation {creation_id} was not created through this pool.")
+        return index
+
+
+    def account_for(self, creation_id: str) -> Leonardo:
+        return self.accounts[self._owner(creation_id)]
+
+
+    def release(self, creation_id: str, spent: bool = True) -> None:
+        """
+        Release the tokens reserved for a generation, spent when it completed (or may still complete).
+        Only the owners of the latest 10000 released generations are remembered for the get methods.
+        """
+        with self._lock:
+            cost = self._reservations.pop(creation_id, None)
+            if cost is None:
+                return
+            index = self._owners.pop(creation_id)
+            self._reserved[index] -= cost
+            self._in_flight[index] -= 1
+            if spent:
+                # keep the local balance close to the real one until the next refresh
+                self._balances[index] -= cost
+            self._released_owners[creation_id] = index
+            if len(self._released_owners) > 10000:
+                self._released_owners.popitem(last=False)
+
+
+    def _group_by_account(self, creation_ids: List[str]) -> Dict[int, List[str]]:
+        groups: Dict[int, List[str]] = {}
+        for creation_id in creation_ids:
+            groups.setdefault(self._owner(creation_id), []).append(creation_id)
+        return groups
+
+
+    def wait_for_image_generation(self, creation_id: str, **kwargs) -> None:
+        self.wait_for_generations([creation_id], **kwargs)
+
+
+    def wait_for_generations(self, creation_ids: List[str], **kwargs) -> Dict[str, str]:
+        """
+        Wait for generations created through the pool, see Leonardo.wait_for_generations.
+        Each account polls its own generations, the reservations are released as the accounts finish, and as spent
+        when the wait fails or times out.
+        """
+        statuses: Dict[str, str] = {}
+        try:
+            for index, account_ids in self._group_by_account(creation_ids).items():
+                statuses.update(self.accounts[index].wait_for_generations(account_ids, **kwargs))
+        finally:
+            for creation_id in creation_ids:
+                self.release(creation_id, spent=statuses.get(creation_id, "COMPLETE") == "COMPLETE")
+        return statuses
+
+
+    def get_image_generation(self, creation_id: str) -> GeneratedImage:
+        generated_images = self.get_image_generations([creation_id])
+        if creation_id not in generated_images:
+            raise Exception("Failed to get the image generation.")
+
+        return generated_images[creation_id]
+
+
+    def get_image_generations(self, creation_ids: List[str], **kwargs) -> Dict[str, GeneratedImage]:
+        """
+        Fetch generations created through the pool, see Leonardo.get_image_generations.
+        The reservations of the generations found finished are released.
+        """
+        generated_images: Dict[str, GeneratedImage] = {}
+        for index, account_ids in self._group_by_account(creation_ids).items():
+            generated_images.update(self.accounts[index].get_image_generations(account_ids, **kwargs))
+        for creation_id, generated_image in generated_images.items():
+            if generated_image.get("status") in ("COMPLETE", "FAILED"):
+                self.release(creation_id, spent=generated_image["status"] == "COMPLETE")
+        return generated_images
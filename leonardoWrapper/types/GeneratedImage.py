@@ -1,33 +1,130 @@
-import sys
-from typing import List, Optional, TypedDict
-
-sys.dont_write_bytecode = True
-
-
-class GeneratedSingleImage(TypedDict):
-    id: str
-    url: str
-    nsfw: bool
-
-class CustomModel(TypedDict):
-    id: str
-    userId: str
-    name: str
-    modelHeight: int
-    modelWidth: int
-
-class GeneratedImage(TypedDict):
-    model_id: str
-    scheduler: str
-    coreModel: str
-    sdVersion: str
-    prompt: str
-    negativePrompt: Optional[str] = None
-    id: str
-    status: str
-    quantity: int
-    createdAt: str
-    public: bool
-    nsfw: bool
-    custom_model: CustomModel
-    generated_images: List[GeneratedSingleImage]
\ No newline at end of file
+from collections.abc import Mapping
+from typing import Any, Iterator, List, Optional
+
+
+class _SlottedResult(Mapping):
+    """
+    A result stored in __slots__ instead of a dict, still readable like the dict it replaces:
+    result["url"], result.get("url"), dict(result), result == {...}. Fields are also attributes: result.url.
+    Fields listed in _optional are left out of the mapping while they are None.
+    """
+    __slots__ = ()
+    _optional = frozenset()
+
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        value = getattr(self, key)
+        if value is None and key in self._optional:
+            raise KeyError(key)
+        return value
+
+
+    def __iter__(self) -> Iterator[str]:
+        for key in self.__slots__:
+            if key not in self._optional or getattr(self, key) is not None:
+                yield key
+
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({', '.join(f'{key}={getattr(self, key)!r}' for key in self)})"
+
+
+    def to_dict(self) -> dict:
+        """
+        Returns the result as plain (JSON serializable) dicts and lists.
+        """
+        return {key: _to_plain(getattr(self, key)) for key in self}
+
+
+def json_default(value: Any) -> Any:
+    """
+    The default= hook of json.dumps/json.dump for results: json.dumps(generated_image, default=json_default).
+    """
+    if isinstance(value, _SlottedResult):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _to_plain(value: Any) -> Any:
+    if isinstance(value, _SlottedResult):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [_to_plain(item) for item in value]
+    return value
+
+
+class GeneratedSingleImage(_SlottedResult):
+    __slots__ = ("id", "url", "nsfw")
+
+    def __init__(self, id: str, url: str, nsfw: bool) -> None:
+        self.id = id
+        self.url = url
+        self.nsfw = nsfw
+
+
+    @classmethod
+    def from_dict(cls, image: dict) -> "GeneratedSingleImage":
+        return cls(image.get("id"), image.get("url"), image.get("nsfw"))
+
+
+class CustomModel(_SlottedResult):
+    __slots__ = ("id", "userId", "name", "modelHeight", "modelWidth")
+
+    def __init__(self, id: str, userId: str, name: str, modelHeight: int, modelWidth: int) -> None:
+        self.id = id
+        self.userId = userId
+        self.name = name
+        self.modelHeight = modelHeight
+        self.modelWidth = modelWidth
+
+
+    @classmethod
+    def from_dict(cls, custom_model: dict) -> "CustomModel":
+        return cls(custom_model.get("id"), custom_model.get("userId"), custom_model.get("name"), custom_model.get("modelHeight"), custom_model.get("modelWidth"))
+
+
+class GeneratedImage(_SlottedResult):
+    __slots__ = (
+        "id", "nsfw", "model_id", "scheduler", "coreModel", "sdVersion", "prompt", "negativePrompt", "status",
+        "quantity", "createdAt", "public", "seed", "generated_images", "custom_model"
+    )
+    _optional = frozenset({"custom_model"})
+
+    def __init__(self, id: str, nsfw: bool = None, model_id: str = None, scheduler: str = None, coreModel: str = None, sdVersion: str = None, prompt: str = None, negativePrompt: Optional[str] = None, status: str = None, quantity: int = None, createdAt: str = None, public: bool = None, seed: int = None, generated_images: List[GeneratedSingleImage] = None, custom_model: Optional[CustomModel] = None) -> None:
+        self.id = id
+        self.nsfw = nsfw
+        self.model_id = model_id
+        self.scheduler = scheduler
+        self.coreModel = coreModel
+        self.sdVersion = sdVersion
+        self.prompt = prompt
+        self.negativePrompt = negativePrompt
+        self.status = status
+        self.quantity = quantity
+        self.createdAt = createdAt
+        self.public = public
+        self.seed = seed
+        self.generated_images = generated_images if generated_images is not None else []
+        self.custom_model = custom_model
+
+
+    @classmethod
+    def from_dict(cls, generated_image: dict) -> "GeneratedImage":
+        """
+        Rebuild a GeneratedImage from its to_dict() form, e.g. after a JSON round trip.
+        """
+        custom_model = generated_image.get("custom_model")
+        return cls(
+            generated_image["id"], generated_image.get("nsfw"), generated_image.get("model_id"), generated_image.get("scheduler"),
+            generated_image.get("coreModel"), generated_image.get("sdVersion"), generated_image.get("prompt"),
+            generated_image.get("negativePrompt"), generated_image.get("status"), generated_image.get("quantity"),
+            generated_image.get("createdAt"), generated_image.get("public"), generated_image.get("seed"),
+            [GeneratedSingleImage.from_dict(image) for image in generated_image.get("generated_images") or []],
+            CustomModel.from_dict(custom_model) if custom_model else None
+        )
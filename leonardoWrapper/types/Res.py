@@ -1,8 +1,5 @@
-import sys
 from typing import TypedDict
 
-sys.dont_write_bytecode = True
-
 
 class DefaultResponseType(TypedDict):
     status_code: int
@@ -1,8 +1,5 @@
-import sys
 from typing import List, TypedDict
 
-sys.dont_write_bytecode = True
-
 class SubscriptionInfo(TypedDict):
     subscriptionTokens: List[str]
     plan: str
@@ -0,0 +1,101 @@
+from typing import Iterable
+
+from leonardoWrapper.types.UserInformations import UserInfo
+from leonardoWrapper.util import queries
+from leonardoWrapper.util.async_api import AsyncRequestsHandler
+from leonardoWrapper.util.parsing import decode_jwt_payload, parse_user_details
+from leonardoWrapper.util.projection import project
+
+class AsyncUser:
+    """
+    asyncio counterpart of User. Unlike User the constructor does not log in, await login() and get_user_informations() instead.
+    """
+    def __init__(self, username: str, password: str, requests_handler: AsyncRequestsHandler) -> None:
+        self.acc_secrets = {
+            "username": username,
+            "password": password
+        }
+        self.requests_handler = requests_handler
+        self.user_informations: UserInfo = {}
+        self.requests_handler.token_refresh_callbacks.append(self._on_token_refresh)
+
+
+
+    def _on_token_refresh(self, access_token: str) -> None:
+        self.user_informations["access_token"] = access_token
+
+
+
+    async def login(self) -> None:
+        get_csrf_token = await self.requests_handler.send_get_request(url=f"{self.requests_handler.app_url}/api/auth/csrf")
+
+        if get_csrf_token["status_code"] != 200 or "csrfToken" not in get_csrf_token["json"]:
+            raise Exception("Failed to get CSRF token")
+
+
+        await self.requests_handler.send_post_request(url=f"{self.requests_handler.app_url}/api/auth/callback/credentials",
+            data=queries.credentials_form(self.acc_secrets["username"], self.acc_secrets["password"], get_csrf_token["json"]["csrfToken"]),
+            headers=queries.login_headers(self.requests_handler.app_url)
+        )
+
+        authed_session = await self.requests_handler.get_authed_session()
+        if authed_session["status_code"] != 200 or not authed_session["json"]:
+            raise Exception("Failed to login, check your credentials")
+
+        self.requests_handler.graphql_authorization_token = authed_session["json"]["accessToken"]
+        get_user_informations = decode_jwt_payload(authed_session["json"]["accessToken"])
+
+        self.user_informations.update(
+            {
+                "email": authed_session["json"]["user"]["email"],
+                "access_token": authed_session["json"]["accessToken"],
+                "sub": get_user_informations["sub"],
+                "email_verified": get_user_informations["email_verified"],
+            }
+        )
+
+
+
+    async def get_user_informations(self) -> None:
+        get_user_id = await self.requests_handler.send_graphql_request(
+            json_data=queries.user_details(self.user_informations["sub"])
+        )
+
+        if get_user_id["status_code"] != 200 or "data" not in get_user_id["json"]:
+            raise Exception("Failed to get user informations")
+
+        self.user_informations.update(parse_user_details(get_user_id["json"]))
+
+
+
+    async def update_user_name(self, username: str) -> None:
+        update_username = await self.requests_handler.send_graphql_request(
+            json_data=queries.update_username(username)
+        )
+
+        if "errors" in update_username["json"]:
+            raise Exception(update_username["json"]["errors"][0]["message"])
+
+
+
+    async def view_nsfw(self, enabled: bool) -> None:
+        view_nsfw = await self.requests_handler.send_graphql_request(
+            json_data=queries.update_view_nsfw(self.user_informations["user_id"], enabled)
+        )
+
+        if "errors" in view_nsfw["json"]:
+            raise Exception(view_nsfw["json"]["errors"][0]["message"])
+
+
+
+    async def get_global_models(self, limit: int = 50, offset: int = 0, created_after: str = None, fields: Iterable[str] = None) -> dict:
+        json_data = queries.feed_models(self.user_informations["user_id"], limit, offset, created_after)
+        if fields is not None:
+            json_data = project(json_data, fields)
+
+        get_models = await self.requests_handler.send_graphql_request(json_data=json_data)
+
+        if "errors" in get_models["json"]:
+            raise Exception(get_models["json"]["errors"][0]["message"])
+
+        return get_models["json"]
@@ -1,50 +1,81 @@
-import base64
-import json
-import sys
-from datetime import datetime, timezone;
+from typing import TYPE_CHECKING, Iterable
 
 from leonardoWrapper.types.UserInformations import UserInfo
+from leonardoWrapper.util import queries
 from leonardoWrapper.util.api import RequestsHandler
+from leonardoWrapper.util.parsing import decode_jwt_payload, parse_user_details
+from leonardoWrapper.util.projection import project
 
-sys.dont_write_bytecode = True
+if TYPE_CHECKING:
+    from leonardoWrapper.util.session_cache import SessionCache
 
 class User:
-    def __init__(self, username: str, password: str, requests_handler: RequestsHandler) -> None:
+    def __init__(self, username: str, password: str, requests_handler: RequestsHandler, session_cache: "SessionCache" = None) -> None:
         self.acc_secrets = {
             "username": username,
             "password": password
         }
         self.requests_handler = requests_handler
+        self.session_cache = session_cache
         self.user_informations: UserInfo = {}
 
-        self.login()
-        self.get_user_informations()
+        if session_cache is None:
+            self.login()
+            self.get_user_informations()
+        else:
+            self.login_with_cache()
+
+        self.requests_handler.token_refresh_callbacks.append(self._on_token_refresh)
+
+
+
+    def _on_token_refresh(self, access_token: str) -> None:
+        self.user_informations["access_token"] = access_token
+        if self.session_cache is not None:
+            with self.session_cache.lock(self.acc_secrets["username"]):
+                self.session_cache.store(
+                    self.acc_secrets["username"],
+                    cookies=self.requests_handler.export_cookies(),
+                    access_token=access_token,
+                    user_informations=self.user_informations
+                )
+
+
+
+    def login_with_cache(self) -> None:
+        """
+        Reuse the session stored in the session cache, or log in and store the new session.
+        The cache entry stays locked meanwhile so that concurrent processes log in only once.
+        """
+        with self.session_cache.lock(self.acc_secrets["username"]):
+            cached_session = self.session_cache.load(self.acc_secrets["username"])
+            if cached_session is not None:
+                self.requests_handler.import_cookies(cached_session["cookies"])
+                self.requests_handler.graphql_authorization_token = cached_session["access_token"]
+                self.user_informations.update(cached_session["user_informations"])
+                return
+
+            self.login()
+            self.get_user_informations()
+            self.session_cache.store(
+                self.acc_secrets["username"],
+                cookies=self.requests_handler.export_cookies(),
+                access_token=self.requests_handler.graphql_authorization_token,
+                user_informations=self.user_informations
+            )
 
 
 
     def login(self) -> None:
-        get_csrf_token = self.requests_handler.send_get_request(url="https://app.leonardo.ai/api/auth/csrf")
+        get_csrf_token = self.requests_handler.send_get_request(url=f"{self.requests_handler.app_url}/api/auth/csrf")
 
         if get_csrf_token["status_code"] != 200 or "csrfToken" not in get_csrf_token["json"]:
             raise Exception("Failed to get CSRF token")
 
 
-        self.requests_handler.send_post_request(url="https://app.leonardo.ai/api/auth/callback/credentials",
-            data={
-                "username": self.acc_secrets["username"],
-                "password": self.acc_secrets["password"],
-                "redirect": False,
-                "callbackUrl": "/",
-                "csrfToken": get_csrf_token["json"]["csrfToken"],
-                "json": True
-            },
-            headers={
-                "Accept": "*/*",
-                "Content-Type": "application/x-www-form-urlencoded",
-                "Host": "app.leonardo.ai",
-                "Origin": "https://app.leonardo.ai",
-                "Referer": "https://app.leonardo.ai/auth/login?callbackUrl=%2F",
-            }
+        self.requests_handler.send_post_request(url=f"{self.requests_handler.app_url}/api/auth/callback/credentials",
+            data=queries.credentials_form(self.acc_secrets["username"], self.acc_secrets["password"], get_csrf_token["json"]["csrfToken"]),
+            headers=queries.login_headers(self.requests_handler.app_url)
         )
 
         authed_session = self.requests_handler.get_authed_session()
@@ -52,7 +83,7 @@ class User:
             raise Exception("Failed to login, check your credentials")
 
         self.requests_handler.graphql_authorization_token = authed_session["json"]["accessToken"]
-        get_user_informations = json.loads(base64.b64decode(authed_session["json"]["accessToken"].split(".")[1]))
+        get_user_informations = decode_jwt_payload(authed_session["json"]["accessToken"])
 
         self.user_informations.update(
             {
@@ -67,44 +98,19 @@ class User:
 
     def get_user_informations(self) -> dict:
         get_user_id = self.requests_handler.send_graphql_request(
-            json_data={
-                "operationName": "GetUserDetails",
-                "variables": {
-                    "userSub": self.user_informations["sub"]
-                },
-                "query": "query GetUserDetails($userSub: String) { users(where: {user_details: {cognitoId: {_eq: $userSub}}}) { id username createdAt user_details { apiCredit subscriptionTokens plan } } }"
-            }
+            json_data=queries.user_details(self.user_informations["sub"])
         )
 
         if get_user_id["status_code"] != 200 or "data" not in get_user_id["json"]:
             raise Exception("Failed to get user informations")
 
-        self.user_informations.update(
-            {
-                "username": get_user_id["json"]["data"]["users"][0]["username"],
-                "created_at": get_user_id["json"]["data"]["users"][0]["createdAt"],
-                "api_credit": get_user_id["json"]["data"]["users"][0]["user_details"][0]["apiCredit"],
-                "user_id": get_user_id["json"]["data"]["users"][0]["id"],
-                "subscriptions": {
-                    "subscriptionTokens": get_user_id["json"]["data"]["users"][0]["user_details"][0]["subscriptionTokens"],
-                    "plan": get_user_id["json"]["data"]["users"][0]["user_details"][0]["plan"]
-                }
-            }
-        )
+        self.user_informations.update(parse_user_details(get_user_id["json"]))
 
 
 
     def update_user_name(self, username: str) -> None:
         update_username = self.requests_handler.send_graphql_request(
-            json_data={
-                "operationName": "UpdateUsername",
-                "variables": {
-                    "arg1": {
-                        "username": username
-                    }
-                },
-                "query": "mutation UpdateUsername($arg1: UpdateUsernameInput!) { updateUsername(arg1: $arg1) { id __typename } }"
-            }
+            json_data=queries.update_username(username)
         )
 
         if "errors" in update_username["json"]:
@@ -114,20 +120,7 @@ class User:
 
     def view_nsfw(self, enabled: bool) -> None:
         view_nsfw = self.requests_handler.send_graphql_request(
-            json_data={
-                "operationName": "UpdateUserDetails",
-                "variables": {
-                    "where": {
-                        "userId": {
-                            "_eq": self.user_informations["user_id"]
-                        }
-                    },
-                    "_set": {
-                        "showNsfw": enabled
-                    }
-                },
-                "query":"mutation UpdateUserDetails($where: user_details_bool_exp!, $_set: user_details_set_input) { update_user_details(where: $where, _set: $_set) { affected_rows __typename } }"
-            }
+            json_data=queries.update_view_nsfw(self.user_informations["user_id"], enabled)
         )
 
         if "errors" in view_nsfw["json"]:
@@ -135,46 +128,20 @@ class User:
 
 
 
-    def get_global_models(self, limit: int = 50) -> dict:
-        get_models = self.requests_handler.send_graphql_request(
-            json_data={
-                "operationName": "GetFeedModels",
-                "variables": {
-                    "order_by": {
-                        "createdAt": "desc"
-                    },
-                    "userId": self.user_informations["user_id"],
-                    "limit": limit,
-                    "where": {
-                        "official": {
-                            "_eq": True
-                        },
-                        "status": {
-                            "_eq": "COMPLETE"
-                        },
-                        "name": {
-                            "_ilike": "%%"
-                        },
-                        "type": {},
-                        "nsfw": {
-                            "_eq": False
-                        },
-                        "createdAt": {
-                            "_lt": datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + "Z"
-                        }
-                    },
-                    "generationsWhere": {
-                        "generated_images": {
-                            "nsfw": {
-                                "_eq": False
-                            }
-                        }
-                    }
-                },
-                "query": "query GetFeedModels($order_by: [custom_models_order_by!] = [{createdAt: desc}], $where: custom_models_bool_exp, $generationsWhere: generations_bool_exp, $userId: uuid!, $limit: Int, $offset: Int) { custom_models( order_by: $order_by where: $where limit: $limit offset: $offset ) { ...ModelParts generations(limit: 1, where: $generationsWhere, order_by: [{createdAt: asc}]) { prompt generated_images(limit: 1, order_by: [{likeCount: desc}]) { id url likeCount __typename } __typename } user_favourite_custom_models(where: {userId: {_eq: $userId}}) { userId __typename } __typename } } fragment ModelParts on custom_models { id name description instancePrompt modelHeight modelWidth coreModel createdAt sdVersion type nsfw motion public trainingStrength user { id username __typename } generated_image { url id __typename } imageCount teamId __typename }"
-            }
-        )
+    def get_global_models(self, limit: int = 50, offset: int = 0, created_after: str = None, fields: Iterable[str] = None) -> dict:
+        """
+        Returns one page of the official models, newest first.
+        Parameters:
+            - limit: The number of models of the page.
+            - offset: The number of models skipped before the page.
+            - created_after: Only return the models created after this ISO timestamp.
+            - fields: Only select these fields, dotted paths like ["name", "sdVersion", "user.username"] ("id" is always selected).
+        """
+        json_data = queries.feed_models(self.user_informations["user_id"], limit, offset, created_after)
+        if fields is not None:
+            json_data = project(json_data, fields)
 
+        get_models = self.requests_handler.send_graphql_request(json_data=json_data)
         
         if "errors" in get_models["json"]:
             raise Exception(get_models["json"]["errors"][0]["message"])
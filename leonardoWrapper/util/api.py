@@ -1,16 +1,76 @@
-import sys
+import importlib
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, List, Tuple, Union
+from urllib.parse import urlparse
 
 import requests
+from requests.adapters import HTTPAdapter
 
 from leonardoWrapper.types.Res import DefaultResponseType
+from leonardoWrapper.util.metrics import Metrics, RequestEvent
+from leonardoWrapper.util.parsing import token_expiry
+from leonardoWrapper.util.resilience import CircuitBreakers, RetryPolicy, is_idempotent_graphql, parse_retry_after
+from leonardoWrapper.util.resilience import circuit_breakers as default_circuit_breakers
 from leonardoWrapper.util.userAgents import get_random_user_agent
 
+if TYPE_CHECKING:
+    from leonardoWrapper.util.proxy_pool import Proxy, ProxyPool
+
+APP_URL = "https://app.leonardo.ai"
+API_URL = "https://api.leonardo.ai"
+GRAPHQL_URL = f"{API_URL}/v1/graphql"
+
+
+def accept_encoding() -> str:
+    # urllib3 only decodes brotli when one of the brotli packages is installed
+    for module in ("brotli", "brotlicffi"):
+        try:
+            importlib.import_module(module)
+            return "gzip, deflate, br"
+        except ImportError:
+            pass
+    return "gzip, deflate"
 
-sys.dont_write_bytecode = True
 
 class RequestsHandler:
-    def __init__(self, proxy: str = None) -> None:
+    """
+    One handler can be shared by many threads: the connection pool is thread-safe and the access token is only
+    swapped under a lock. Size pool_size to the number of threads sending requests at once.
+    Parameters:
+        - proxy: A "host:port" proxy used for every request.
+        - refresh_margin: The access token is renewed through get_authed_session() once it expires within this number of seconds.
+        - timeout: The connect and read timeouts of every request, in seconds.
+        - retry_policy: The RetryPolicy deciding which failed requests are retried and when.
+        - circuit_breakers: The per-endpoint circuit breakers, shared by every handler of the process by default.
+        - pool_size: The number of keep-alive connections kept per host.
+        - pool_block: Whether threads wait for a free connection instead of opening (and then dropping) extra ones when the pool is exhausted.
+        - keep_alive: Whether connections are reused between requests.
+        - http2: Send the GraphQL requests over HTTP/2 with httpx (pip install leonardoWrapper[http2]), multiplexing them on few connections.
+        - trust_env: Whether proxy and certificate settings are read from the environment on every request.
+        - coalesce: Whether the GraphQL queries sent by concurrent threads are merged into one aliased request (see GraphQLCoalescer), mutations are always sent on their own.
+        - coalesce_window: The number of seconds a query waits for others to be merged with.
+        - metrics: A Metrics aggregating the request events, shortcut for request_hooks.append(metrics).
+        - app_url: The base URL of the web app serving the auth endpoints, e.g. a local mock server.
+        - api_url: The base URL of the GraphQL API.
+        - proxy_pool: A ProxyPool spreading the requests over several proxies instead of proxy. The auth requests of the
+          session (login, token refresh) keep going through one sticky proxy of the pool, which only changes when it is ejected.
+        - sticky_proxy: Send every request of the session through its sticky proxy, the pool then only provides failover.
+    The User-Agent is picked once per handler and stays the same whichever proxy a request goes through.
+    Every function of request_hooks is called with a RequestEvent (operation, status, latency, bytes, retries) after each request.
+    """
+    def __init__(self, proxy: str = None, refresh_margin: float = 120, timeout: Union[float, Tuple[float, float]] = (10, 60), retry_policy: RetryPolicy = None, circuit_breakers: CircuitBreakers = None, pool_size: int = 10, pool_block: bool = False, keep_alive: bool = True, http2: bool = False, trust_env: bool = True, coalesce: bool = False, coalesce_window: float = 0.005, metrics: Metrics = None, app_url: str = APP_URL, api_url: str = API_URL, proxy_pool: "ProxyPool" = None, sticky_proxy: bool = False) -> None:
+        if proxy is not None and proxy_pool is not None:
+            raise Exception("Pass either proxy or proxy_pool, not both.")
+        if http2 and proxy_pool is not None:
+            raise Exception("http2=True does not support a proxy_pool, the HTTP/2 client goes through a single proxy.")
+        self.app_url = app_url.rstrip("/")
+        self.graphql_url = f"{api_url.rstrip('/')}/v1/graphql"
         self.requests_session: requests.Session = requests.Session()
+        self.requests_session.trust_env = trust_env
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=pool_block)
+        self.requests_session.mount("https://", adapter)
+        self.requests_session.mount("http://", adapter)
         if proxy is not None:
             self.requests_session.proxies = {
                 "http": f"http://{proxy}",
@@ -18,78 +78,313 @@ class RequestsHandler:
             }
         self.requests_session.headers.update(
             {
-                "User-Agent": get_random_user_agent()
+                "User-Agent": get_random_user_agent(),
+                "Accept-Encoding": accept_encoding(),
+                "Connection": "keep-alive" if keep_alive else "close"
             }
         )
-        self.graphql_authorization_token: str = ""
 
+        self.proxy_pool = proxy_pool
+        self.sticky_proxy = sticky_proxy
+        self._session_proxy: "Proxy" = proxy_pool.assign() if proxy_pool is not None else None
+        self._session_proxy_lock = threading.Lock()
 
-    def send_get_request(self, url: str, headers: dict = None) -> DefaultResponseType:
-        send_request = self.requests_session.get(url=url, headers=headers)
+        self._http2_client = None
+        self._transport_errors: tuple = (requests.RequestException,)
+        self._connect_timeouts: tuple = (requests.ConnectTimeout,)
+        if http2:
+            try:
+                import httpx
+            except ImportError:
+                raise ImportError("http2=True requires httpx with HTTP/2 support, pip install leonardoWrapper[http2]")
+            self._http2_client = httpx.Client(
+                http2=True,
+                proxy=f"http://{proxy}" if proxy is not None else None,
+                headers=dict(self.requests_session.headers),
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size if keep_alive else 0),
+                trust_env=trust_env
+            )
+            self._httpx = httpx
+            self._transport_errors += (httpx.TransportError,)
+            self._connect_timeouts += (httpx.ConnectTimeout,)
+        self.timeout = timeout
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.circuit_breakers = circuit_breakers if circuit_breakers is not None else default_circuit_breakers
+        self.refresh_margin = refresh_margin
+        self.token_expires_at: float = 0
+        self.token_refresh_callbacks: List[Callable[[str], None]] = []
+        self._graphql_authorization_token: str = ""
+        self._token_lock = threading.Lock()
+        self._refresher_stopped = threading.Event()
+        self._refresher: threading.Thread = None
+        self.coalescer = None
+        if coalesce:
+            from leonardoWrapper.util.coalescer import GraphQLCoalescer
+            self.coalescer = GraphQLCoalescer(self._send_graphql, window=coalesce_window)
+        self.request_hooks: List[Callable[[RequestEvent], None]] = [metrics] if metrics is not None else []
+
+
+    @property
+    def graphql_authorization_token(self) -> str:
+        return self._graphql_authorization_token
+
+
+    @graphql_authorization_token.setter
+    def graphql_authorization_token(self, token: str) -> None:
+        self._graphql_authorization_token = token
+        self.token_expires_at = token_expiry(token) if token else 0
+
+
+    def token_needs_refresh(self) -> bool:
+        return self.token_expires_at != 0 and self.token_expires_at - self.refresh_margin <= time.time()
+
+
+    def refresh_authorization_token(self, force: bool = False) -> str:
+        """
+        Renew the access token through the session endpoint. Concurrent callers wait for a single refresh
+        and return the token it obtained instead of sending their own request.
+        """
+        stale_token = self._graphql_authorization_token
+        with self._token_lock:
+            if not force and self._graphql_authorization_token != stale_token:
+                return self._graphql_authorization_token
+            if not force and not self.token_needs_refresh():
+                return self._graphql_authorization_token
+
+            authed_session = self.get_authed_session()
+            if authed_session["status_code"] != 200 or not authed_session["json"] or "accessToken" not in authed_session["json"]:
+                raise Exception("Failed to refresh the access token.")
+
+            self.graphql_authorization_token = authed_session["json"]["accessToken"]
+
+        for callback in self.token_refresh_callbacks:
+            callback(self._graphql_authorization_token)
+        return self._graphql_authorization_token
+
+
+    def start_token_refresher(self) -> None:
+        """
+        Start a daemon thread renewing the access token refresh_margin seconds before it expires.
+        """
+        if self._refresher is not None and self._refresher.is_alive():
+            return
+        self._refresher_stopped.clear()
+        self._refresher = threading.Thread(target=self._refresh_loop, name="leonardo-token-refresher", daemon=True)
+        self._refresher.start()
+
+
+    def stop_token_refresher(self) -> None:
+        self._refresher_stopped.set()
 
+
+    def _refresh_loop(self) -> None:
+        while not self._refresher_stopped.is_set():
+            if self.token_expires_at == 0:
+                wait = 60
+            else:
+                wait = max(0, self.token_expires_at - self.refresh_margin - time.time())
+            if self._refresher_stopped.wait(wait):
+                return
+            try:
+                self.refresh_authorization_token()
+            except Exception:
+                # try again shortly, send_graphql_request also refreshes on demand
+                self._refresher_stopped.wait(5)
+
+
+    def _request(self, method: str, url: str, idempotent: bool, endpoint: str = None, **kwargs) -> requests.Response:
+        """
+        Send a request through the circuit breaker of its endpoint (the url by default), retrying it according to the retry policy.
+        """
+        if not self.request_hooks:
+            return self._send_with_retries(method, url, idempotent, endpoint, {}, **kwargs)
+
+        state = {"retries": 0}
+        started = time.perf_counter()
         try:
-            return {
-                "status_code": send_request.status_code,
-                "json": send_request.json(),
-                "text": ""
-            }
-        except:
-            return {
-                "status_code": send_request.status_code,
-                "json": "",
-                "text": send_request.text
-            }
+            response = self._send_with_retries(method, url, idempotent, endpoint, state, **kwargs)
+        except Exception as error:
+            self._emit(method, url, kwargs, None, time.perf_counter() - started, state["retries"], type(error).__name__)
+            raise
+        self._emit(method, url, kwargs, response, time.perf_counter() - started, state["retries"], None)
+        return response
+
 
+    def _emit(self, method: str, url: str, kwargs: dict, response, latency: float, retries: int, error: str) -> None:
+        json_data = kwargs.get("json")
+        request_body = getattr(getattr(response, "request", None), "body", None) or getattr(getattr(response, "request", None), "content", None)
+        if kwargs.get("stream"):
+            # reading a streamed body here would consume it
+            response_bytes = int(response.headers.get("Content-Length", 0)) if response is not None else 0
+        else:
+            response_bytes = len(response.content) if response is not None else 0
 
-    def send_post_request(self, url: str, data: dict = None, json: dict = None, headers: dict = None) -> dict:
-        send_request = self.requests_session.post(url=url, data=data, json=json, headers=headers)
+        event = RequestEvent(
+            method=method,
+            url=url,
+            operation=json_data.get("operationName", "graphql") if isinstance(json_data, dict) else urlparse(url).path,
+            status_code=response.status_code if response is not None else None,
+            latency=latency,
+            request_bytes=len(request_body) if request_body else 0,
+            response_bytes=response_bytes,
+            retries=retries,
+            error=error
+        )
+        for hook in self.request_hooks:
+            try:
+                hook(event)
+            except Exception:
+                pass
 
+
+    def _send_with_retries(self, method: str, url: str, idempotent: bool, endpoint: str, state: dict, **kwargs) -> requests.Response:
+        breaker = self.circuit_breakers.get(endpoint or url)
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        trial = breaker.before_request(url)
+        try:
+            while True:
+                proxy = self._proxy_for(url, idempotent) if self.proxy_pool is not None else None
+                sent_at = time.perf_counter()
+                try:
+                    if self._http2_client is not None and url == self.graphql_url:
+                        response = self._send_http2(method, url, **kwargs)
+                    elif proxy is not None:
+                        response = self.requests_session.request(method, url, proxies={"http": proxy.url, "https": proxy.url}, **kwargs)
+                    else:
+                        response = self.requests_session.request(method, url, **kwargs)
+                except self._transport_errors as error:
+                    if proxy is not None:
+                        # a dead proxy says nothing about the endpoint, the pool ejects it and the retry fails over
+                        self.proxy_pool.record(proxy, time.perf_counter() - sent_at, failed=True)
+                    else:
+                        breaker.record_failure()
+                        trial = False
+                    retryable = idempotent or isinstance(error, self._connect_timeouts)
+                    delay = self.retry_policy.delay(attempt) if retryable and breaker.state != "open" else None
+                    if delay is None:
+                        raise
+                except BaseException:
+                    if proxy is not None:
+                        self.proxy_pool.cancel(proxy)
+                    raise
+                else:
+                    if proxy is not None:
+                        # a 429 throttles the account, not the proxy
+                        self.proxy_pool.record(proxy, time.perf_counter() - sent_at, failed=response.status_code == 407)
+                    # a 429 throttles one account, not the endpoint, Retry-After deals with it
+                    if response.status_code >= 500:
+                        breaker.record_failure()
+                        trial = False
+                    elif response.status_code != 429:
+                        breaker.record_success()
+                        trial = False
+
+                    if not self.retry_policy.should_retry_status(response.status_code, idempotent):
+                        return response
+                    delay = self.retry_policy.delay(attempt, parse_retry_after(response.headers.get("Retry-After")))
+                    if delay is None or breaker.state == "open":
+                        return response
+                    response.close()
+
+                attempt += 1
+                state["retries"] = attempt
+                time.sleep(delay)
+        finally:
+            if trial:
+                # the trial ended without an outcome (429, unexpected error, interruption), let another request try
+                breaker.release_trial()
+
+
+    def _proxy_for(self, url: str, idempotent: bool) -> "Proxy":
+        if not self.sticky_proxy and not url.startswith(self.app_url):
+            return self.proxy_pool.select(idempotent)
+
+        with self._session_proxy_lock:
+            if self._session_proxy.ejected:
+                self._session_proxy = self.proxy_pool.assign(previous=self._session_proxy)
+            proxy = self._session_proxy
+        self.proxy_pool.begin(proxy)
+        return proxy
+
+
+    def _send_http2(self, method: str, url: str, timeout: Union[float, Tuple[float, float]], **kwargs):
+        if isinstance(timeout, tuple):
+            timeout = self._httpx.Timeout(timeout[1], connect=timeout[0])
+        return self._http2_client.request(method, url, timeout=timeout, **kwargs)
+
+
+    def close(self) -> None:
+        self.stop_token_refresher()
+        if self._session_proxy is not None:
+            self.proxy_pool.release(self._session_proxy)
+            self._session_proxy = None
+        self.requests_session.close()
+        if self._http2_client is not None:
+            self._http2_client.close()
+
+
+    @staticmethod
+    def _to_result(response: requests.Response) -> DefaultResponseType:
         try:
             return {
-                "status_code": send_request.status_code,
-                "json": send_request.json(),
+                "status_code": response.status_code,
+                "json": response.json(),
                 "text": ""
             }
         except:
             return {
-                "status_code": send_request.status_code,
+                "status_code": response.status_code,
                 "json": "",
-                "text": send_request.text
+                "text": response.text
             }
 
 
+    def send_get_request(self, url: str, headers: dict = None) -> DefaultResponseType:
+        return self._to_result(self._request("GET", url, idempotent=True, headers=headers))
+
+
+    def send_post_request(self, url: str, data: dict = None, json: dict = None, headers: dict = None) -> DefaultResponseType:
+        return self._to_result(self._request("POST", url, idempotent=False, data=data, json=json, headers=headers))
+
+
     def send_graphql_request(self, json_data: dict) -> DefaultResponseType:
-        graphql_req = self.requests_session.post(url="https://api.leonardo.ai/v1/graphql", json=json_data,
-            headers={
-                "Authorization": f"Bearer {self.graphql_authorization_token}"
-            }
+        if self.token_needs_refresh():
+            self.refresh_authorization_token()
+
+        if self.coalescer is not None and is_idempotent_graphql(json_data):
+            return self.coalescer.submit(json_data)
+        return self._send_graphql(json_data)
+
+
+    def _send_graphql(self, json_data: dict) -> DefaultResponseType:
+        return self._to_result(
+            self._request("POST", self.graphql_url, idempotent=is_idempotent_graphql(json_data), json=json_data,
+                headers={
+                    "Authorization": f"Bearer {self.graphql_authorization_token}"
+                }
+            )
         )
 
-        try:
-            return {
-                "status_code": graphql_req.status_code,
-                "json": graphql_req.json(),
-                "text": ""
-            }
-        except:
-            return {
-                "status_code": graphql_req.status_code,
-                "json": "",
-                "text": graphql_req.text
-            }
 
-    def get_authed_session(self) -> DefaultResponseType:
-        get_authed_session = self.requests_session.get(url="https://app.leonardo.ai/api/auth/session")
+    def export_cookies(self) -> list:
+        return [
+            {"name": cookie.name, "value": cookie.value, "domain": cookie.domain, "path": cookie.path}
+            for cookie in self.requests_session.cookies
+        ]
 
-        try:
-            return {
-                "status_code": get_authed_session.status_code,
-                "json": get_authed_session.json(),
-                "text": ""
-            }
-        except:
-            return {
-                "status_code": get_authed_session.status_code,
-                "json": "",
-                "text": get_authed_session.text
-            }
\ No newline at end of file
+
+    def import_cookies(self, cookies: list) -> None:
+        for cookie in cookies:
+            self.requests_session.cookies.set(cookie["name"], cookie["value"], domain=cookie["domain"], path=cookie["path"])
+
+
+    def open_stream(self, url: str, headers: dict = None) -> requests.Response:
+        """
+        Send a streamed GET request, the caller reads the body with iter_content() and must close the response.
+        """
+        return self._request("GET", url, idempotent=True, endpoint=urlparse(url).netloc, headers=headers, stream=True)
+
+
+    def get_authed_session(self) -> DefaultResponseType:
+        return self._to_result(self._request("GET", f"{self.app_url}/api/auth/session", idempotent=True))
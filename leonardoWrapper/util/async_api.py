@@ -0,0 +1,202 @@
+import asyncio
+import json
+import time
+from typing import Callable, List
+
+import aiohttp
+
+from leonardoWrapper.types.Res import DefaultResponseType
+from leonardoWrapper.util.parsing import token_expiry
+from leonardoWrapper.util.resilience import CircuitBreakers, RetryPolicy, is_idempotent_graphql, parse_retry_after
+from leonardoWrapper.util.resilience import circuit_breakers as default_circuit_breakers
+from leonardoWrapper.util.userAgents import get_random_user_agent
+
+class AsyncRequestsHandler:
+    """
+    asyncio counterpart of RequestsHandler, every request goes through one pooled aiohttp.ClientSession.
+    Parameters:
+        - proxy: A "host:port" proxy used for every request.
+        - pool_size: The maximum number of simultaneous connections kept by the pool.
+        - refresh_margin: The access token is renewed through get_authed_session() once it expires within this number of seconds.
+        - timeout: The total timeout of every request, in seconds.
+        - retry_policy: The RetryPolicy deciding which failed requests are retried and when.
+        - circuit_breakers: The per-endpoint circuit breakers, shared by every handler of the process by default.
+        - app_url: The base URL of the web app serving the auth endpoints, e.g. a local mock server.
+        - api_url: The base URL of the GraphQL API.
+    """
+    def __init__(self, proxy: str = None, pool_size: int = 100, refresh_margin: float = 120, timeout: float = 60, retry_policy: RetryPolicy = None, circuit_breakers: CircuitBreakers = None, app_url: str = "https://app.leonardo.ai", api_url: str = "https://api.leonardo.ai") -> None:
+        self.app_url = app_url.rstrip("/")
+        self.graphql_url = f"{api_url.rstrip('/')}/v1/graphql"
+        self.proxy: str = f"http://{proxy}" if proxy is not None else None
+        self.pool_size = pool_size
+        self.headers = {
+            "User-Agent": get_random_user_agent()
+        }
+        self.requests_session: aiohttp.ClientSession = None
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.circuit_breakers = circuit_breakers if circuit_breakers is not None else default_circuit_breakers
+        self.refresh_margin = refresh_margin
+        self.token_expires_at: float = 0
+        self.token_refresh_callbacks: List[Callable[[str], None]] = []
+        self._graphql_authorization_token: str = ""
+        self._token_lock: asyncio.Lock = None
+        self._refresher: asyncio.Task = None
+
+
+    @property
+    def graphql_authorization_token(self) -> str:
+        return self._graphql_authorization_token
+
+
+    @graphql_authorization_token.setter
+    def graphql_authorization_token(self, token: str) -> None:
+        self._graphql_authorization_token = token
+        self.token_expires_at = token_expiry(token) if token else 0
+
+
+    def token_needs_refresh(self) -> bool:
+        return self.token_expires_at != 0 and self.token_expires_at - self.refresh_margin <= time.time()
+
+
+    async def refresh_authorization_token(self, force: bool = False) -> str:
+        """
+        Renew the access token through the session endpoint. Concurrent callers wait for a single refresh.
+        """
+        if self._token_lock is None:
+            self._token_lock = asyncio.Lock()
+
+        stale_token = self._graphql_authorization_token
+        async with self._token_lock:
+            if not force and self._graphql_authorization_token != stale_token:
+                return self._graphql_authorization_token
+            if not force and not self.token_needs_refresh():
+                return self._graphql_authorization_token
+
+            authed_session = await self.get_authed_session()
+            if authed_session["status_code"] != 200 or not authed_session["json"] or "accessToken" not in authed_session["json"]:
+                raise Exception("Failed to refresh the access token.")
+
+            self.graphql_authorization_token = authed_session["json"]["accessToken"]
+
+        for callback in self.token_refresh_callbacks:
+            callback(self._graphql_authorization_token)
+        return self._graphql_authorization_token
+
+
+    def start_token_refresher(self) -> None:
+        """
+        Start a task renewing the access token refresh_margin seconds before it expires.
+        """
+        if self._refresher is None or self._refresher.done():
+            self._refresher = asyncio.ensure_future(self._refresh_loop())
+
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            if self.token_expires_at == 0:
+                wait = 60
+            else:
+                wait = max(0, self.token_expires_at - self.refresh_margin - time.time())
+            await asyncio.sleep(wait)
+            try:
+                await self.refresh_authorization_token()
+            except Exception:
+                await asyncio.sleep(5)
+
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # aiohttp wants the session to be created inside the running event loop
+        if self.requests_session is None or self.requests_session.closed:
+            self.requests_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                headers=self.headers
+            )
+        return self.requests_session
+
+
+    async def close(self) -> None:
+        if self._refresher is not None:
+            self._refresher.cancel()
+        if self.requests_session is not None and not self.requests_session.closed:
+            await self.requests_session.close()
+
+
+    async def _send(self, method: str, url: str, idempotent: bool, **kwargs) -> DefaultResponseType:
+        """
+        Send a request through the endpoint circuit breaker, retrying it according to the retry policy.
+        """
+        breaker = self.circuit_breakers.get(url)
+        attempt = 0
+        trial = breaker.before_request(url)
+        try:
+            while True:
+                try:
+                    async with self._get_session().request(method, url, proxy=self.proxy, timeout=self.timeout, **kwargs) as send_request:
+                        text = await send_request.text()
+                        status_code = send_request.status
+                        retry_after = parse_retry_after(send_request.headers.get("Retry-After"))
+                except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                    breaker.record_failure()
+                    trial = False
+                    retryable = idempotent or isinstance(error, aiohttp.ClientConnectorError)
+                    delay = self.retry_policy.delay(attempt) if retryable and breaker.state != "open" else None
+                    if delay is None:
+                        raise
+                else:
+                    # a 429 throttles one account, not the endpoint, Retry-After deals with it
+                    if status_code >= 500:
+                        breaker.record_failure()
+                        trial = False
+                    elif status_code != 429:
+                        breaker.record_success()
+                        trial = False
+
+                    delay = None
+                    if self.retry_policy.should_retry_status(status_code, idempotent) and breaker.state != "open":
+                        delay = self.retry_policy.delay(attempt, retry_after)
+                    if delay is None:
+                        try:
+                            return {
+                                "status_code": status_code,
+                                "json": json.loads(text),
+                                "text": ""
+                            }
+                        except:
+                            return {
+                                "status_code": status_code,
+                                "json": "",
+                                "text": text
+                            }
+
+                attempt += 1
+                await asyncio.sleep(delay)
+        finally:
+            if trial:
+                # the trial ended without an outcome (429, cancellation, unexpected error), let another request try
+                breaker.release_trial()
+
+
+    async def send_get_request(self, url: str, headers: dict = None) -> DefaultResponseType:
+        return await self._send("GET", url, idempotent=True, headers=headers)
+
+
+    async def send_post_request(self, url: str, data: dict = None, json: dict = None, headers: dict = None) -> DefaultResponseType:
+        if data is not None:
+            data = {key: str(value) for key, value in data.items()}
+        return await self._send("POST", url, idempotent=False, data=data, json=json, headers=headers)
+
+
+    async def send_graphql_request(self, json_data: dict) -> DefaultResponseType:
+        if self.token_needs_refresh():
+            await self.refresh_authorization_token()
+
+        return await self._send("POST", self.graphql_url, idempotent=is_idempotent_graphql(json_data), json=json_data,
+            headers={
+                "Authorization": f"Bearer {self.graphql_authorization_token}"
+            }
+        )
+
+
+    async def get_authed_session(self) -> DefaultResponseType:
+        return await self._send("GET", f"{self.app_url}/api/auth/session", idempotent=True)
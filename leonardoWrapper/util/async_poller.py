@@ -0,0 +1,112 @@
+import asyncio
+import time
+from typing import Callable, Dict, List
+
+from leonardoWrapper.util import queries
+from leonardoWrapper.util.poller import STATUS_BATCH_SIZE, chunked, parse_finished_statuses
+from leonardoWrapper.util.polling import CompletionTracker, PollingStrategy
+
+
+class AsyncGenerationPoller:
+    """
+    asyncio counterpart of GenerationPoller, the polling runs as a task on the current event loop.
+    Like GenerationPoller, a failed status request leaves its ids scheduled and only a track() timeout rejects a future.
+    """
+    def __init__(self, requests_handler, check_interval: float = 5, batch_size: int = STATUS_BATCH_SIZE, polling: PollingStrategy = None, tracker: CompletionTracker = None, min_tick_interval: float = 0.5) -> None:
+        self.requests_handler = requests_handler
+        self.check_interval = check_interval
+        self.batch_size = batch_size
+        self.min_tick_interval = min_tick_interval
+        self.tracker = tracker if tracker is not None else CompletionTracker()
+        self._schedule = self.tracker.schedule_for([], polling=polling, check_interval=check_interval)
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._deadlines: Dict[str, float] = {}
+        self.last_error: Exception = None
+        self._wakeup: asyncio.Event = None
+        self._task: asyncio.Task = None
+
+
+    def track(self, creation_id: str, callback: Callable[[asyncio.Future], None] = None, timeout: float = None) -> asyncio.Future:
+        future = self._pending.get(creation_id)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[creation_id] = future
+            self.tracker.add_to_schedule(self._schedule, creation_id)
+        if timeout is not None:
+            self._deadlines[creation_id] = min(self._deadlines.get(creation_id, float("inf")), time.monotonic() + timeout)
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        self._wakeup.set()
+
+        if callback is not None:
+            future.add_done_callback(callback)
+        return future
+
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+    def pending(self) -> List[str]:
+        return list(self._pending)
+
+
+    async def poll_once(self) -> None:
+        due = self._schedule.due()
+        creation_ids = self._schedule.ids()
+        for batch in chunked(creation_ids, self.batch_size):
+            try:
+                finished = parse_finished_statuses(
+                    await self.requests_handler.send_graphql_request(json_data=queries.generation_statuses(batch))
+                )
+            except Exception as error:
+                # the generations may well be running, poll them again on the next tick
+                self.last_error = error
+                continue
+            self.tracker.record_finished(finished, self._schedule)
+            self._resolve(finished)
+
+        self._schedule.polled(creation_ids, due)
+        now = time.monotonic()
+        expired = [creation_id for creation_id, deadline in self._deadlines.items() if deadline <= now]
+        if expired:
+            reason = f", the last status request failed with {self.last_error!r}" if self.last_error is not None else ""
+            self._resolve({creation_id: TimeoutError(f"The image generation {creation_id} did not finish in time{reason}.") for creation_id in expired})
+
+
+    def _resolve(self, results: dict) -> None:
+        for creation_id, result in results.items():
+            self._schedule.remove(creation_id)
+            self._deadlines.pop(creation_id, None)
+            future = self._pending.pop(creation_id, None)
+            if future is None or future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+    async def _run(self) -> None:
+        last_tick = 0
+        while self._pending:
+            next_poll = self._schedule.time_until_next()
+            if self._deadlines:
+                next_poll = min(next_poll, min(self._deadlines.values()) - time.monotonic())
+            wait = max(next_poll, last_tick + self.min_tick_interval - time.monotonic())
+            if wait > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            last_tick = time.monotonic()
+            await self.poll_once()
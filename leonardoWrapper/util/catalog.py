@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from leonardoWrapper.user.user import User
+from leonardoWrapper.util.projection import normalize_fields
+
+# what the catalog itself needs: lookups, filters, incremental refreshes and generation defaults
+CATALOG_FIELDS = ("id", "name", "description", "createdAt", "sdVersion", "coreModel", "type", "nsfw", "public", "modelWidth", "modelHeight")
+
+
+class ModelCatalog:
+    """
+    Every official model, cached on disk and indexed by id and name.
+    The cache is loaded on first use. Once it is older than ttl it is refreshed incrementally, fetching only the
+    models created after the newest cached one. refresh(full=True) pages through the whole catalog again.
+    Parameters:
+        - user: The logged in User the models are fetched with.
+        - directory: The directory the catalog is stored in, defaults to ~/.cache/leonardoWrapper.
+        - ttl: The number of seconds after which the cached catalog is refreshed.
+        - page_size: The number of models fetched per request.
+        - fields: The model fields fetched and cached, None for the full GetFeedModels payload (example generations, author...).
+    """
+    def __init__(self, user: User, directory: str = None, ttl: float = 24 * 60 * 60, page_size: int = 50, fields: Optional[Iterable[str]] = CATALOG_FIELDS) -> None:
+        self.user = user
+        self.directory = directory if directory is not None else os.path.join(os.path.expanduser("~"), ".cache", "leonardoWrapper")
+        self.ttl = ttl
+        self.page_size = page_size
+        # the catalog relies on these fields whatever the caller selects
+        self.fields: Optional[Tuple[str, ...]] = None if fields is None else normalize_fields(set(fields) | {"name", "createdAt"})
+        self.fetched_at: float = 0
+        self._models: List[dict] = []
+        self._by_id: Dict[str, dict] = {}
+        self._by_name: Dict[str, dict] = {}
+        self._loaded = False
+        self._lock = threading.RLock()
+        os.makedirs(self.directory, exist_ok=True)
+
+
+    @property
+    def path(self) -> str:
+        if self.fields is None:
+            return os.path.join(self.directory, "models.json")
+        # catalogs of different field selections are cached apart
+        return os.path.join(self.directory, f"models-{hashlib.sha256(','.join(self.fields).encode()).hexdigest()[:12]}.json")
+
+
+    def _index(self, models: List[dict]) -> None:
+        models = sorted({model["id"]: model for model in models}.values(), key=lambda model: model.get("createdAt") or "", reverse=True)
+        self._models = models
+        self._by_id = {model["id"]: model for model in models}
+        # the newest model wins when two share a name
+        self._by_name = {}
+        for model in models:
+            self._by_name.setdefault(model["name"].casefold(), model)
+
+
+    def _load(self) -> bool:
+        try:
+            with open(self.path) as catalog_file:
+                catalog = json.load(catalog_file)
+        except (OSError, ValueError):
+            return False
+
+        self._index(catalog.get("models", []))
+        self.fetched_at = catalog.get("fetched_at", 0)
+        return True
+
+
+    def _store(self) -> None:
+        temporary_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as catalog_file:
+            json.dump({"fetched_at": self.fetched_at, "models": self._models}, catalog_file)
+        os.replace(temporary_path, self.path)
+
+
+    def _fetch(self, created_after: str = None) -> List[dict]:
+        models = []
+        offset = 0
+        while True:
+            page = self.user.get_global_models(limit=self.page_size, offset=offset, created_after=created_after, fields=self.fields)["data"]["custom_models"]
+            models.extend(page)
+            if len(page) < self.page_size:
+                return models
+            offset += len(page)
+
+
+    def refresh(self, full: bool = False) -> None:
+        """
+        Fetch the models created since the newest cached one, or the whole catalog when full is set or nothing is cached.
+        """
+        with self._lock:
+            if full or not self._models:
+                self._index(self._fetch())
+            else:
+                self._index(self._fetch(created_after=self._models[0]["createdAt"]) + self._models)
+            self.fetched_at = time.time()
+            self._loaded = True
+            self._store()
+
+
+    def ensure_fresh(self) -> None:
+        with self._lock:
+            if not self._loaded:
+                self._loaded = self._load()
+            if not self._loaded or time.time() - self.fetched_at >= self.ttl:
+                self.refresh()
+
+
+    @property
+    def models(self) -> List[dict]:
+        """
+        Every model, newest first.
+        """
+        self.ensure_fresh()
+        return list(self._models)
+
+
+    def __len__(self) -> int:
+        self.ensure_fresh()
+        return len(self._models)
+
+
+    def __contains__(self, model_id: str) -> bool:
+        return self.get(model_id) is not None
+
+
+    def get(self, model_id: str) -> Optional[dict]:
+        self.ensure_fresh()
+        return self._by_id.get(model_id)
+
+
+    def by_name(self, name: str) -> Optional[dict]:
+        """
+        Returns the model named name (case insensitive), None when there is none.
+        """
+        self.ensure_fresh()
+        return self._by_name.get(name.casefold())
+
+
+    def filter(self, sd_version: str = None, core_model: str = None, type: str = None) -> List[dict]:
+        """
+        Returns the models matching every given criterion, newest first.
+        """
+        self.ensure_fresh()
+        return [
+            model for model in self._models
+            if (sd_version is None or model.get("sdVersion") == sd_version)
+            and (core_model is None or model.get("coreModel") == core_model)
+            and (type is None or model.get("type") == type)
+        ]
@@ -0,0 +1,224 @@
+import copy
+import json
+import re
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Tuple
+
+from leonardoWrapper.types.Res import DefaultResponseType
+
+
+_OPERATION_HEADER = re.compile(r"^\s*query\s+\w*\s*(\((?P<variables>[^)]*)\))?\s*\{", re.S)
+_NAME = re.compile(r"[_A-Za-z][_0-9A-Za-z]*")
+
+
+def split_document(query: str) -> Tuple[str, str, str]:
+    """
+    Split a single-operation query document into its variable definitions, its selection set body and the rest
+    of the document (the fragments).
+    """
+    header = _OPERATION_HEADER.match(query)
+    if header is None:
+        raise ValueError("Only query operations can be coalesced.")
+
+    depth = 1
+    index = header.end()
+    in_string = False
+    while depth:
+        character = query[index]
+        if in_string:
+            if character == "\\":
+                index += 1
+            elif character == '"':
+                in_string = False
+        elif character == '"':
+            in_string = True
+        elif character == "{":
+            depth += 1
+        elif character == "}":
+            depth -= 1
+        index += 1
+
+    return header.group("variables") or "", query[header.end():index - 1], query[index:]
+
+
+def top_level_fields(body: str) -> List[Tuple[int, str, str]]:
+    """
+    Returns (position, response key, field name) for every top level field of a selection set body.
+    """
+    fields = []
+    depth = 0
+    index = 0
+    in_string = False
+    while index < len(body):
+        character = body[index]
+        if in_string:
+            if character == "\\":
+                index += 1
+            elif character == '"':
+                in_string = False
+        elif character == '"':
+            in_string = True
+        elif character in "{(":
+            depth += 1
+        elif character in "})":
+            depth -= 1
+        elif depth == 0 and (character.isalpha() or character == "_"):
+            name = _NAME.match(body, index)
+            after = name.end()
+            while after < len(body) and body[after].isspace():
+                after += 1
+            if after < len(body) and body[after] == ":":
+                # "alias: field"
+                start = after + 1
+                while body[start].isspace():
+                    start += 1
+                field = _NAME.match(body, start)
+                fields.append((index, name.group(), field.group()))
+                index = field.end()
+            else:
+                fields.append((index, name.group(), name.group()))
+                index = after
+            continue
+        index += 1
+    return fields
+
+
+def merge_queries(requests: List[dict]) -> Tuple[dict, List[Dict[str, str]]]:
+    """
+    Merge several GraphQL query requests into one document. Every variable is suffixed and every top level field
+    aliased with the index of its request. Returns the merged request and, for each request, the mapping of merged
+    response keys to its own response keys.
+    """
+    definitions, bodies, fragments, variables, key_maps = [], [], {}, {}, []
+    for index, request in enumerate(requests):
+        variable_definitions, body, rest = split_document(request["query"])
+        names = set(re.findall(r"\$(\w+)", variable_definitions))
+
+        def rename(match, names=names, index=index):
+            name = match.group(1)
+            return f"${name}_{index}" if name in names else match.group(0)
+
+        definitions.append(re.sub(r"\$(\w+)", rename, variable_definitions))
+        body = re.sub(r"\$(\w+)", rename, body)
+
+        key_map = {}
+        parts = []
+        previous = 0
+        for position, response_key, field in top_level_fields(body):
+            merged_key = f"c{index}_{response_key}"
+            key_map[merged_key] = response_key
+            parts.append(body[previous:position])
+            parts.append(f"{merged_key}: {field}")
+            # skip the original "field" or "alias: field"
+            previous = body.index(field, position + len(response_key) if response_key != field else position) + len(field)
+        parts.append(body[previous:])
+        bodies.append("".join(parts))
+        key_maps.append(key_map)
+
+        for fragment in re.split(r"(?=\bfragment\s)", rest):
+            fragment = fragment.strip()
+            if fragment:
+                fragments[fragment.split()[1]] = fragment
+
+        for name, value in request.get("variables", {}).items():
+            if name in names:
+                variables[f"{name}_{index}"] = value
+
+    definitions = ", ".join(definition for definition in definitions if definition.strip())
+    query = f"query Coalesced{'(' + definitions + ')' if definitions else ''} {{ {' '.join(bodies)} }} {' '.join(fragments.values())}".strip()
+    return {"operationName": "Coalesced", "variables": variables, "query": query}, key_maps
+
+
+class _Batch:
+    def __init__(self) -> None:
+        self.requests: List[dict] = []
+        self.futures: List[Future] = []
+        self.by_key: Dict[str, Future] = {}
+
+
+class GraphQLCoalescer:
+    """
+    Gathers the GraphQL queries sent within window seconds of each other and sends them as one aliased document.
+    Identical queries of a batch are sent once and share their response. Mutations are never coalesced.
+    A batch answered with GraphQL errors is sent again query by query, so that each caller only gets its own errors.
+    A batch failing as a whole (a non-200 status, a network error) fails every query of it with that same outcome.
+    Parameters:
+        - send: The function sending one GraphQL request, e.g. RequestsHandler._send_graphql.
+        - window: The number of seconds the first query of a batch waits for others.
+        - max_batch_size: A batch is sent right away once it holds this many distinct queries.
+    """
+    def __init__(self, send: Callable[[dict], DefaultResponseType], window: float = 0.005, max_batch_size: int = 20) -> None:
+        self.send = send
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._batch: _Batch = None
+        self._lock = threading.Lock()
+
+
+    def submit(self, json_data: dict) -> DefaultResponseType:
+        if _OPERATION_HEADER.match(json_data.get("query", "")) is None:
+            return self.send(json_data)
+
+        key = json.dumps(json_data, sort_keys=True)
+        with self._lock:
+            if self._batch is None:
+                self._batch = _Batch()
+                timer = threading.Timer(self.window, self._flush_batch, args=(self._batch,))
+                timer.daemon = True
+                timer.start()
+            batch = self._batch
+
+            future = batch.by_key.get(key)
+            if future is None:
+                future = batch.by_key[key] = Future()
+                batch.requests.append(json_data)
+                batch.futures.append(future)
+                if len(batch.requests) >= self.max_batch_size:
+                    self._batch = None
+                    full_batch = batch
+                else:
+                    full_batch = None
+            else:
+                full_batch = None
+
+        if full_batch is not None:
+            self._send_batch(full_batch)
+        # every caller gets its own copy, the parsed response is shared between identical queries
+        return copy.deepcopy(future.result())
+
+
+    def _flush_batch(self, batch: _Batch) -> None:
+        with self._lock:
+            if self._batch is not batch:
+                return
+            self._batch = None
+        self._send_batch(batch)
+
+
+    def _send_batch(self, batch: _Batch) -> None:
+        try:
+            if len(batch.requests) == 1:
+                batch.futures[0].set_result(self.send(batch.requests[0]))
+                return
+
+            merged, key_maps = merge_queries(batch.requests)
+            response = self.send(merged)
+            if response["status_code"] == 200 and isinstance(response["json"], dict) and "errors" in response["json"]:
+                # one failing query would fail the others, send them separately to keep their errors apart
+                for request, future in zip(batch.requests, batch.futures):
+                    future.set_result(self.send(request))
+                return
+            if response["status_code"] != 200 or not isinstance(response["json"], dict) or "data" not in response["json"]:
+                # the API itself failed (5xx after retries...), sending every query again would only add to its load
+                for future in batch.futures:
+                    future.set_result(response)
+                return
+
+            for key_map, future in zip(key_maps, batch.futures):
+                data = {response_key: response["json"]["data"].get(merged_key) for merged_key, response_key in key_map.items()}
+                future.set_result({"status_code": response["status_code"], "json": {"data": data}, "text": ""})
+        except Exception as error:
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(error)
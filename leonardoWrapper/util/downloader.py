@@ -0,0 +1,113 @@
+import hashlib
+import os
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Literal
+from urllib.parse import urlparse
+
+from leonardoWrapper.types.GeneratedImage import GeneratedImage, GeneratedSingleImage
+
+
+class ImageDownloader:
+    """
+    Streams generated images to disk with a bounded pool of threads, through the session (proxy, user agent) of a RequestsHandler.
+    Parameters:
+        - requests_handler: The RequestsHandler whose session is used for the downloads.
+        - directory: The directory the images are stored in.
+        - max_workers: The maximum number of simultaneous downloads.
+        - chunk_size: The number of bytes read from the network and written to disk at a time.
+        - naming: "id" stores an image as <image id><ext>, "sha256" stores it as <content hash><ext> so identical images are stored once.
+    Partial downloads are kept as .part files and resumed with a Range request, images already on disk are not downloaded again.
+    """
+    def __init__(self, requests_handler, directory: str, max_workers: int = 8, chunk_size: int = 64 * 1024, naming: Literal["id", "sha256"] = "id") -> None:
+        if naming not in ("id", "sha256"):
+            raise ValueError('naming must be "id" or "sha256".')
+
+        self.requests_handler = requests_handler
+        self.directory = directory
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.naming = naming
+        # sha256 naming keeps an "image id -> stored file name" entry per image to skip repeated downloads
+        self._index_directory = os.path.join(directory, ".index")
+        os.makedirs(self._index_directory if naming == "sha256" else directory, exist_ok=True)
+
+
+    def download(self, generated_images: Iterable[GeneratedImage]) -> Dict[str, str]:
+        """
+        Download every image of the given generations, returns a mapping of image id to file path.
+        """
+        images: List[GeneratedSingleImage] = list({image["id"]: image for generated_image in generated_images for image in generated_image["generated_images"]}.values())
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            paths = executor.map(self.download_image, images)
+            return {image["id"]: path for image, path in zip(images, paths)}
+
+
+    def download_image(self, image: GeneratedSingleImage) -> str:
+        extension = posixpath.splitext(urlparse(image["url"]).path)[1] or ".jpg"
+
+        stored_path = self._stored_path(image["id"], extension)
+        if stored_path is not None:
+            return stored_path
+
+        part_path = os.path.join(self.directory, image["id"] + extension + ".part")
+        digest = self._stream_to(image["url"], part_path)
+
+        if self.naming == "id":
+            path = os.path.join(self.directory, image["id"] + extension)
+            os.replace(part_path, path)
+            return path
+
+        path = os.path.join(self.directory, digest + extension)
+        if os.path.exists(path):
+            os.remove(part_path)
+        else:
+            os.replace(part_path, path)
+        with open(os.path.join(self._index_directory, image["id"]), "w") as index_file:
+            index_file.write(digest + extension)
+        return path
+
+
+    def _stored_path(self, image_id: str, extension: str) -> str:
+        if self.naming == "id":
+            path = os.path.join(self.directory, image_id + extension)
+            return path if os.path.exists(path) else None
+
+        index_path = os.path.join(self._index_directory, image_id)
+        if not os.path.exists(index_path):
+            return None
+        with open(index_path) as index_file:
+            path = os.path.join(self.directory, index_file.read().strip())
+        return path if os.path.exists(path) else None
+
+
+    def _stream_to(self, url: str, part_path: str) -> str:
+        digest = hashlib.sha256()
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+
+        headers = {"Range": f"bytes={offset}-"} if offset else None
+        with self.requests_handler.open_stream(url=url, headers=headers) as response:
+            if response.status_code == 206:
+                mode = "ab"
+            elif response.status_code == 200:
+                # the server ignored the range, start over
+                offset = 0
+                mode = "wb"
+            elif response.status_code == 416 and offset:
+                # the partial file already holds the whole image
+                mode = None
+            else:
+                raise Exception(f"Failed to download {url}, status code {response.status_code}.")
+
+            if offset and self.naming == "sha256":
+                with open(part_path, "rb") as part_file:
+                    for chunk in iter(lambda: part_file.read(self.chunk_size), b""):
+                        digest.update(chunk)
+
+            if mode is not None:
+                with open(part_path, mode) as part_file:
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        part_file.write(chunk)
+                        digest.update(chunk)
+
+        return digest.hexdigest()
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+from leonardoWrapper.types.GeneratedImage import GeneratedImage
+
+
+def submission_key(user_id: str, generation_input: dict) -> str:
+    """
+    Returns the hash identifying a generation request of an account: its SDGenerationInput with sorted keys and the
+    surrounding whitespace of the prompts stripped. A request without seed only matches other requests without seed.
+    """
+    normalized = dict(generation_input)
+    for key in ("prompt", "negative_prompt"):
+        if isinstance(normalized.get(key), str):
+            normalized[key] = normalized[key].strip()
+    payload = json.dumps({"user_id": user_id, "input": normalized}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class SubmissionCache:
+    """
+    SQLite store of the generations already submitted, so that resubmitting the same request (after a crash or a
+    retry) returns the existing generation instead of creating and paying for a new one.
+    Entries are keyed by submission_key(), failed generations are discarded and the least recently used entries
+    are evicted past max_entries.
+    Parameters:
+        - path: The database file, defaults to ~/.cache/leonardoWrapper/submissions.sqlite3.
+        - max_entries: The maximum number of submissions kept.
+        - max_age: Submissions older than this number of seconds are not reused, None to reuse them forever.
+    """
+    def __init__(self, path: str = None, max_entries: int = 10000, max_age: float = None) -> None:
+        self.path = path if path is not None else os.path.join(os.path.expanduser("~"), ".cache", "leonardoWrapper", "submissions.sqlite3")
+        self.max_entries = max_entries
+        self.max_age = max_age
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS submissions ("
+            "key TEXT PRIMARY KEY, generation_id TEXT NOT NULL UNIQUE, generated_image TEXT, created_at REAL NOT NULL, used_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS submissions_used_at ON submissions (used_at)")
+        self._lock = threading.Lock()
+
+
+    def lookup(self, key: str) -> Optional[Tuple[str, Optional[GeneratedImage]]]:
+        """
+        Returns the generation id submitted for key and its GeneratedImage once known, None when there is none.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute("SELECT generation_id, generated_image, created_at FROM submissions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self.max_age is not None and now - row[2] > self.max_age:
+                self._connection.execute("DELETE FROM submissions WHERE key = ?", (key,))
+                return None
+            self._connection.execute("UPDATE submissions SET used_at = ? WHERE key = ?", (now, key))
+        return row[0], GeneratedImage.from_dict(json.loads(row[1])) if row[1] is not None else None
+
+
+    def generated_image(self, generation_id: str) -> Optional[GeneratedImage]:
+        with self._lock:
+            row = self._connection.execute("SELECT generated_image FROM submissions WHERE generation_id = ?", (generation_id,)).fetchone()
+        return GeneratedImage.from_dict(json.loads(row[0])) if row is not None and row[0] is not None else None
+
+
+    def store(self, key: str, generation_id: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO submissions (key, generation_id, generated_image, created_at, used_at) VALUES (?, ?, NULL, ?, ?)",
+                (key, generation_id, now, now)
+            )
+            self._connection.execute(
+                "DELETE FROM submissions WHERE key IN (SELECT key FROM submissions ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+
+    def store_generated_image(self, generated_image: GeneratedImage) -> None:
+        """
+        Attach the GeneratedImage of a finished generation to its submission, if the generation was submitted through the cache.
+        """
+        with self._lock:
+            self._connection.execute(
+                "UPDATE submissions SET generated_image = ? WHERE generation_id = ?",
+                (json.dumps(generated_image.to_dict()), generated_image["id"])
+            )
+
+
+    def discard(self, generation_id: str) -> None:
+        """
+        Forget a generation, e.g. because it failed, so that the next identical request creates a new one.
+        """
+        with self._lock:
+            self._connection.execute("DELETE FROM submissions WHERE generation_id = ?", (generation_id,))
+
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,58 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+
+class GenerationJournal:
+    """
+    SQLite checkpoint of a bulk run: for every job key, the generation created for it and its final status.
+    A job is journaled as soon as its generation is created, so a restarted run waits for it instead of creating
+    it again, and marked finished once its result was written out.
+    Parameters:
+        - path: The database file.
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        # WAL with synchronous=NORMAL still survives a crash of the process, only a power loss may drop the last writes
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (key TEXT PRIMARY KEY, generation_id TEXT NOT NULL, status TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+
+
+    def get(self, key: str) -> Optional[Tuple[str, str]]:
+        """
+        Returns the (generation id, status) of key, the status being "PENDING" until the job finished, None for a new job.
+        """
+        with self._lock:
+            return self._connection.execute("SELECT generation_id, status FROM jobs WHERE key = ?", (key,)).fetchone()
+
+
+    def created(self, key: str, generation_id: str) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO jobs (key, generation_id, status, updated_at) VALUES (?, ?, 'PENDING', ?)",
+                (key, generation_id, time.time())
+            )
+
+
+    def finished(self, key: str, status: str) -> None:
+        with self._lock:
+            self._connection.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE key = ?", (status, time.time(), key))
+
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
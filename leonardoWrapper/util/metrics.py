@@ -0,0 +1,148 @@
+import bisect
+import threading
+from typing import Dict, List, Optional, Tuple, TypedDict
+
+
+class RequestEvent(TypedDict):
+    method: str
+    url: str
+    operation: str
+    status_code: Optional[int]
+    latency: float
+    request_bytes: int
+    response_bytes: int
+    retries: int
+    error: Optional[str]
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+JOB_BUCKETS = (1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str) -> None:
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+
+    def to_prometheus(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        # per label set: the count of each bucket (non cumulative, the last one being +Inf), the sum and the count
+        self._values: Dict[Labels, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts, totals = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0, 0]))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            totals[0] += value
+            totals[1] += 1
+
+
+    def count(self, **labels: str) -> int:
+        values = self._values.get(tuple(sorted(labels.items())))
+        return int(values[1][1]) if values is not None else 0
+
+
+    def to_prometheus(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, (total, count)) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(labels, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {total:g}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {int(count)}")
+        return lines
+
+
+class Metrics:
+    """
+    Aggregates the request events of RequestsHandler and the job timings of Leonardo into counters and histograms,
+    exported in the Prometheus text format by to_prometheus().
+
+        metrics = Metrics()
+        leonardo = Leonardo(username, password, requests_handler=RequestsHandler(metrics=metrics), metrics=metrics)
+        ...
+        print(metrics.to_prometheus())
+    """
+    def __init__(self, latency_buckets: Tuple[float, ...] = LATENCY_BUCKETS, job_buckets: Tuple[float, ...] = JOB_BUCKETS) -> None:
+        self.requests = Counter("leonardo_requests_total", "Requests sent, by operation and HTTP status.")
+        self.request_errors = Counter("leonardo_request_errors_total", "Requests that failed without a response, by operation and error.")
+        self.retries = Counter("leonardo_request_retries_total", "Retries, by operation.")
+        self.bytes = Counter("leonardo_request_bytes_total", "Payload bytes, by operation and direction.")
+        self.latency = Histogram("leonardo_request_duration_seconds", "Request latency including retries, by operation.", latency_buckets)
+        self.jobs = Counter("leonardo_jobs_total", "Finished generations, by status.")
+        self.job_duration = Histogram("leonardo_job_duration_seconds", "Generation timings, by phase: generation (submit to complete) and fetch (complete to fetched).", job_buckets)
+
+
+    def __call__(self, event: RequestEvent) -> None:
+        self.observe_request(event)
+
+
+    def observe_request(self, event: RequestEvent) -> None:
+        operation = event["operation"]
+        if event["error"] is not None:
+            self.request_errors.inc(operation=operation, error=event["error"])
+        else:
+            self.requests.inc(operation=operation, status=str(event["status_code"]))
+        if event["retries"]:
+            self.retries.inc(event["retries"], operation=operation)
+        self.bytes.inc(event["request_bytes"], operation=operation, direction="sent")
+        self.bytes.inc(event["response_bytes"], operation=operation, direction="received")
+        self.latency.observe(event["latency"], operation=operation)
+
+
+    def observe_job(self, phase: str, seconds: float) -> None:
+        self.job_duration.observe(seconds, phase=phase)
+
+
+    def observe_finished(self, status: str) -> None:
+        self.jobs.inc(status=status)
+
+
+    def to_prometheus(self) -> str:
+        lines = []
+        for metric in (self.requests, self.request_errors, self.retries, self.bytes, self.latency, self.jobs, self.job_duration):
+            lines.extend(metric.to_prometheus())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,47 @@
+import base64
+import json
+
+from leonardoWrapper.types.GeneratedImage import CustomModel, GeneratedImage, GeneratedSingleImage
+
+
+def decode_jwt_payload(token: str) -> dict:
+    payload = token.split(".")[1]
+    return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+
+
+def token_expiry(token: str) -> float:
+    """
+    Returns the exp claim of a JWT, 0 when the token cannot be decoded or has no expiry.
+    """
+    try:
+        return float(decode_jwt_payload(token).get("exp", 0))
+    except:
+        return 0
+
+
+def parse_generated_image(generation: dict) -> GeneratedImage:
+    """
+    Fields left out of a projected query are set to None.
+    """
+    get = generation.get
+    custom_model = get("custom_model")
+    return GeneratedImage(
+        generation["id"], get("nsfw"), get("modelId"), get("scheduler"), get("coreModel"), get("sdVersion"),
+        get("prompt"), get("negativePrompt"), get("status"), get("quantity"), get("createdAt"), get("public"), get("seed"),
+        [GeneratedSingleImage(image.get("id"), image.get("url"), image.get("nsfw")) for image in get("generated_images") or []],
+        CustomModel.from_dict(custom_model) if custom_model else None
+    )
+
+
+def parse_user_details(users_response: dict) -> dict:
+    user = users_response["data"]["users"][0]
+    return {
+        "username": user["username"],
+        "created_at": user["createdAt"],
+        "api_credit": user["user_details"][0]["apiCredit"],
+        "user_id": user["id"],
+        "subscriptions": {
+            "subscriptionTokens": user["user_details"][0]["subscriptionTokens"],
+            "plan": user["user_details"][0]["plan"]
+        }
+    }
@@ -0,0 +1,162 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterable, List
+
+from leonardoWrapper.util import queries
+from leonardoWrapper.util.polling import CompletionTracker, PollingStrategy
+
+# the maximum number of ids sent in a single status query
+STATUS_BATCH_SIZE = 500
+
+
+def parse_finished_statuses(get_status: dict) -> Dict[str, str]:
+    try:
+        return {generation["id"]: generation["status"] for generation in get_status["json"]["data"]["generations"]}
+    except:
+        raise Exception("Failed to get the status of the image generation.")
+
+
+def chunked(creation_ids: List[str], size: int) -> Iterable[List[str]]:
+    for index in range(0, len(creation_ids), size):
+        yield creation_ids[index:index + size]
+
+
+class GenerationPoller:
+    """
+    Background poller resolving many outstanding generations with one GetAIGenerationFeedStatuses query per tick.
+    Parameters:
+        - requests_handler: The RequestsHandler used to send the status queries.
+        - check_interval: The number of seconds between two ticks when no polling strategy is given.
+        - batch_size: The maximum number of ids sent in a single query.
+        - polling: The PollingStrategy deciding when each id is due, a tick polls every pending id once any is due.
+        - tracker: The CompletionTracker providing submission times and recording completion times.
+        - min_tick_interval: The minimum number of seconds between two ticks, ids tracked in between share the next tick.
+    A failed status request does not mean the generations failed: its ids stay scheduled and are polled again on the
+    next tick (last_error keeps the error). Only a track() timeout rejects a future.
+    """
+    def __init__(self, requests_handler, check_interval: float = 5, batch_size: int = STATUS_BATCH_SIZE, polling: PollingStrategy = None, tracker: CompletionTracker = None, min_tick_interval: float = 0.5) -> None:
+        self.requests_handler = requests_handler
+        self.check_interval = check_interval
+        self.batch_size = batch_size
+        self.min_tick_interval = min_tick_interval
+        self.tracker = tracker if tracker is not None else CompletionTracker()
+        self._schedule = self.tracker.schedule_for([], polling=polling, check_interval=check_interval)
+        self._pending: Dict[str, Future] = {}
+        # creation id -> time.monotonic() after which its future is rejected with a TimeoutError
+        self._deadlines: Dict[str, float] = {}
+        self.last_error: Exception = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread: threading.Thread = None
+
+
+    def track(self, creation_id: str, callback: Callable[[Future], None] = None, timeout: float = None) -> Future:
+        """
+        Start tracking a generation, the returned future resolves to its final status ("COMPLETE" or "FAILED").
+        The optional callback is called with the future once it is done.
+        With a timeout, the future is rejected with a TimeoutError when the generation is not found finished within
+        that many seconds, e.g. because the status requests keep failing. Without one it is polled until it finishes.
+        """
+        with self._lock:
+            future = self._pending.get(creation_id)
+            if future is None:
+                future = Future()
+                self._pending[creation_id] = future
+                self.tracker.add_to_schedule(self._schedule, creation_id)
+            if timeout is not None:
+                self._deadlines[creation_id] = min(self._deadlines.get(creation_id, float("inf")), time.monotonic() + timeout)
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped = False
+                self._thread = threading.Thread(target=self._run, name="leonardo-poller", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+        if callback is not None:
+            future.add_done_callback(callback)
+        return future
+
+
+    def stop(self) -> None:
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+    def pending(self) -> List[str]:
+        with self._lock:
+            return list(self._pending)
+
+
+    def poll_once(self) -> None:
+        with self._lock:
+            creation_ids = self._schedule.ids()
+            due = self._schedule.due()
+
+        for batch in chunked(creation_ids, self.batch_size):
+            try:
+                finished = parse_finished_statuses(
+                    self.requests_handler.send_graphql_request(json_data=queries.generation_statuses(batch))
+                )
+            except Exception as error:
+                # the generations may well be running, poll them again on the next tick
+                self.last_error = error
+                continue
+            with self._lock:
+                self.tracker.record_finished(finished, self._schedule)
+            self._resolve(finished)
+
+        with self._lock:
+            self._schedule.polled(creation_ids, due)
+            now = time.monotonic()
+            expired = [creation_id for creation_id, deadline in self._deadlines.items() if deadline <= now]
+        if expired:
+            reason = f", the last status request failed with {self.last_error!r}" if self.last_error is not None else ""
+            self._resolve({creation_id: TimeoutError(f"The image generation {creation_id} did not finish in time{reason}.") for creation_id in expired})
+
+
+    def _resolve(self, results: dict) -> None:
+        with self._lock:
+            futures = [(self._pending.pop(creation_id), result) for creation_id, result in results.items() if creation_id in self._pending]
+            for creation_id in results:
+                self._schedule.remove(creation_id)
+                self._deadlines.pop(creation_id, None)
+
+        for future, result in futures:
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+    def _run(self) -> None:
+        last_tick = 0
+        while not self._stopped:
+            # track() wakes the thread up so a newly added id can be polled earlier
+            self._wakeup.clear()
+            with self._lock:
+                if not self._pending:
+                    # exit while idle, the next track() starts a new thread
+                    self._thread = None
+                    return
+                next_poll = self._schedule.time_until_next()
+                if self._deadlines:
+                    next_poll = min(next_poll, min(self._deadlines.values()) - time.monotonic())
+                wait = max(next_poll, last_tick + self.min_tick_interval - time.monotonic())
+            if wait > 0:
+                self._wakeup.wait(wait)
+                continue
+            last_tick = time.monotonic()
+            self.poll_once()
+
+
+def __getattr__(name: str):
+    # AsyncGenerationPoller moved to util/async_poller.py so that the sync client does not import asyncio
+    if name == "AsyncGenerationPoller":
+        from leonardoWrapper.util.async_poller import AsyncGenerationPoller
+        return AsyncGenerationPoller
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
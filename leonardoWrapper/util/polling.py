@@ -0,0 +1,228 @@
+import random
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class PollingStrategy:
+    """
+    Decides how long to wait before polling a generation again.
+    Subclasses implement next_delay(attempt, elapsed, expected):
+        - attempt: The number of polls already sent for this generation.
+        - elapsed: The number of seconds since the generation was submitted (or since tracking started).
+        - expected: The predicted total duration of the generation in seconds, None when unknown.
+    """
+    def next_delay(self, attempt: int, elapsed: float, expected: Optional[float] = None) -> float:
+        raise NotImplementedError
+
+
+    def first_delay(self, elapsed: float, expected: Optional[float] = None) -> float:
+        return 0
+
+
+class FixedInterval(PollingStrategy):
+    def __init__(self, interval: float = 5) -> None:
+        self.interval = interval
+
+
+    def next_delay(self, attempt: int, elapsed: float, expected: Optional[float] = None) -> float:
+        return self.interval
+
+
+class ExponentialBackoff(PollingStrategy):
+    """
+    Waits initial * factor ** attempt seconds capped at maximum, each delay is randomized by +/- jitter (a fraction).
+    """
+    def __init__(self, initial: float = 0.5, factor: float = 2, maximum: float = 10, jitter: float = 0.2) -> None:
+        self.initial = initial
+        self.factor = factor
+        self.maximum = maximum
+        self.jitter = jitter
+
+
+    def next_delay(self, attempt: int, elapsed: float, expected: Optional[float] = None) -> float:
+        delay = min(self.maximum, self.initial * self.factor ** attempt)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+class AdaptivePolling(PollingStrategy):
+    """
+    Sleeps until just before the predicted completion time, then falls back to exponential backoff.
+    Without a prediction it behaves like the backoff strategy.
+    Parameters:
+        - backoff: The strategy used once the predicted completion time is reached.
+        - lead: The fraction of the predicted duration at which the first poll is sent, slightly early polls keep the prediction from drifting upwards.
+    """
+    def __init__(self, backoff: PollingStrategy = None, lead: float = 0.1) -> None:
+        self.backoff = backoff if backoff is not None else ExponentialBackoff(initial=0.25, maximum=5)
+        self.lead = lead
+
+
+    def next_delay(self, attempt: int, elapsed: float, expected: Optional[float] = None) -> float:
+        first_delay = self.first_delay(elapsed, expected)
+        if first_delay > 0:
+            return first_delay
+        return self.backoff.next_delay(attempt, elapsed, expected)
+
+
+    def first_delay(self, elapsed: float, expected: Optional[float] = None) -> float:
+        if expected is None:
+            return 0
+        return max(0, expected * (1 - self.lead) - elapsed)
+
+
+class DurationModel:
+    """
+    Learns the time-to-complete of generations from observed jobs, as an exponentially weighted moving average
+    per (model_id, num_inference_steps, num_images) key.
+    """
+    def __init__(self, smoothing: float = 0.3) -> None:
+        self.smoothing = smoothing
+        self._averages: Dict[Hashable, float] = {}
+        self._model_averages: Dict[Hashable, float] = {}
+        self._lock = threading.Lock()
+
+
+    @staticmethod
+    def key_for(generation_input: dict) -> Tuple:
+        return (generation_input.get("modelId"), generation_input.get("num_inference_steps"), generation_input.get("num_images"))
+
+
+    def observe(self, key: Tuple, duration: float) -> None:
+        with self._lock:
+            for averages, average_key in ((self._averages, key), (self._model_averages, key[0])):
+                previous = averages.get(average_key)
+                averages[average_key] = duration if previous is None else previous + self.smoothing * (duration - previous)
+
+
+    def expected(self, key: Tuple) -> Optional[float]:
+        with self._lock:
+            if key in self._averages:
+                return self._averages[key]
+            return self._model_averages.get(key[0])
+
+
+class PollSchedule:
+    """
+    Per-generation poll timing shared by the blocking and asyncio waiters.
+    Ids falling due within window seconds of a tick are treated as due by that tick, so staggered submissions share queries.
+    """
+    def __init__(self, strategy: PollingStrategy, window: float = 0.5) -> None:
+        self.strategy = strategy
+        self.window = window
+        # creation_id -> [attempt, started_at, expected, next_due, last_polled]
+        self._entries: Dict[str, list] = {}
+
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+    def __contains__(self, creation_id: str) -> bool:
+        return creation_id in self._entries
+
+
+    def add(self, creation_id: str, started_at: float = None, expected: Optional[float] = None) -> None:
+        now = time.monotonic()
+        started_at = now if started_at is None else started_at
+        self._entries[creation_id] = [0, started_at, expected, now + self.strategy.first_delay(now - started_at, expected), None]
+
+
+    def remove(self, creation_id: str) -> None:
+        self._entries.pop(creation_id, None)
+
+
+    def ids(self) -> List[str]:
+        return list(self._entries)
+
+
+    def due(self, now: float = None) -> List[str]:
+        now = time.monotonic() if now is None else now
+        return [creation_id for creation_id, entry in self._entries.items() if entry[3] <= now + self.window]
+
+
+    def last_polled(self, creation_id: str) -> Optional[float]:
+        entry = self._entries.get(creation_id)
+        return None if entry is None else entry[4]
+
+
+    def polled(self, creation_ids: List[str], due: List[str], now: float = None) -> None:
+        """
+        Record a tick that polled creation_ids without them finishing, and reschedule the ids that were due.
+        """
+        now = time.monotonic() if now is None else now
+        for creation_id in creation_ids:
+            entry = self._entries.get(creation_id)
+            if entry is not None:
+                entry[4] = now
+        for creation_id in due:
+            entry = self._entries.get(creation_id)
+            if entry is None:
+                continue
+            entry[3] = now + self.strategy.next_delay(entry[0], now - entry[1], entry[2])
+            entry[0] += 1
+
+
+    def time_until_next(self, now: float = None) -> float:
+        now = time.monotonic() if now is None else now
+        if not self._entries:
+            return 0
+        return max(0, min(entry[3] for entry in self._entries.values()) - now)
+
+
+class CompletionTracker:
+    """
+    Remembers when each generation was submitted and feeds the observed time-to-complete into a DurationModel,
+    so that the poll schedules of later generations land shortly after they are predicted to finish.
+    Parameters:
+        - polling: The default PollingStrategy, None keeps the fixed check_interval behaviour.
+    Every function of finished_callbacks is called with (creation_id, status, seconds since submission) when a
+    generation submitted through the tracker is found finished.
+    """
+    def __init__(self, polling: PollingStrategy = None, duration_model: DurationModel = None) -> None:
+        self.polling = polling
+        self.duration_model = duration_model if duration_model is not None else DurationModel()
+        self.finished_callbacks: List[Callable[[str, str, float], None]] = []
+        self._submissions: Dict[str, Tuple[Tuple, float]] = {}
+        self._lock = threading.Lock()
+
+
+    def record_submission(self, creation_id: str, generation_input: dict) -> None:
+        with self._lock:
+            self._submissions[creation_id] = (DurationModel.key_for(generation_input), time.monotonic())
+
+
+    def schedule_for(self, creation_ids: List[str], polling: PollingStrategy = None, check_interval: float = 5) -> PollSchedule:
+        schedule = PollSchedule(polling or self.polling or FixedInterval(check_interval))
+        for creation_id in creation_ids:
+            self.add_to_schedule(schedule, creation_id)
+        return schedule
+
+
+    def add_to_schedule(self, schedule: PollSchedule, creation_id: str) -> None:
+        with self._lock:
+            submission = self._submissions.get(creation_id)
+        if submission is None:
+            schedule.add(creation_id)
+        else:
+            schedule.add(creation_id, started_at=submission[1], expected=self.duration_model.expected(submission[0]))
+
+
+    def record_finished(self, statuses: Dict[str, str], schedule: PollSchedule = None) -> None:
+        """
+        Record the generations found finished, call it before removing them from the schedule.
+        The completion time is estimated halfway between the last poll that saw the generation running and now.
+        """
+        now = time.monotonic()
+        with self._lock:
+            submissions = [(self._submissions.pop(creation_id, None), status, creation_id) for creation_id, status in statuses.items()]
+
+        for submission, status, creation_id in submissions:
+            if submission is None:
+                continue
+            last_polled = schedule.last_polled(creation_id) if schedule is not None else None
+            finished_at = now if last_polled is None or last_polled < submission[1] else (last_polled + now) / 2
+            if status == "COMPLETE":
+                self.duration_model.observe(submission[0], finished_at - submission[1])
+            for callback in self.finished_callbacks:
+                callback(creation_id, status, finished_at - submission[1])
@@ -0,0 +1,62 @@
+import re
+from functools import lru_cache
+from typing import Iterable, Tuple
+
+from leonardoWrapper.util.queries import PROJECTIONS
+
+
+def normalize_fields(fields: Iterable[str]) -> Tuple[str, ...]:
+    """
+    Returns the fields as a sorted tuple of unique dotted paths, "id" always being selected.
+    """
+    if isinstance(fields, str):
+        fields = [fields]
+    return tuple(sorted(set(fields) | {"id"}))
+
+
+def _selection(tree: dict, arguments: dict, prefix: str = "") -> str:
+    parts = []
+    for name, children in tree.items():
+        path = prefix + name
+        part = name + arguments.get(path, "")
+        if children:
+            part += " { " + _selection(children, arguments, path + ".") + " }"
+        parts.append(part)
+    return " ".join(parts)
+
+
+@lru_cache(maxsize=64)
+def compile_query(operation_name: str, fields: Tuple[str, ...]) -> str:
+    """
+    Returns the query document of operation_name selecting only fields, dotted paths like "generated_images.url".
+    Only the variables the projected document uses are declared.
+    """
+    try:
+        projection = PROJECTIONS[operation_name]
+    except KeyError:
+        raise ValueError(f"The {operation_name} query does not support field projection.")
+
+    tree: dict = {}
+    for field in fields:
+        node = tree
+        for name in field.split("."):
+            node = node.setdefault(name, {})
+
+    body = f"{projection['root']} {{ {_selection(tree, projection['arguments'])} }}"
+    used = set(re.findall(r"\$(\w+)", body))
+    definitions = ", ".join(f"${name}: {definition}" for name, definition in projection["variables"].items() if name in used)
+    return f"query {operation_name}({definitions}) {{ {body} }}"
+
+
+def project(json_data: dict, fields: Iterable[str]) -> dict:
+    """
+    Returns a copy of a read request (e.g. queries.feed_models(...)) selecting only fields,
+    the variables the projected document does not declare are left out.
+    """
+    query = compile_query(json_data["operationName"], normalize_fields(fields))
+    declared = set(re.findall(r"\$(\w+):", query))
+    return {
+        "operationName": json_data["operationName"],
+        "variables": {name: value for name, value in json_data["variables"].items() if name in declared},
+        "query": query
+    }
@@ -0,0 +1,277 @@
+from datetime import datetime, timezone
+from typing import List
+from urllib.parse import urlparse
+
+
+CREATE_SD_GENERATION_JOB = "mutation CreateSDGenerationJob($arg1: SDGenerationInput!) { sdGenerationJob(arg1: $arg1) { generationId __typename } }"
+GET_AI_GENERATION_FEED_STATUSES = "query GetAIGenerationFeedStatuses($where: generations_bool_exp = {}) { generations(where: $where) { id status __typename } }"
+GET_AI_GENERATION_FEED = "query GetAIGenerationFeed($where: generations_bool_exp = {}, $userId: uuid, $limit: Int, $offset: Int = 0) { generations( limit: $limit offset: $offset order_by: [{createdAt: desc}] where: $where) { modelId scheduler coreModel sdVersion prompt negativePrompt id status quantity createdAt public seed nsfw custom_model { id userId name modelHeight modelWidth } generated_images(order_by: [{url: desc}]) { id url nsfw } } }"
+GET_AI_GENERATION_FEED_RESULTS = "query GetAIGenerationFeedResults($where: generations_bool_exp = {}) { generations(where: $where) { modelId scheduler coreModel sdVersion prompt negativePrompt id status quantity createdAt public seed nsfw custom_model { id userId name modelHeight modelWidth } generated_images(order_by: [{url: desc}]) { id url nsfw } } }"
+GET_USER_DETAILS = "query GetUserDetails($userSub: String) { users(where: {user_details: {cognitoId: {_eq: $userSub}}}) { id username createdAt user_details { apiCredit subscriptionTokens plan } } }"
+UPDATE_USERNAME = "mutation UpdateUsername($arg1: UpdateUsernameInput!) { updateUsername(arg1: $arg1) { id __typename } }"
+UPDATE_USER_DETAILS = "mutation UpdateUserDetails($where: user_details_bool_exp!, $_set: user_details_set_input) { update_user_details(where: $where, _set: $_set) { affected_rows __typename } }"
+GET_FEED_MODELS = "query GetFeedModels($order_by: [custom_models_order_by!] = [{createdAt: desc}], $where: custom_models_bool_exp, $generationsWhere: generations_bool_exp, $userId: uuid!, $limit: Int, $offset: Int) { custom_models( order_by: $order_by where: $where limit: $limit offset: $offset ) { ...ModelParts generations(limit: 1, where: $generationsWhere, order_by: [{createdAt: asc}]) { prompt generated_images(limit: 1, order_by: [{likeCount: desc}]) { id url likeCount __typename } __typename } user_favourite_custom_models(where: {userId: {_eq: $userId}}) { userId __typename } __typename } } fragment ModelParts on custom_models { id name description instancePrompt modelHeight modelWidth coreModel createdAt sdVersion type nsfw motion public trainingStrength user { id username __typename } generated_image { url id __typename } imageCount teamId __typename }"
+
+
+# The parts of the read queries a field projection (see util/projection.py) is compiled from: the variable
+# definitions, the root field and the arguments of the nested fields, keyed by dotted field path.
+PROJECTIONS = {
+    "GetAIGenerationFeed": {
+        "variables": {
+            "where": "generations_bool_exp = {}",
+            "userId": "uuid",
+            "limit": "Int",
+            "offset": "Int = 0"
+        },
+        "root": "generations( limit: $limit offset: $offset order_by: [{createdAt: desc}] where: $where)",
+        "arguments": {
+            "generated_images": "(order_by: [{url: desc}])"
+        }
+    },
+    "GetFeedModels": {
+        "variables": {
+            "order_by": "[custom_models_order_by!] = [{createdAt: desc}]",
+            "where": "custom_models_bool_exp",
+            "generationsWhere": "generations_bool_exp",
+            "userId": "uuid!",
+            "limit": "Int",
+            "offset": "Int"
+        },
+        "root": "custom_models( order_by: $order_by where: $where limit: $limit offset: $offset )",
+        "arguments": {
+            "generations": "(limit: 1, where: $generationsWhere, order_by: [{createdAt: asc}])",
+            "generations.generated_images": "(limit: 1, order_by: [{likeCount: desc}])",
+            "user_favourite_custom_models": "(where: {userId: {_eq: $userId}})"
+        }
+    }
+}
+
+def login_headers(app_url: str = "https://app.leonardo.ai") -> dict:
+    return {
+        "Accept": "*/*",
+        "Content-Type": "application/x-www-form-urlencoded",
+        "Host": urlparse(app_url).netloc,
+        "Origin": app_url,
+        "Referer": f"{app_url}/auth/login?callbackUrl=%2F",
+    }
+
+
+LOGIN_HEADERS = login_headers()
+
+
+def credentials_form(username: str, password: str, csrf_token: str) -> dict:
+    return {
+        "username": username,
+        "password": password,
+        "redirect": False,
+        "callbackUrl": "/",
+        "csrfToken": csrf_token,
+        "json": True
+    }
+
+
+def create_generation_job(generation_input: dict) -> dict:
+    return {
+        "operationName": "CreateSDGenerationJob",
+        "variables": {
+            "arg1": generation_input
+        },
+        "query": CREATE_SD_GENERATION_JOB
+    }
+
+
+def generation_statuses(creation_ids: List[str]) -> dict:
+    return {
+        "operationName": "GetAIGenerationFeedStatuses",
+        "variables": {
+            "where": {
+                "status": {
+                    "_in": [
+                        "COMPLETE",
+                        "FAILED"
+                    ]
+                },
+                "id": {
+                    "_in": list(creation_ids)
+                }
+            }
+        },
+        "query": GET_AI_GENERATION_FEED_STATUSES
+    }
+
+
+def generation_results(creation_ids: List[str]) -> dict:
+    """
+    The status query of generation_statuses selecting everything GetAIGenerationFeed does, so that the poll finding
+    a generation finished also returns its images. Pending generations are filtered out and cost no more than before.
+    """
+    json_data = generation_statuses(creation_ids)
+    json_data["operationName"] = "GetAIGenerationFeedResults"
+    json_data["query"] = GET_AI_GENERATION_FEED_RESULTS
+    return json_data
+
+
+def generation_feed(user_id: str, creation_ids: List[str] = None, offset: int = 0, limit: int = 10, created_before: str = None, created_after: str = None, before_inclusive: bool = False, after_inclusive: bool = False) -> dict:
+    """
+    The generations of user_id, newest first. Without creation_ids the whole feed is paged, created_before being
+    the createdAt keyset cursor of the next page. before_inclusive and after_inclusive also select the generations
+    created exactly at created_before and created_after.
+    """
+    where = {
+        "userId": {
+            "_eq": user_id
+        },
+        "teamId": {
+            "_is_null": True
+        },
+        "canvasRequest": {
+            "_eq": False
+        },
+        "universalUpscaler": {
+            "_is_null": True
+        },
+        "isStoryboard": {
+            "_eq": False
+        }
+    }
+    if creation_ids is not None:
+        where["id"] = {
+            "_in": list(creation_ids)
+        }
+    if created_before is not None or created_after is not None:
+        where["createdAt"] = {}
+        if created_before is not None:
+            where["createdAt"]["_lte" if before_inclusive else "_lt"] = created_before
+        if created_after is not None:
+            where["createdAt"]["_gte" if after_inclusive else "_gt"] = created_after
+
+    return {
+        "operationName": "GetAIGenerationFeed",
+        "variables": {
+            "where": where,
+            "offset": offset,
+            "limit": limit
+        },
+        "query": GET_AI_GENERATION_FEED
+    }
+
+
+def user_details(user_sub: str) -> dict:
+    return {
+        "operationName": "GetUserDetails",
+        "variables": {
+            "userSub": user_sub
+        },
+        "query": GET_USER_DETAILS
+    }
+
+
+def update_username(username: str) -> dict:
+    return {
+        "operationName": "UpdateUsername",
+        "variables": {
+            "arg1": {
+                "username": username
+            }
+        },
+        "query": UPDATE_USERNAME
+    }
+
+
+def update_view_nsfw(user_id: str, enabled: bool) -> dict:
+    return {
+        "operationName": "UpdateUserDetails",
+        "variables": {
+            "where": {
+                "userId": {
+                    "_eq": user_id
+                }
+            },
+            "_set": {
+                "showNsfw": enabled
+            }
+        },
+        "query": UPDATE_USER_DETAILS
+    }
+
+
+def feed_models(user_id: str, limit: int = 50, offset: int = 0, created_after: str = None) -> dict:
+    created_at = {
+        "_lt": datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + "Z"
+    }
+    if created_after is not None:
+        created_at["_gt"] = created_after
+
+    return {
+        "operationName": "GetFeedModels",
+        "variables": {
+            "order_by": {
+                "createdAt": "desc"
+            },
+            "userId": user_id,
+            "limit": limit,
+            "offset": offset,
+            "where": {
+                "official": {
+                    "_eq": True
+                },
+                "status": {
+                    "_eq": "COMPLETE"
+                },
+                "name": {
+                    "_ilike": "%%"
+                },
+                "type": {},
+                "nsfw": {
+                    "_eq": False
+                },
+                "createdAt": created_at
+            },
+            "generationsWhere": {
+                "generated_images": {
+                    "nsfw": {
+                        "_eq": False
+                    }
+                }
+            }
+        },
+        "query": GET_FEED_MODELS
+    }
+
+
+def generation_input(prompt: str, model_id: str, negative_prompt: str = "", nswf: bool = False, image_size: int = 7, sd_version: str = None, amount_of_images: int = 4, width: int = 1368, height: int = 768, num_inference_steps: int = 10, guidance_scale: int = 7, scheduler: str = None, tiling: bool = False, public: bool = False, leonardo_magic: bool = False, enhance_prompt: bool = True, contrast: float = 3.5, preset_style: str = None, pose_to_image: bool = False, pose_to_image_type: str = "POSE", weighting: float = 0.75, high_contrast: bool = False, transparency: str = "disabled", photo_real: bool = False, seed: int = None) -> dict:
+    if guidance_scale < 1 or guidance_scale > 20:
+        raise ValueError("guidance_scale must be between 1 and 20.")
+
+    return {
+        "prompt": prompt,
+        "negative_prompt": negative_prompt,
+        "nsfw": nswf,
+        "num_images": amount_of_images,
+        "width": width,
+        "height": height,
+        "image_size": image_size,
+        "num_inference_steps": num_inference_steps,
+        "contrast": contrast,
+        "guidance_scale": guidance_scale,
+        "sd_version": sd_version,
+        "modelId": model_id,
+        "presetStyle": preset_style,
+        "scheduler": scheduler,
+        "public": public,
+        "tiling": tiling,
+        "leonardoMagic": leonardo_magic,
+        "poseToImage": pose_to_image,
+        "poseToImageType": pose_to_image_type,
+        "weighting": weighting,
+        "highContrast": high_contrast,
+        "elements": [],
+        "userElements": [],
+        "controlnets": [],
+        "photoReal": photo_real,
+        "transparency": transparency,
+        "styleUUID": "111dc692-d470-4eec-b791-3475abac4c46",
+        "enhancePrompt": enhance_prompt,
+        "collectionIds": [],
+        "seed": seed
+    }
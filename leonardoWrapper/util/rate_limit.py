@@ -0,0 +1,46 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Allows rate acquisitions per second on average, with bursts of up to burst acquisitions.
+    """
+    def __init__(self, rate: float, burst: float = 1) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be greater than 0.")
+
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+
+    def acquire(self, tokens: float = 1) -> None:
+        """
+        Block until the tokens are available.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
@@ -0,0 +1,156 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of sending a request while the circuit breaker of its endpoint is open.
+    """
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Returns the number of seconds a Retry-After header asks to wait, it can be a number of seconds or an HTTP date.
+    """
+    if not value:
+        return None
+    try:
+        return max(0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_idempotent_graphql(json_data: dict) -> bool:
+    return not json_data.get("query", "").lstrip().startswith("mutation")
+
+
+class RetryPolicy:
+    """
+    Parameters:
+        - max_retries: The maximum number of retries after the first attempt.
+        - backoff: The delay before the first retry, multiplied by factor for each following one and capped at max_backoff.
+        - jitter: The fraction by which every delay is randomized.
+        - retry_statuses: The status codes retried for idempotent requests, 429 is always retried.
+        - max_retry_after: The longest Retry-After delay honoured, longer ones give up instead.
+    Idempotent requests (GET, GraphQL queries) are retried on network errors, timeouts and retry_statuses.
+    Other requests (GraphQL mutations, the login form) are only retried when the server cannot have processed them:
+    connection timeouts and 429 responses.
+    """
+    def __init__(self, max_retries: int = 3, backoff: float = 0.5, factor: float = 2, max_backoff: float = 30, jitter: float = 0.2, retry_statuses: Tuple[int, ...] = (429, 500, 502, 503, 504), max_retry_after: float = 120) -> None:
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.factor = factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_statuses = retry_statuses
+        self.max_retry_after = max_retry_after
+
+
+    def should_retry_status(self, status_code: int, idempotent: bool) -> bool:
+        if status_code == 429:
+            return True
+        return idempotent and status_code in self.retry_statuses
+
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> Optional[float]:
+        """
+        Returns the number of seconds to wait before retry number attempt (starting at 0), None to give up.
+        """
+        if attempt >= self.max_retries:
+            return None
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_retry_after else None
+
+        delay = min(self.max_backoff, self.backoff * self.factor ** attempt)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures, requests are then refused for recovery_time seconds.
+    After that a single trial request is let through (half-open), its outcome closes or reopens the circuit.
+    A trial ending without an outcome (cancelled, unexpected error) must be handed back with release_trial().
+    """
+    def __init__(self, failure_threshold: int = 5, recovery_time: float = 30) -> None:
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at < self.recovery_time:
+                return "open"
+            return "half-open"
+
+
+    def before_request(self, endpoint: str = "") -> bool:
+        """
+        Raises CircuitOpenError while the circuit is open, returns whether the request is the half-open trial.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            if time.monotonic() - self._opened_at >= self.recovery_time and not self._trial_running:
+                self._trial_running = True
+                return True
+        raise CircuitOpenError(f"The circuit breaker of {endpoint or 'this endpoint'} is open, the API looks degraded.")
+
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+
+    def release_trial(self) -> None:
+        """
+        End a trial without recording an outcome, the next request becomes the trial.
+        """
+        with self._lock:
+            self._trial_running = False
+
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class CircuitBreakers:
+    """
+    One CircuitBreaker per endpoint. The module level circuit_breakers instance is shared by every handler
+    of the process, so all the clients back off together when an endpoint degrades.
+    """
+    def __init__(self, failure_threshold: int = 5, recovery_time: float = 30) -> None:
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+
+    def get(self, endpoint: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = self._breakers[endpoint] = CircuitBreaker(self.failure_threshold, self.recovery_time)
+            return breaker
+
+
+circuit_breakers = CircuitBreakers()
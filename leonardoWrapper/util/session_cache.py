@@ -0,0 +1,93 @@
+import contextlib
+import hashlib
+import json
+import os
+import time
+from typing import Iterator, Optional
+
+from leonardoWrapper.util.parsing import decode_jwt_payload
+
+if os.name == "nt":
+    import msvcrt
+
+    def _lock_file(lock_file) -> None:
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _unlock_file(lock_file) -> None:
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock_file(lock_file) -> None:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(lock_file) -> None:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+class SessionCache:
+    """
+    On-disk cache of logged in sessions (cookies, access token and user informations) keyed by username,
+    so that short-lived processes can skip the login round trips until the access token is about to expire.
+    Entries are guarded by a lock file, processes on one host logging in with the same account wait for each other
+    and reuse the session the first one stored.
+    Parameters:
+        - directory: The directory the sessions are stored in, defaults to ~/.cache/leonardoWrapper.
+        - expiry_margin: A cached session is not reused when its access token expires within this number of seconds.
+    """
+    def __init__(self, directory: str = None, expiry_margin: float = 300) -> None:
+        self.directory = directory if directory is not None else os.path.join(os.path.expanduser("~"), ".cache", "leonardoWrapper")
+        self.expiry_margin = expiry_margin
+        os.makedirs(self.directory, exist_ok=True)
+
+
+    def _path(self, username: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(username.encode()).hexdigest() + ".json")
+
+
+    @contextlib.contextmanager
+    def lock(self, username: str) -> Iterator[None]:
+        with open(self._path(username) + ".lock", "a+") as lock_file:
+            _lock_file(lock_file)
+            try:
+                yield
+            finally:
+                _unlock_file(lock_file)
+
+
+    def load(self, username: str) -> Optional[dict]:
+        """
+        Returns the cached session of username, None when there is none or its access token is (about to be) expired.
+        """
+        try:
+            with open(self._path(username)) as session_file:
+                session = json.load(session_file)
+        except (OSError, ValueError):
+            return None
+
+        if session.get("expires_at", 0) - self.expiry_margin <= time.time():
+            return None
+        return session
+
+
+    def store(self, username: str, cookies: list, access_token: str, user_informations: dict) -> None:
+        session = {
+            "cookies": cookies,
+            "access_token": access_token,
+            "expires_at": decode_jwt_payload(access_token).get("exp", 0),
+            "user_informations": user_informations
+        }
+
+        path = self._path(username)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        file_descriptor = os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(file_descriptor, "w") as session_file:
+            json.dump(session, session_file)
+        os.replace(temporary_path, path)
+
+
+    def invalidate(self, username: str) -> None:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self._path(username))
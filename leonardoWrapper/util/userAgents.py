@@ -1,7 +1,4 @@
 import random
-import sys
-
-sys.dont_write_bytecode = True
 
 user_agents = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36",
@@ -0,0 +1,189 @@
+import threading
+import warnings
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from leonardoWrapper.util.catalog import ModelCatalog
+
+# the limits of the generation API
+MIN_SIDE = 32
+MAX_SIDE = 1536
+# a diffusion model (coreModel "SD") generates up to this many times its native resolution (modelWidth, modelHeight)
+MAX_NATIVE_SCALE = 2
+# sdVersion -> longest side, used when the catalog entry has no native resolution, the other versions go up to MAX_SIDE
+MAX_SIDE_BY_SD_VERSION = {
+    "v1_5": 1024,
+    "v2": 1024,
+}
+SIDE_MULTIPLE = 8
+MAX_IMAGES = 8
+# above this width or height at most MAX_LARGE_IMAGES images can be generated at once
+LARGE_SIDE = 768
+MAX_LARGE_IMAGES = 4
+MIN_STEPS = 10
+MAX_STEPS = 60
+SCHEDULERS = frozenset({"KLMS", "EULER_ANCESTRAL_DISCRETE", "EULER_DISCRETE", "DDIM", "DPM_SOLVER", "PNDM", "LEONARDO"})
+# the preset styles accepted with Alchemy (leonardoMagic), PhotoReal, and without either
+ALCHEMY_PRESET_STYLES = frozenset({
+    "ANIME", "BOKEH", "CINEMATIC", "CINEMATIC_CLOSEUP", "CREATIVE", "DYNAMIC", "ENVIRONMENT", "FASHION", "FILM", "FOOD",
+    "GENERAL", "HDR", "ILLUSTRATION", "LONG_EXPOSURE", "MACRO", "MINIMALISTIC", "MONOCHROME", "MOODY", "NEUTRAL", "NONE",
+    "PHOTOGRAPHY", "PORTRAIT", "RAYTRACED", "RENDER_3D", "RETRO", "SKETCH_BW", "SKETCH_COLOR", "STOCK_PHOTO", "UNPROCESSED", "VIBRANT"
+})
+PHOTO_REAL_PRESET_STYLES = frozenset({"CINEMATIC", "CREATIVE", "VIBRANT", "NONE"})
+DEFAULT_PRESET_STYLES = frozenset({"LEONARDO", "NONE"})
+
+
+class ModelRules(NamedTuple):
+    sd_version: Optional[str]
+    max_side: int
+
+    @classmethod
+    def from_model(cls, model: dict) -> "ModelRules":
+        """
+        The rules of a catalog entry: the longest side follows from the native resolution of diffusion models, the
+        sdVersion table is the fallback for the entries without one.
+        """
+        sd_version = model.get("sdVersion")
+        native = [side for side in (model.get("modelWidth"), model.get("modelHeight")) if isinstance(side, int) and side > 0]
+        if model.get("coreModel") == "SD" and native:
+            max_side = min(MAX_SIDE, MAX_NATIVE_SCALE * max(native)) // SIDE_MULTIPLE * SIDE_MULTIPLE
+            return cls(sd_version=sd_version, max_side=max(MIN_SIDE, max_side))
+        return cls(sd_version=sd_version, max_side=MAX_SIDE_BY_SD_VERSION.get(sd_version, MAX_SIDE))
+
+
+# the rules of models missing from the catalog, e.g. custom models
+UNKNOWN_MODEL = ModelRules(sd_version=None, max_side=MAX_SIDE)
+
+
+class GenerationAdjustedWarning(UserWarning):
+    """
+    Emitted by GenerationValidator when it normalizes a request instead of rejecting it, the message lists every change.
+    """
+
+
+class InvalidGenerationError(ValueError):
+    """
+    Raised by GenerationValidator before a generation is sent, problems lists every reason.
+    """
+    def __init__(self, problems: List[str]) -> None:
+        super().__init__("Invalid generation request: " + "; ".join(problems))
+        self.problems = problems
+
+
+class GenerationValidator:
+    """
+    Checks generation requests locally against the limits of the API and the model catalog (sdVersion, native
+    resolution), so that invalid requests fail before costing a round trip.
+    The catalog is compiled into a table of ModelRules by model id, rebuilt whenever the catalog is refreshed, so
+    validating a request is a dictionary lookup and a few comparisons.
+    Parameters:
+        - catalog: The ModelCatalog the per-model rules are built from, None to only check the global limits.
+        - normalize: Fix what can be fixed without changing the meaning of the request instead of rejecting it, with a
+          GenerationAdjustedWarning: the sd_version of a known model, and sizes scaled by one factor to fit the model
+          limits, keeping the aspect ratio, then rounded down to a multiple of 8. Sizes that cannot fit (an aspect
+          ratio too extreme for the limits), image counts, steps, schedulers and preset styles are always rejected.
+    """
+    def __init__(self, catalog: ModelCatalog = None, normalize: bool = True) -> None:
+        self.catalog = catalog
+        self.normalize = normalize
+        self._rules: Dict[str, ModelRules] = {}
+        self._compiled_at: float = None
+        self._lock = threading.Lock()
+
+
+    def _compile(self) -> None:
+        self._rules = {model["id"]: ModelRules.from_model(model) for model in self.catalog.models}
+
+
+    def rules_for(self, model_id: str) -> ModelRules:
+        if self.catalog is None:
+            return UNKNOWN_MODEL
+        self.catalog.ensure_fresh()
+        if self._compiled_at != self.catalog.fetched_at:
+            with self._lock:
+                if self._compiled_at != self.catalog.fetched_at:
+                    self._compile()
+                    self._compiled_at = self.catalog.fetched_at
+        return self._rules.get(model_id, UNKNOWN_MODEL)
+
+
+    def _size(self, width, height, rules: ModelRules, problems: List[str]) -> Tuple[int, int]:
+        valid = True
+        for name, value in (("width", width), ("height", height)):
+            if not isinstance(value, int) or isinstance(value, bool):
+                problems.append(f"{name} must be an integer, got {value!r}")
+                valid = False
+        if not valid:
+            return width, height
+        if all(MIN_SIDE <= side <= rules.max_side and side % SIDE_MULTIPLE == 0 for side in (width, height)):
+            return width, height
+        if self.normalize and min(width, height) > 0:
+            # one factor for both sides keeps the aspect ratio, the small epsilon absorbs the float error of the division
+            factor = min(1.0, rules.max_side / max(width, height))
+            factor = max(factor, MIN_SIDE / min(width, height))
+            scaled = tuple(int(side * factor + 1e-9) // SIDE_MULTIPLE * SIDE_MULTIPLE for side in (width, height))
+            if all(MIN_SIDE <= side <= rules.max_side for side in scaled):
+                return scaled
+            problems.append(f"{width}x{height} cannot be scaled between {MIN_SIDE} and {rules.max_side} pixels for this model without changing its aspect ratio")
+            return width, height
+        problems.append(f"width and height must be multiples of {SIDE_MULTIPLE} between {MIN_SIDE} and {rules.max_side} for this model, got {width}x{height}")
+        return width, height
+
+
+    def validate(self, generation_input: dict) -> dict:
+        """
+        Returns generation_input (see queries.generation_input), normalized when allowed, or raises InvalidGenerationError.
+        Every normalization is reported with a GenerationAdjustedWarning.
+        """
+        rules = self.rules_for(generation_input.get("modelId"))
+        problems: List[str] = []
+        adjustments: List[str] = []
+        normalized = dict(generation_input)
+
+        sd_version = generation_input.get("sd_version")
+        if rules.sd_version is not None and sd_version != rules.sd_version:
+            if self.normalize or sd_version is None:
+                normalized["sd_version"] = rules.sd_version
+                if sd_version is not None:
+                    adjustments.append(f"sd_version {sd_version} -> {rules.sd_version}")
+            else:
+                problems.append(f"sd_version {sd_version} does not match the model, which is {rules.sd_version}")
+
+        width, height = generation_input.get("width"), generation_input.get("height")
+        normalized["width"], normalized["height"] = self._size(width, height, rules, problems)
+        if (normalized["width"], normalized["height"]) != (width, height):
+            adjustments.append(f"size {width}x{height} -> {normalized['width']}x{normalized['height']}")
+
+        num_images = generation_input.get("num_images")
+        large = any(isinstance(normalized[side], int) and normalized[side] > LARGE_SIDE for side in ("width", "height"))
+        max_images = MAX_LARGE_IMAGES if large else MAX_IMAGES
+        if not isinstance(num_images, int) or not 1 <= num_images <= max_images:
+            problems.append(f"amount_of_images must be between 1 and {max_images}" + (f" above {LARGE_SIDE} pixels" if large else "") + f", got {num_images!r}")
+
+        steps = generation_input.get("num_inference_steps")
+        if not isinstance(steps, int) or not MIN_STEPS <= steps <= MAX_STEPS:
+            problems.append(f"num_inference_steps must be between {MIN_STEPS} and {MAX_STEPS}, got {steps!r}")
+
+        scheduler = generation_input.get("scheduler")
+        if scheduler is not None and scheduler not in SCHEDULERS:
+            problems.append(f"unknown scheduler {scheduler!r}, expected one of {', '.join(sorted(SCHEDULERS))}")
+
+        preset_style = generation_input.get("presetStyle")
+        if preset_style is not None:
+            allowed = self._preset_styles(generation_input)
+            if preset_style not in allowed:
+                problems.append(f"preset_style {preset_style!r} is not available here, expected one of {', '.join(sorted(allowed))}")
+
+        if problems:
+            raise InvalidGenerationError(problems)
+        if adjustments:
+            warnings.warn("Generation request adjusted: " + "; ".join(adjustments), GenerationAdjustedWarning, stacklevel=2)
+        return normalized
+
+
+    @staticmethod
+    def _preset_styles(generation_input: dict) -> FrozenSet[str]:
+        if generation_input.get("photoReal"):
+            return PHOTO_REAL_PRESET_STYLES
+        if generation_input.get("leonardoMagic"):
+            return ALCHEMY_PRESET_STYLES
+        return DEFAULT_PRESET_STYLES
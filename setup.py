@@ -13,5 +13,13 @@ setup(
     install_requires=[
         "requests",
     ],
-    python_requires=">=3.6",
+    extras_require={
+        "async": ["aiohttp"],
+        "http2": ["httpx[http2]"],
+        "brotli": ["brotli"],
+    },
+    entry_points={
+        "console_scripts": ["leonardo-generate=leonardoWrapper.cli:main"],
+    },
+    python_requires=">=3.8",
 )
\ No newline at end of file
@@ -0,0 +1,54 @@
+import pytest
+from mock_server import MockLeonardo
+
+from leonardoWrapper import Leonardo
+from leonardoWrapper.util.api import RequestsHandler
+from leonardoWrapper.util.polling import FixedInterval
+from leonardoWrapper.util.resilience import CircuitBreakers, RetryPolicy
+
+
+@pytest.fixture
+def server():
+    with MockLeonardo(job_duration=0.1) as server:
+        yield server
+
+
+@pytest.fixture
+def make_handler(server):
+    """
+    Builds RequestsHandlers pointed at the mock server, with fast retries and their own circuit breakers,
+    so that a test never trips the breakers shared by the process.
+    """
+    handlers = []
+
+    def make_handler(**kwargs) -> RequestsHandler:
+        kwargs.setdefault("retry_policy", RetryPolicy(backoff=0.01))
+        kwargs.setdefault("circuit_breakers", CircuitBreakers())
+        handler = RequestsHandler(app_url=server.url, api_url=server.url, trust_env=False, **kwargs)
+        handlers.append(handler)
+        return handler
+
+    yield make_handler
+    for handler in handlers:
+        handler.close()
+
+
+@pytest.fixture
+def make_leonardo(make_handler):
+    clients = []
+
+    def make_leonardo(handler: RequestsHandler = None, **kwargs) -> Leonardo:
+        kwargs.setdefault("polling", FixedInterval(0.05))
+        leonardo = Leonardo("mock", "mock", requests_handler=handler if handler is not None else make_handler(), **kwargs)
+        leonardo.poller.min_tick_interval = 0.01
+        clients.append(leonardo)
+        return leonardo
+
+    yield make_leonardo
+    for leonardo in clients:
+        leonardo.close()
+
+
+@pytest.fixture
+def leonardo(make_leonardo) -> Leonardo:
+    return make_leonardo()
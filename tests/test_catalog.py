@@ -0,0 +1,14 @@
+from leonardoWrapper.util.catalog import ModelCatalog
+
+
+def test_missing_generation_settings_come_from_the_model(server, leonardo, tmp_path):
+    model = server.models[0]
+    model.update(modelWidth=832, modelHeight=640)
+    leonardo._catalog = ModelCatalog(leonardo.user, directory=str(tmp_path))
+
+    creation_id = leonardo.create_generate_image(prompt="a cat", model_id=model["id"], height=512, amount_of_images=1)
+    arguments = server.generations[creation_id]["input"]
+    assert (arguments["width"], arguments["height"], arguments["sd_version"]) == (832, 512, model["sdVersion"])
+
+    creation_id = leonardo.create_generate_image(prompt="a cat", model_id=model["id"], width=512, amount_of_images=1)
+    assert (server.generations[creation_id]["input"]["width"], server.generations[creation_id]["input"]["height"]) == (512, 640)
@@ -0,0 +1,62 @@
+import io
+import json
+
+from leonardoWrapper.cli import run
+from leonardoWrapper.jobs import GenerationQueue
+from leonardoWrapper.util.journal import GenerationJournal
+
+SPECS = [
+    {"key": "first", "prompt": "first", "model_id": "model", "amount_of_images": 1},
+    {"key": "second", "prompt": "second", "model_id": "model", "amount_of_images": 1},
+    {"key": "invalid", "prompt": "invalid", "model_id": "model", "amount_of_images": 1, "num_inference_steps": 100},
+]
+
+
+def lines(specs):
+    return [json.dumps(spec) + "\n" for spec in specs] + ["not json\n"]
+
+
+def run_once(leonardo, journal, specs, **kwargs):
+    output = io.StringIO()
+    counts = run(GenerationQueue(leonardo, rate=100, burst=100, timeout=kwargs.pop("timeout", 10)), journal, lines(specs), output, **kwargs)
+    return counts, {record["key"]: record for record in map(json.loads, output.getvalue().splitlines())}
+
+
+def test_run_then_resume_skips_finished_jobs(server, make_leonardo, tmp_path):
+    leonardo = make_leonardo(validator=True)
+    journal = GenerationJournal(str(tmp_path / "journal.sqlite3"))
+
+    counts, records = run_once(leonardo, journal, SPECS)
+    assert counts == {"COMPLETE": 2, "FAILED": 0, "INVALID": 2, "skipped": 0}
+    assert records["invalid"]["status"] == "INVALID" and "num_inference_steps" in records["invalid"]["error"]
+    assert records["4"]["status"] == "INVALID"
+    assert journal.counts() == {"COMPLETE": 2}
+
+    created = len(server.generations)
+    counts, _ = run_once(leonardo, journal, SPECS, retry_failed=True)
+    assert counts == {"COMPLETE": 0, "FAILED": 0, "INVALID": 2, "skipped": 2}
+    assert len(server.generations) == created
+
+
+def test_resume_waits_for_pending_jobs_instead_of_creating_them_again(server, make_leonardo, tmp_path):
+    leonardo = make_leonardo()
+    journal = GenerationJournal(str(tmp_path / "journal.sqlite3"))
+    # a previous run created "first" and crashed before it finished
+    journal.created("first", leonardo.create_generate_image(prompt="first", model_id="model", amount_of_images=1))
+    created = len(server.generations)
+
+    counts, records = run_once(leonardo, journal, SPECS[:1])
+    assert counts["COMPLETE"] == 1
+    assert records["first"]["generation_id"] == journal.get("first")[0]
+    assert len(server.generations) == created
+
+
+def test_stale_pending_job_is_recorded_as_failed(make_leonardo, tmp_path):
+    leonardo = make_leonardo()
+    journal = GenerationJournal(str(tmp_path / "journal.sqlite3"))
+    journal.created("first", "purged-generation")
+
+    counts, records = run_once(leonardo, journal, SPECS[:1], timeout=0.3)
+    assert counts["FAILED"] == 1
+    assert records["first"]["status"] == "FAILED" and "did not finish in time" in records["first"]["error"]
+    assert journal.get("first") == ("purged-generation", "FAILED")
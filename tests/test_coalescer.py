@@ -0,0 +1,114 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from leonardoWrapper.util import queries
+from leonardoWrapper.util.coalescer import GraphQLCoalescer, merge_queries
+from leonardoWrapper.util.resilience import CircuitBreakers, RetryPolicy
+
+STATUSES = {
+    "operationName": "Statuses",
+    "variables": {"where": {"id": {"_in": ["a"]}}},
+    "query": "query Statuses($where: generations_bool_exp) { generations(where: $where) { id status } }"
+}
+ALIASED = {
+    "operationName": "Aliased",
+    "variables": {"where": {"id": {"_in": ["b"]}}, "limit": 1},
+    "query": "query Aliased($where: generations_bool_exp, $limit: Int) { latest: generations(where: $where, limit: $limit) { ...ImageParts } "
+             "users { id } } fragment ImageParts on generations { id generated_images { url } }"
+}
+IMAGES = {
+    "operationName": "Images",
+    "variables": {"where": {"id": {"_in": ["c"]}}},
+    "query": "query Images($where: generations_bool_exp) { generations(where: $where, order_by: [{createdAt: desc}]) { ...ImageParts } } "
+             "fragment ImageParts on generations { id generated_images { url } }"
+}
+
+
+def test_merge_renames_variables_and_aliases_fields():
+    merged, key_maps = merge_queries([STATUSES, ALIASED])
+
+    assert merged["operationName"] == "Coalesced"
+    assert merged["variables"] == {"where_0": STATUSES["variables"]["where"], "where_1": ALIASED["variables"]["where"], "limit_1": 1}
+    assert "query Coalesced($where_0: generations_bool_exp, $where_1: generations_bool_exp, $limit_1: Int)" in merged["query"]
+    assert "c0_generations: generations(where: $where_0)" in merged["query"]
+    assert "c1_latest: generations(where: $where_1, limit: $limit_1)" in merged["query"]
+    assert "c1_users: users" in merged["query"]
+    assert "$where)" not in merged["query"] and "$limit)" not in merged["query"]
+    assert key_maps == [{"c0_generations": "generations"}, {"c1_latest": "latest", "c1_users": "users"}]
+
+
+def test_merge_keeps_nested_selections_and_arguments():
+    merged, _ = merge_queries([STATUSES, IMAGES])
+
+    # only top level fields are aliased, object arguments and sub-selections are left alone
+    assert "c1_generations: generations(where: $where_1, order_by: [{createdAt: desc}]) { ...ImageParts }" in merged["query"]
+    assert "generated_images { url }" in merged["query"]
+    assert "c1_generated_images" not in merged["query"] and "c1_id" not in merged["query"]
+
+
+def test_merge_sends_shared_fragments_once():
+    merged, _ = merge_queries([ALIASED, IMAGES])
+
+    assert merged["query"].count("fragment ImageParts on generations") == 1
+
+
+def test_responses_are_split_back_per_caller():
+    sent = []
+
+    def send(json_data):
+        sent.append(json_data)
+        data = {}
+        for merged_key in ("c0_generations", "c1_generations", "c2_generations", "c0_latest", "c1_latest", "c2_latest", "c0_users", "c1_users", "c2_users"):
+            if f"{merged_key}:" in json_data["query"]:
+                data[merged_key] = [{"id": merged_key}]
+        return {"status_code": 200, "json": {"data": data}, "text": ""}
+
+    coalescer = GraphQLCoalescer(send, window=0.2)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        responses = list(executor.map(coalescer.submit, [STATUSES, ALIASED, IMAGES, STATUSES]))
+
+    assert len(sent) == 1
+    merged_keys = {alias for alias in ("c0_generations", "c1_generations", "c2_generations") if f"{alias}:" in sent[0]["query"]}
+    assert len(merged_keys) == 2
+    statuses, aliased, images, duplicate = [response["json"]["data"] for response in responses]
+    assert set(statuses) == {"generations"} and set(images) == {"generations"}
+    assert statuses["generations"] != images["generations"]
+    assert set(aliased) == {"latest", "users"}
+    # identical queries share one response, each caller gets its own copy
+    assert duplicate == statuses and duplicate is not statuses
+
+
+def test_graphql_errors_split_the_batch():
+    sent = []
+    lock = threading.Lock()
+
+    def send(json_data):
+        with lock:
+            sent.append(json_data["operationName"])
+        if json_data["operationName"] in ("Coalesced", "Aliased"):
+            return {"status_code": 200, "json": {"errors": [{"message": "field 'users' not found"}]}, "text": ""}
+        return {"status_code": 200, "json": {"data": {"generations": []}}, "text": ""}
+
+    coalescer = GraphQLCoalescer(send, window=0.2)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        statuses, aliased = executor.map(coalescer.submit, [STATUSES, ALIASED])
+
+    assert sorted(sent) == ["Aliased", "Coalesced", "Statuses"]
+    assert statuses["json"] == {"data": {"generations": []}}
+    assert "errors" in aliased["json"]
+
+
+def test_failed_batch_is_not_sent_again_query_by_query(server, make_handler, make_leonardo):
+    handler = make_handler(
+        coalesce=True, coalesce_window=0.2, retry_policy=RetryPolicy(max_retries=1, backoff=0.01),
+        circuit_breakers=CircuitBreakers(failure_threshold=10 ** 6)
+    )
+    make_leonardo(handler)
+    server.error_rate = 1
+    requests_before = server.requests
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        responses = list(executor.map(handler.send_graphql_request, [queries.generation_statuses([str(index)]) for index in range(5)]))
+
+    # the merged request and its retry, not another request and retry per query
+    assert server.requests - requests_before == 2
+    assert [response["status_code"] for response in responses] == [500] * 5
@@ -0,0 +1,52 @@
+import os
+from urllib.parse import urlparse
+
+from leonardoWrapper.util.downloader import ImageDownloader
+
+
+def image_bytes(image) -> bytes:
+    # what the mock server serves for an image
+    return urlparse(image["url"]).path.encode() * 64
+
+
+def read(path: str) -> bytes:
+    with open(path, "rb") as image_file:
+        return image_file.read()
+
+
+def test_images_are_downloaded_once(server, leonardo, tmp_path):
+    generated_image = leonardo.generate("a cat", "model", amount_of_images=2, check_interval=0.05)
+    downloader = ImageDownloader(leonardo._requests_handler, directory=str(tmp_path))
+    paths = downloader.download([generated_image])
+    for image in generated_image["generated_images"]:
+        assert read(paths[image["id"]]) == image_bytes(image)
+
+    requests = server.requests
+    assert downloader.download([generated_image]) == paths
+    assert server.requests == requests
+
+
+def test_partial_downloads_are_resumed(leonardo, tmp_path):
+    generated_image = leonardo.generate("a cat", "model", amount_of_images=1, check_interval=0.05)
+    image = generated_image["generated_images"][0]
+    body = image_bytes(image)
+    # a resumed download keeps the bytes already on disk, a restarted one would overwrite them
+    with open(tmp_path / f"{image['id']}.jpg.part", "wb") as part_file:
+        part_file.write(b"x" * 100)
+
+    path = ImageDownloader(leonardo._requests_handler, directory=str(tmp_path)).download_image(image)
+    assert read(path) == b"x" * 100 + body[100:]
+    assert not os.path.exists(path + ".part")
+
+
+def test_complete_partial_download_is_kept(leonardo, tmp_path):
+    generated_image = leonardo.generate("a cat", "model", amount_of_images=1, check_interval=0.05)
+    image = generated_image["generated_images"][0]
+    body = image_bytes(image)
+    with open(tmp_path / f"{image['id']}.jpg.part", "wb") as part_file:
+        part_file.write(body)
+
+    downloader = ImageDownloader(leonardo._requests_handler, directory=str(tmp_path), naming="sha256")
+    path = downloader.download_image(image)
+    assert read(path) == body
+    assert downloader.download_image(image) == path
@@ -0,0 +1,19 @@
+from gen_models_md import generate
+
+from leonardoWrapper.util.catalog import ModelCatalog
+
+
+def test_only_changed_models_are_rendered_again(server, leonardo, tmp_path):
+    output_path, manifest_path = str(tmp_path / "models.md"), str(tmp_path / "models.md.manifest.json")
+    catalog = ModelCatalog(leonardo.user, directory=str(tmp_path), fields=None)
+    catalog.refresh(full=True)
+    assert generate(catalog, output_path, manifest_path) == {"rendered": len(server.models), "reused": 0}
+
+    server.models[3]["description"] = "An edited description"
+    catalog.refresh(full=True)
+    assert generate(catalog, output_path, manifest_path) == {"rendered": 1, "reused": len(server.models) - 1}
+
+    with open(output_path) as output_file:
+        content = output_file.read()
+    assert "An edited description" in content
+    assert content.count("## Model ") == len(server.models)
@@ -0,0 +1,37 @@
+from leonardoWrapper.history import GenerationHistory
+
+
+def create(leonardo, prompts: list) -> list:
+    return [leonardo.create_generate_image(prompt=prompt, model_id="model", amount_of_images=1) for prompt in prompts]
+
+
+def test_generations_sharing_a_timestamp_are_paged_once(server, leonardo):
+    creation_ids = create(leonardo, [f"prompt {index}" for index in range(7)])
+    # 5 generations created at the same time straddle the pages of 2
+    for creation_id in creation_ids[1:6]:
+        server.generations[creation_id]["createdAt"] = "2024-01-01T00:00:00.000Z"
+    server.generations[creation_ids[6]]["createdAt"] = "2023-01-01T00:00:00.000Z"
+
+    iterated = [generated_image["id"] for generated_image in leonardo.iter_image_generations(page_size=2)]
+    assert sorted(iterated) == sorted(creation_ids)
+
+
+def test_sync_is_incremental_and_searchable(server, leonardo, tmp_path):
+    history = GenerationHistory(str(tmp_path / "history.sqlite3"))
+    try:
+        creation_ids = create(leonardo, ["a castle at night", "a cat", "a castle by day"])
+        assert history.sync(leonardo, page_size=2) == 3
+        assert len(history) == 3
+
+        # created after the sync, at the same timestamp as its cursor
+        newest = max(generation["createdAt"] for generation in server.generations.values())
+        late_id = create(leonardo, ["a late castle"])[0]
+        server.generations[late_id]["createdAt"] = newest
+        history.sync(leonardo, page_size=2)
+        assert len(history) == 4
+
+        castles = history.search(prompt="castle")
+        assert {generated_image["id"] for generated_image in castles} == {creation_ids[0], creation_ids[2], late_id}
+        assert history.get(creation_ids[1])["prompt"] == "a cat"
+    finally:
+        history.close()
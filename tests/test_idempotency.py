@@ -0,0 +1,31 @@
+from leonardoWrapper.util.idempotency import SubmissionCache
+
+
+def test_identical_requests_share_one_generation(server, make_leonardo, tmp_path):
+    leonardo = make_leonardo(submission_cache=SubmissionCache(str(tmp_path / "submissions.sqlite3")))
+
+    first = leonardo.create_generate_image(prompt="a castle", model_id="model", seed=1)
+    # the whitespace around the prompt does not make a request different
+    assert leonardo.create_generate_image(prompt="  a castle ", model_id="model", seed=1) == first
+    assert leonardo.create_generate_image(prompt="a castle", model_id="model", seed=2) != first
+    assert len(server.generations) == 2
+
+
+def test_finished_generation_is_served_from_the_cache(server, make_leonardo, tmp_path):
+    leonardo = make_leonardo(submission_cache=SubmissionCache(str(tmp_path / "submissions.sqlite3")))
+    generated_image = leonardo.generate(prompt="a castle", model_id="model", check_interval=0.05)
+
+    requests_before = server.requests
+    again = leonardo.generate(prompt="a castle", model_id="model", check_interval=0.05)
+    assert again == generated_image
+    assert server.requests == requests_before
+
+
+def test_failed_generation_is_created_again(server, make_leonardo, tmp_path):
+    leonardo = make_leonardo(submission_cache=SubmissionCache(str(tmp_path / "submissions.sqlite3")))
+    server.failure_rate = 1
+    failed = leonardo.generate(prompt="a castle", model_id="model", check_interval=0.05)
+    assert failed["status"] == "FAILED"
+
+    server.failure_rate = 0
+    assert leonardo.create_generate_image(prompt="a castle", model_id="model") != failed["id"]
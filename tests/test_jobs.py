@@ -0,0 +1,54 @@
+import time
+
+import pytest
+
+from leonardoWrapper.jobs import GenerationQueue
+
+
+def test_jobs_run_end_to_end(leonardo):
+    with GenerationQueue(leonardo, max_concurrency=4, rate=100, burst=100) as queue:
+        futures = [queue.submit({"prompt": f"prompt {index}", "model_id": "model", "amount_of_images": 1}) for index in range(6)]
+        generated_images = [future.result(timeout=10) for future in futures]
+
+    assert [generated_image["status"] for generated_image in generated_images] == ["COMPLETE"] * 6
+    assert sorted(generated_image["prompt"] for generated_image in generated_images) == [f"prompt {index}" for index in range(6)]
+
+
+def test_map_yields_before_reading_the_whole_input(leonardo):
+    read = []
+
+    def specs():
+        for index in range(1000):
+            read.append(index)
+            yield {"prompt": f"prompt {index}", "model_id": "model", "amount_of_images": 1}
+
+    with GenerationQueue(leonardo, max_concurrency=2, rate=100, burst=100) as queue:
+        results = queue.map(specs())
+        spec, generated_image = next(results)
+        assert generated_image["status"] == "COMPLETE"
+        assert len(read) <= 4
+        results.close()
+
+
+def test_unknown_generation_times_out_instead_of_hanging(leonardo):
+    queue = GenerationQueue(leonardo, timeout=0.3)
+    future = queue.track("unknown-generation")
+    with pytest.raises(TimeoutError):
+        future.result(timeout=5)
+
+    started = time.monotonic()
+    queue.shutdown(wait=True)
+    assert time.monotonic() - started < 1
+
+
+def test_failing_status_requests_surface_in_the_timeout(server, leonardo):
+    queue = GenerationQueue(leonardo, timeout=0.5)
+    future = queue.submit({"prompt": "prompt", "model_id": "model", "amount_of_images": 1})
+    # let the creation through, then fail every status request
+    while not leonardo.poller.pending():
+        time.sleep(0.01)
+    server.error_rate = 1
+    with pytest.raises(TimeoutError, match="the last status request failed"):
+        future.result(timeout=5)
+    server.error_rate = 0
+    queue.shutdown()
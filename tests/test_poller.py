@@ -0,0 +1,46 @@
+import time
+
+from leonardoWrapper import Leonardo
+from leonardoWrapper.util.poller import GenerationPoller
+from leonardoWrapper.util.polling import FixedInterval
+
+
+def create(leonardo: Leonardo, count: int) -> list:
+    return [leonardo.create_generate_image(prompt=f"prompt {index}", model_id="model", amount_of_images=1) for index in range(count)]
+
+
+def test_poller_resolves_every_tracked_generation(leonardo):
+    creation_ids = create(leonardo, 5)
+    poller = GenerationPoller(leonardo._requests_handler, batch_size=2, polling=FixedInterval(0.05), min_tick_interval=0.01)
+    try:
+        futures = [poller.track(creation_id) for creation_id in creation_ids]
+        assert [future.result(timeout=10) for future in futures] == ["COMPLETE"] * 5
+        assert poller.pending() == [] and poller.last_error is None
+    finally:
+        poller.stop()
+
+
+def test_failed_status_requests_are_polled_again(server, leonardo):
+    creation_id = create(leonardo, 1)[0]
+    poller = GenerationPoller(leonardo._requests_handler, polling=FixedInterval(0.05), min_tick_interval=0.01)
+    server.error_rate = 1
+    try:
+        future = poller.track(creation_id)
+        deadline = time.monotonic() + 10
+        while poller.last_error is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert poller.last_error is not None and not future.done()
+        server.error_rate = 0
+        assert future.result(timeout=10) == "COMPLETE"
+    finally:
+        poller.stop()
+
+
+def test_waiting_does_not_build_the_poller(make_handler):
+    leonardo = Leonardo("mock", "mock", requests_handler=make_handler(), polling=FixedInterval(0.05))
+    try:
+        creation_ids = create(leonardo, 3)
+        assert leonardo.wait_for_generations(creation_ids, timeout=10) == dict.fromkeys(creation_ids, "COMPLETE")
+        assert leonardo._poller is None
+    finally:
+        leonardo.close()
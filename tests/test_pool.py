@@ -0,0 +1,54 @@
+import time
+
+import pytest
+
+from leonardoWrapper import LeonardoPool
+from leonardoWrapper.util.idempotency import SubmissionCache
+
+
+def test_duplicate_submission_does_not_leak_a_reservation(make_leonardo, tmp_path):
+    cache = SubmissionCache(str(tmp_path / "submissions.sqlite3"))
+    pool = LeonardoPool([make_leonardo(submission_cache=cache), make_leonardo(submission_cache=cache)])
+
+    first = pool.create_generate_image(prompt="same", model_id="model", seed=1)
+    second = pool.create_generate_image(prompt="same", model_id="model", seed=1)
+    assert first == second
+    assert sum(pool._reserved) == 4 and sum(pool._in_flight) == 1
+
+    assert pool.wait_for_generations([first, second], check_interval=0.05) == {first: "COMPLETE"}
+    assert pool._reserved == [0, 0] and pool._in_flight == [0, 0]
+
+
+def test_failed_creation_releases_its_reservation(server, make_leonardo):
+    pool = LeonardoPool([make_leonardo(), make_leonardo()])
+    server.error_rate = 1
+    with pytest.raises(Exception):
+        pool.create_generate_image(prompt="a cat", model_id="model")
+    assert pool._reserved == [0, 0] and pool._in_flight == [0, 0]
+
+
+def test_finished_generations_release_their_reservation(server, make_leonardo):
+    pool = LeonardoPool([make_leonardo()])
+    balance = pool._balances[0]
+    complete = pool.create_generate_image(prompt="a cat", model_id="model", amount_of_images=2)
+    assert pool._reserved == [2] and pool._in_flight == [1]
+    assert pool.wait_for_generations([complete], check_interval=0.05) == {complete: "COMPLETE"}
+    assert pool._reserved == [0] and pool._balances[0] == balance - 2
+
+    server.failure_rate = 1
+    failed = pool.create_generate_image(prompt="a dog", model_id="model", amount_of_images=2)
+    time.sleep(0.2)
+    assert pool.get_image_generations([failed])[failed]["status"] == "FAILED"
+    # a failed generation costs nothing
+    assert pool._reserved == [0] and pool._in_flight == [0] and pool._balances[0] == balance - 2
+    assert pool.account_for(failed) is pool.accounts[0]
+
+
+def test_timed_out_wait_releases_the_reservation_as_spent(server, make_leonardo):
+    server.job_duration = 10
+    pool = LeonardoPool([make_leonardo()])
+    balance = pool._balances[0]
+    creation_id = pool.create_generate_image(prompt="a cat", model_id="model", amount_of_images=1)
+    with pytest.raises(TimeoutError):
+        pool.wait_for_generations([creation_id], check_interval=0.05, timeout=0.2)
+    assert pool._reserved == [0] and pool._in_flight == [0] and pool._balances[0] == balance - 1
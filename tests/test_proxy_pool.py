@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+from leonardoWrapper.util.proxy_pool import ProxyPool
+
+# nothing listens on port 1, connecting fails at once
+DEAD_PROXY = "127.0.0.1:1"
+
+
+def test_failing_proxy_is_ejected_then_probed_back():
+    pool = ProxyPool(["a:1", "b:1"], max_consecutive_failures=2, ejection_time=0.05)
+    bad, good = pool.proxies
+    for _ in range(2):
+        pool.begin(bad)
+        pool.record(bad, 0.1, failed=True)
+    assert bad.ejected
+    assert all(pool.select(idempotent=True) is good for _ in range(5))
+
+    time.sleep(0.06)
+    # only idempotent requests probe
+    assert pool.select(idempotent=False) is good
+    probe = pool.select(idempotent=True)
+    assert probe is bad and bad.probing
+    pool.record(bad, 0.1, failed=False)
+    assert not bad.ejected and not bad.probing
+
+
+def test_failed_probe_doubles_the_ejection():
+    pool = ProxyPool(["a:1", "b:1"], max_consecutive_failures=1, ejection_time=0.05)
+    bad = pool.proxies[0]
+    pool.begin(bad)
+    pool.record(bad, 0.1, failed=True)
+    time.sleep(0.06)
+    assert pool.select(idempotent=True) is bad
+    pool.record(bad, 0.1, failed=True)
+    assert bad.ejections == 2
+    assert bad.ejected_until - time.monotonic() > 0.05
+
+
+def test_cancelled_probe_lets_another_request_probe():
+    pool = ProxyPool(["a:1", "b:1"], max_consecutive_failures=1, ejection_time=0)
+    bad = pool.proxies[0]
+    pool.begin(bad)
+    pool.record(bad, 0.1, failed=True)
+    assert pool.select(idempotent=True) is bad
+    pool.cancel(bad)
+    assert bad.in_flight == 0 and bad.ejected and not bad.probing
+    assert pool.select(idempotent=True) is bad
+
+
+def test_success_through_an_ejected_fallback_resets_it():
+    pool = ProxyPool(["a:1"], max_consecutive_failures=1, ejection_time=60)
+    proxy = pool.proxies[0]
+    pool.begin(proxy)
+    pool.record(proxy, 0.1, failed=True)
+    # every proxy is ejected, the least bad one still serves non-idempotent requests
+    assert pool.select(idempotent=False) is proxy
+    pool.record(proxy, 0.1, failed=False)
+    assert not proxy.ejected
+    assert pool.stats()[0]["error_rate"] == 0
+
+
+def test_dead_proxy_is_ejected_and_the_request_fails_over(server, make_handler):
+    pool = ProxyPool([DEAD_PROXY, server.url], max_consecutive_failures=1)
+    handler = make_handler(proxy_pool=pool)
+    for _ in range(3):
+        assert handler.send_get_request(f"{server.url}/api/auth/csrf")["status_code"] == 200
+    dead, alive = pool.stats()
+    assert dead["ejected"] and not alive["ejected"]
+    assert dead["in_flight"] == alive["in_flight"] == 0
+
+
+def test_rate_limits_do_not_count_against_the_proxy(server, make_handler):
+    pool = ProxyPool([server.url], max_consecutive_failures=1)
+    handler = make_handler(proxy_pool=pool)
+    server.rate_limit_rate = 1
+    assert handler.send_get_request(f"{server.url}/api/auth/csrf")["status_code"] == 429
+    assert not pool.stats()[0]["ejected"]
+
+
+def test_unexpected_errors_release_the_proxy(server, make_handler, monkeypatch):
+    pool = ProxyPool([server.url])
+    handler = make_handler(proxy_pool=pool)
+
+    def broken_request(*args, **kwargs):
+        raise ValueError("not a transport error")
+
+    monkeypatch.setattr(handler.requests_session, "request", broken_request)
+    with pytest.raises(ValueError):
+        handler.send_get_request(f"{server.url}/api/auth/csrf")
+    assert pool.stats()[0]["in_flight"] == 0 and not pool.stats()[0]["ejected"]
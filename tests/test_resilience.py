@@ -0,0 +1,55 @@
+import time
+
+import pytest
+
+from leonardoWrapper.util.resilience import CircuitBreakers, CircuitOpenError, RetryPolicy
+
+
+def test_retry_after_is_honoured(server, make_handler):
+    server.rate_limit_rate, server.retry_after = 1, 0.3
+    handler = make_handler(retry_policy=RetryPolicy(max_retries=1, backoff=0.01, jitter=0))
+    started = time.monotonic()
+    assert handler.send_get_request(f"{server.url}/api/auth/csrf")["status_code"] == 429
+    assert time.monotonic() - started >= 0.3
+    assert server.requests == 2
+
+
+def test_too_long_retry_after_gives_up_at_once(server, make_handler):
+    server.rate_limit_rate, server.retry_after = 1, 60
+    handler = make_handler(retry_policy=RetryPolicy(backoff=0.01, max_retry_after=1))
+    started = time.monotonic()
+    assert handler.send_get_request(f"{server.url}/api/auth/csrf")["status_code"] == 429
+    assert time.monotonic() - started < 1
+    assert server.requests == 1
+
+
+def test_only_idempotent_requests_are_retried_on_5xx(server, make_handler):
+    server.error_rate = 1
+    handler = make_handler(retry_policy=RetryPolicy(max_retries=2, backoff=0.01))
+    assert handler.send_get_request(f"{server.url}/api/auth/csrf")["status_code"] == 500
+    assert server.requests == 3
+    assert handler.send_post_request(f"{server.url}/api/auth/callback/credentials", data={})["status_code"] == 500
+    assert server.requests == 4
+
+
+def test_breaker_opens_then_recovers_through_one_trial(server, make_handler):
+    url = f"{server.url}/api/auth/csrf"
+    handler = make_handler(retry_policy=RetryPolicy(max_retries=0), circuit_breakers=CircuitBreakers(failure_threshold=2, recovery_time=0.2))
+    breaker = handler.circuit_breakers.get(url)
+    server.error_rate = 1
+    for _ in range(2):
+        assert handler.send_get_request(url)["status_code"] == 500
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        handler.send_get_request(url)
+    assert server.requests == 2
+
+    time.sleep(0.25)
+    server.error_rate = 0
+    # a 429 says nothing about the endpoint, the trial is handed back
+    server.rate_limit_rate = 1
+    assert handler.send_get_request(url)["status_code"] == 429
+    assert breaker.state == "half-open"
+    server.rate_limit_rate = 0
+    assert handler.send_get_request(url)["status_code"] == 200
+    assert breaker.state == "closed"
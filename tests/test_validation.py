@@ -0,0 +1,56 @@
+import warnings
+
+import pytest
+
+from leonardoWrapper.util import queries
+from leonardoWrapper.util.catalog import ModelCatalog
+from leonardoWrapper.util.validation import MAX_SIDE, GenerationAdjustedWarning, GenerationValidator, InvalidGenerationError, ModelRules
+
+
+@pytest.fixture
+def catalog(server, leonardo, tmp_path) -> ModelCatalog:
+    server.models[0].update(modelWidth=512, modelHeight=512, sdVersion="v1_5")
+    server.models[1].update(modelWidth=None, modelHeight=None, sdVersion="v2")
+    return ModelCatalog(leonardo.user, directory=str(tmp_path))
+
+
+def test_rules_follow_the_native_resolution_of_the_model(server, catalog):
+    validator = GenerationValidator(catalog)
+    assert validator.rules_for(server.models[0]["id"]) == ModelRules(sd_version="v1_5", max_side=1024)
+    # without a native resolution the sdVersion table is the fallback
+    assert validator.rules_for(server.models[1]["id"]) == ModelRules(sd_version="v2", max_side=1024)
+    assert validator.rules_for("custom-model").max_side == MAX_SIDE
+
+
+def test_sizes_are_scaled_keeping_the_aspect_ratio(server, catalog):
+    validator = GenerationValidator(catalog)
+    model = server.models[0]
+    generation_input = queries.generation_input("a cat", model["id"], sd_version=model["sdVersion"], width=2048, height=1152)
+    with pytest.warns(GenerationAdjustedWarning, match="2048x1152 -> 1024x576"):
+        normalized = validator.validate(generation_input)
+    assert (normalized["width"], normalized["height"]) == (1024, 576)
+    assert generation_input["width"] == 2048
+
+
+def test_valid_requests_are_returned_unchanged_without_warning(server, catalog):
+    validator = GenerationValidator(catalog)
+    model = server.models[0]
+    generation_input = queries.generation_input("a cat", model["id"], sd_version=model["sdVersion"], width=768, height=512)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        assert validator.validate(generation_input) == generation_input
+
+
+def test_sizes_that_cannot_keep_their_aspect_ratio_are_rejected(server, catalog):
+    validator = GenerationValidator(catalog)
+    generation_input = queries.generation_input("a cat", server.models[0]["id"], width=4096, height=64)
+    with pytest.raises(InvalidGenerationError, match="without changing its aspect ratio"):
+        validator.validate(generation_input)
+
+
+def test_without_normalization_every_problem_is_reported(server, catalog):
+    validator = GenerationValidator(catalog, normalize=False)
+    generation_input = queries.generation_input("a cat", server.models[0]["id"], sd_version="v2", width=1030, height=512, amount_of_images=9, num_inference_steps=5)
+    with pytest.raises(InvalidGenerationError) as error:
+        validator.validate(generation_input)
+    assert len(error.value.problems) == 4